@@ -6,10 +6,36 @@ It analyzes text input and returns emotion scores for different emotions like
 anger, disgust, fear, joy, and sadness along with the dominant emotion.
 
 Modules:
-    emotion_detection: Contains the main emotion_detector function
+    emotion_detection: Contains the main emotion_detector function and warmup
+    chunking: Contains emotion_detector_chunked and emotion_detector_batch_chunked for long texts
+    backends: Contains the EmotionBackend interface and backend selection
+    client: Contains the pooled, keep-alive WatsonClient backend
+    local_engine: Contains the in-process LocalEmotionEngine backend
+    breaker: Contains the CircuitBreaker guarding the Watson backend
+    resilience: Contains the jittered RetryPolicy, RetryBudget and HedgePolicy
+    singleflight: Contains the request coalescing groups
+    microbatch: Contains the MicroBatcher merging concurrent requests into batches
+    cache: Contains the LRU/TTL ResultCache placed in front of the backend
+    store: Contains the persistent SQLite ScoreStore and StoreBackedCache
+    similarity: Contains the MinHash/LSH SimilarityIndex reusing near-duplicate scores
+    preprocessing: Contains the Preprocessor cleaning texts and detect_language
+    routing: Contains the LanguageRouter scoring each language with its own model
+    results: Contains the compact EmotionResult and array-backed EmotionBatch
+    aggregation: Contains the streaming EmotionAggregator for live statistics
+    async_detection: Contains the asyncio-native async_emotion_detector
+    metrics: Contains the Prometheus-style counters, gauges and histograms
+    jobs: Contains the SQLite JobQueue and JobRunner for background scoring jobs
+
+Names are imported from their module on first use, so importing the package
+itself is cheap and backend dependencies load only when needed.
 
 Functions:
     emotion_detector(text_to_analyse): Main function to detect emotions in text
+    emotion_detector_batch(texts): Detect emotions for many texts concurrently
+    emotion_detector_chunked(text_to_analyse): Detect emotions in a long text by chunks
+    emotion_detector_batch_chunked(texts): Detect emotions for many texts, long ones by chunks
+    async_emotion_detector(text_to_analyse): Coroutine variant of emotion_detector
+    warmup(): Load the shared scoring state once, e.g. before forking workers
 
 Usage:
     from EmotionDetection import emotion_detector
@@ -17,5 +43,104 @@ Usage:
     print(result)
 """
 
-# Import the main function to make it available at package level
-from .emotion_detection import emotion_detector
+import importlib
+from typing import TYPE_CHECKING
+
+# Public name -> submodule defining it. Submodules are imported on first
+# access (PEP 562), so importing the package does not load requests, aiohttp
+# or NumPy until a name that needs them is used. The TYPE_CHECKING imports
+# below declare the same names statically and must be kept in step.
+_EXPORTS = {
+    'emotion_detector': 'emotion_detection',
+    'emotion_detector_batch': 'emotion_detection',
+    'warmup': 'emotion_detection',
+    'emotion_detector_chunked': 'chunking',
+    'emotion_detector_batch_chunked': 'chunking',
+    'EMOTIONS': 'backends',
+    'BackendError': 'backends',
+    'EmotionBackend': 'backends',
+    'get_default_backend': 'backends',
+    'set_default_backend': 'backends',
+    'get_fallback_backend': 'backends',
+    'set_fallback_backend': 'backends',
+    'WatsonClient': 'client',
+    'get_default_client': 'client',
+    'set_default_client': 'client',
+    'LocalEmotionEngine': 'local_engine',
+    'CircuitBreaker': 'breaker',
+    'CircuitOpenError': 'breaker',
+    'get_default_breaker': 'breaker',
+    'HedgePolicy': 'resilience',
+    'RetryBudget': 'resilience',
+    'RetryPolicy': 'resilience',
+    'MicroBatcher': 'microbatch',
+    'AsyncSingleFlight': 'singleflight',
+    'SingleFlight': 'singleflight',
+    'get_default_async_single_flight': 'singleflight',
+    'get_default_single_flight': 'singleflight',
+    'ResultCache': 'cache',
+    'get_default_cache': 'cache',
+    'set_default_cache': 'cache',
+    'ScoreStore': 'store',
+    'StoreBackedCache': 'store',
+    'SimilarityIndex': 'similarity',
+    'get_default_similarity_index': 'similarity',
+    'set_default_similarity_index': 'similarity',
+    'Preprocessor': 'preprocessing',
+    'detect_language': 'preprocessing',
+    'prepare_text': 'preprocessing',
+    'get_default_preprocessor': 'preprocessing',
+    'set_default_preprocessor': 'preprocessing',
+    'LanguageRouter': 'routing',
+    'EmotionBatch': 'results',
+    'EmotionResult': 'results',
+    'EmotionAggregator': 'aggregation',
+    'EmotionStats': 'aggregation',
+    'get_default_aggregator': 'aggregation',
+    'AsyncWatsonClient': 'async_detection',
+    'async_emotion_detector': 'async_detection',
+    'async_emotion_detector_batch': 'async_detection',
+    'get_default_async_client': 'async_detection',
+}
+
+if TYPE_CHECKING:
+    # Static declarations of the lazily imported names, for linters and type checkers
+    from .emotion_detection import emotion_detector, emotion_detector_batch, warmup
+    from .chunking import emotion_detector_batch_chunked, emotion_detector_chunked
+    from .backends import (EMOTIONS, BackendError, EmotionBackend, get_default_backend,
+                           set_default_backend, get_fallback_backend, set_fallback_backend)
+    from .client import WatsonClient, get_default_client, set_default_client
+    from .local_engine import LocalEmotionEngine
+    from .breaker import CircuitBreaker, CircuitOpenError, get_default_breaker
+    from .resilience import HedgePolicy, RetryBudget, RetryPolicy
+    from .microbatch import MicroBatcher
+    from .singleflight import (AsyncSingleFlight, SingleFlight, get_default_async_single_flight,
+                               get_default_single_flight)
+    from .cache import ResultCache, get_default_cache, set_default_cache
+    from .store import ScoreStore, StoreBackedCache
+    from .similarity import (SimilarityIndex, get_default_similarity_index,
+                             set_default_similarity_index)
+    from .preprocessing import (Preprocessor, detect_language, prepare_text,
+                                get_default_preprocessor, set_default_preprocessor)
+    from .routing import LanguageRouter
+    from .results import EmotionBatch, EmotionResult
+    from .aggregation import EmotionAggregator, EmotionStats, get_default_aggregator
+    from .async_detection import (AsyncWatsonClient, async_emotion_detector,
+                                  async_emotion_detector_batch, get_default_async_client)
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    """Import the submodule defining a public name on first access."""
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module_name}', __name__), name)
+    # Cache the name so later lookups skip this function
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,251 @@
+"""
+Bulk Scoring Command Line Interface
+
+Scores a CSV or JSONL feedback export in one streaming pass:
+
+    python -m EmotionDetection feedback.csv -o scored.jsonl --text-field comment
+
+Records are read lazily, scored in chunks by a bounded worker pool and written
+incrementally in input order, so memory stays constant whatever the file size.
+With an output file, a checkpoint is saved after every chunk and --resume
+continues an interrupted run from the last checkpoint. With --store, scores
+are kept in a SQLite file so that re-running over known texts skips the
+backend.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from contextlib import ExitStack
+from itertools import islice
+
+from .backends import EMOTIONS, create_backend
+from .cache import get_default_cache
+from .pipeline import score_stream
+from .store import ScoreStore, StoreBackedCache
+
+# Columns appended to every output record
+RESULT_FIELDS = EMOTIONS + ('dominant_emotion', 'error')
+
+FORMATS = ('csv', 'jsonl')
+
+
+def detect_format(path, explicit=None):
+    """
+    Work out the file format from an explicit choice or the file extension.
+
+    Args:
+        path (str): File path, or '-' for a standard stream
+        explicit (str): Format given on the command line, if any
+
+    Returns:
+        str: 'csv' or 'jsonl'
+    """
+    if explicit:
+        return explicit
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def read_records(stream, file_format):
+    """
+    Lazily read records from a CSV or JSONL stream.
+
+    Args:
+        stream (file): Open text stream
+        file_format (str): 'csv' or 'jsonl'
+
+    Yields:
+        dict: Next record; a JSONL line holding a bare string becomes {"text": ...}
+    """
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            record = json.loads(line)
+            yield record if isinstance(record, dict) else {'text': record}
+
+
+class RecordWriter:
+    """Write scored records incrementally as CSV or JSONL."""
+
+    def __init__(self, stream, file_format, write_header=True):
+        """
+        Args:
+            stream (file): Open text stream to write to
+            file_format (str): 'csv' or 'jsonl'
+            write_header (bool): Whether a CSV header row still has to be written
+        """
+        self.stream = stream
+        self.file_format = file_format
+        self.write_header = write_header
+        self._csv_writer = None
+
+    def write(self, record, result):
+        """
+        Write one record merged with its emotion result.
+
+        Args:
+            record (dict): Input record
+            result (dict): Emotion result for the record's text
+        """
+        row = dict(record)
+        row.update(result)
+        if self.file_format == 'jsonl':
+            self.stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+            return
+        if self._csv_writer is None:
+            fieldnames = [name for name in record if name not in RESULT_FIELDS]
+            self._csv_writer = csv.DictWriter(self.stream, fieldnames + list(RESULT_FIELDS),
+                                              extrasaction='ignore')
+            if self.write_header:
+                self._csv_writer.writeheader()
+        self._csv_writer.writerow(row)
+
+
+def load_checkpoint(path):
+    """
+    Read a checkpoint file.
+
+    Args:
+        path (str): Checkpoint file path
+
+    Returns:
+        dict: {"records": ..., "output_bytes": ...}, zeroed when there is no checkpoint
+    """
+    if not os.path.exists(path):
+        return {'records': 0, 'output_bytes': 0}
+    with open(path, encoding='utf-8') as checkpoint_file:
+        return json.load(checkpoint_file)
+
+
+def save_checkpoint(path, records, output_bytes):
+    """
+    Atomically record how many input records have been written.
+
+    Args:
+        path (str): Checkpoint file path
+        records (int): Number of input records fully written to the output
+        output_bytes (int): Size of the output file after those records
+    """
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as checkpoint_file:
+        json.dump({'records': records, 'output_bytes': output_bytes}, checkpoint_file)
+    os.replace(temporary_path, path)
+
+
+def build_parser():
+    """
+    Build the command line parser.
+
+    Returns:
+        argparse.ArgumentParser: Parser for the bulk scoring command
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m EmotionDetection',
+        description='Score a CSV or JSONL feedback export for emotions.')
+    parser.add_argument('input', help="input file, or '-' for standard input")
+    parser.add_argument('-o', '--output', default='-',
+                        help="output file, or '-' for standard output (default)")
+    parser.add_argument('--input-format', choices=FORMATS,
+                        help='input format (default: from the file extension)')
+    parser.add_argument('--output-format', choices=FORMATS,
+                        help='output format (default: from the file extension)')
+    parser.add_argument('--text-field', default='text',
+                        help="field holding the text to score (default: 'text')")
+    parser.add_argument('--backend', choices=('watson', 'local'),
+                        help='backend to use (default: EMOTION_BACKEND)')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='number of chunks scored concurrently (default: 8)')
+    parser.add_argument('--chunk-size', type=int, default=64,
+                        help='records per chunk and per checkpoint (default: 64)')
+    parser.add_argument('--checkpoint',
+                        help="checkpoint file (default: OUTPUT + '.checkpoint')")
+    parser.add_argument('--resume', action='store_true',
+                        help='continue from the checkpoint of an interrupted run')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='do not use the in-memory result cache')
+    parser.add_argument('--store',
+                        help='SQLite score store reused across runs (default: EMOTION_STORE_PATH)')
+    return parser
+
+
+def run(args):
+    """
+    Score the input file described by parsed command line arguments.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments
+
+    Returns:
+        int: Number of records scored in this run
+    """
+    to_stdout = args.output == '-'
+    if to_stdout and args.resume:
+        raise SystemExit('--resume requires an --output file')
+    checkpoint_path = None if to_stdout else (args.checkpoint or args.output + '.checkpoint')
+    checkpoint = load_checkpoint(checkpoint_path) if args.resume \
+        else {'records': 0, 'output_bytes': 0}
+
+    input_format = detect_format(args.input, args.input_format)
+    output_format = detect_format(args.output, args.output_format)
+    backend = create_backend(args.backend) if args.backend else None
+    cache = None
+    if args.store and not args.no_cache:
+        cache = StoreBackedCache(ScoreStore(args.store), memory=get_default_cache())
+
+    with ExitStack() as streams:
+        input_stream = sys.stdin if args.input == '-' else streams.enter_context(
+            open(args.input, newline='', encoding='utf-8'))
+        if to_stdout:
+            output_stream = sys.stdout
+        else:
+            # Drop anything written after the last checkpoint, then append
+            output_stream = streams.enter_context(
+                open(args.output, 'a+' if args.resume else 'w', newline='', encoding='utf-8'))
+            output_stream.truncate(checkpoint['output_bytes'])
+
+        written = checkpoint['records']
+        try:
+            records = islice(read_records(input_stream, input_format), written, None)
+            writer = RecordWriter(output_stream, output_format,
+                                  write_header=checkpoint['output_bytes'] == 0)
+            scored = score_stream(records,
+                                  key=lambda record: str(record.get(args.text_field) or ''),
+                                  chunk_size=args.chunk_size, max_workers=args.workers,
+                                  backend=backend, cache=cache, use_cache=not args.no_cache)
+            for record, result in scored:
+                writer.write(record, result)
+                written += 1
+                if checkpoint_path and written % args.chunk_size == 0:
+                    output_stream.flush()
+                    save_checkpoint(checkpoint_path, written,
+                                    os.fstat(output_stream.fileno()).st_size)
+        finally:
+            output_stream.flush()
+            if checkpoint_path:
+                save_checkpoint(checkpoint_path, written,
+                                os.fstat(output_stream.fileno()).st_size)
+    return written - checkpoint['records']
+
+
+def main(argv=None):
+    """
+    Entry point of ``python -m EmotionDetection``.
+
+    Args:
+        argv (list of str): Command line arguments; defaults to sys.argv[1:]
+
+    Returns:
+        int: Process exit status
+    """
+    args = build_parser().parse_args(argv)
+    count = run(args)
+    print(f"Scored {count} records", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""
+Admission Control and Rate Limiting
+This module bounds the scoring work a process accepts: an admission
+controller caps concurrent scoring requests behind a short bounded queue,
+and a rate limiter gives every client its own token bucket, so overload is
+answered with a fast 429 or 503 instead of timeouts for everyone.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .metrics import ADMISSION_QUEUE, ADMISSION_REJECTED
+
+
+class RejectedError(Exception):
+    """Raised when a request is not admitted; carries the HTTP status to answer with."""
+
+    def __init__(self, reason, status, retry_after):
+        """
+        Args:
+            reason (str): 'rate_limited', 'queue_full' or 'queue_timeout'
+            status (int): HTTP status for the rejection, 429 or 503
+            retry_after (float): Seconds after which the client may try again
+        """
+        super().__init__(f"Request rejected: {reason}")
+        self.reason = reason
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Caps concurrent requests, letting a bounded number wait for a slot.
+
+    Up to ``max_in_flight`` requests run at once. Up to ``max_queue`` more
+    wait at most ``queue_timeout`` seconds for a slot; any other request is
+    rejected at once, so a burst cannot pile up unbounded waiting threads.
+    """
+
+    def __init__(self, max_in_flight=32, max_queue=64, queue_timeout=1.0):
+        """
+        Args:
+            max_in_flight (int): Requests allowed to run concurrently
+            max_queue (int): Requests allowed to wait for a slot
+            queue_timeout (float): Seconds a request waits before it is rejected
+        """
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._condition = threading.Condition()
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """
+        Build a controller from EMOTION_MAX_IN_FLIGHT and EMOTION_MAX_QUEUE* variables.
+
+        Args:
+            environ (dict): Mapping to read instead of os.environ
+
+        Returns:
+            AdmissionController: Controller for the current deployment, or None
+                when EMOTION_MAX_IN_FLIGHT is 0
+        """
+        environ = os.environ if environ is None else environ
+        max_in_flight = int(environ.get('EMOTION_MAX_IN_FLIGHT', 32))
+        if max_in_flight <= 0:
+            return None
+        return cls(max_in_flight=max_in_flight,
+                   max_queue=int(environ.get('EMOTION_MAX_QUEUE', 64)),
+                   queue_timeout=float(environ.get('EMOTION_QUEUE_TIMEOUT', 1.0)))
+
+    def acquire(self):
+        """
+        Take a slot, waiting in the queue when every slot is busy.
+
+        Raises:
+            RejectedError: With status 503 when the queue is full or the wait timed out
+        """
+        with self._condition:
+            if self.in_flight < self.max_in_flight and not self.queued:
+                self.in_flight += 1
+                self.admitted += 1
+                return
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                ADMISSION_REJECTED.inc(reason='queue_full')
+                raise RejectedError('queue_full', 503, self.queue_timeout)
+
+            self.queued += 1
+            ADMISSION_QUEUE.inc()
+            try:
+                if not self._condition.wait_for(lambda: self.in_flight < self.max_in_flight,
+                                                timeout=self.queue_timeout):
+                    self.rejected += 1
+                    ADMISSION_REJECTED.inc(reason='queue_timeout')
+                    raise RejectedError('queue_timeout', 503, self.queue_timeout)
+            finally:
+                self.queued -= 1
+                ADMISSION_QUEUE.dec()
+            self.in_flight += 1
+            self.admitted += 1
+
+    def release(self):
+        """Free a slot taken by acquire() and wake one waiting request."""
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def stats(self):
+        """
+        Report admission counters for monitoring.
+
+        Returns:
+            dict: Limits, current occupancy and admitted/rejected counters
+        """
+        with self._condition:
+            return {'max_in_flight': self.max_in_flight, 'max_queue': self.max_queue,
+                    'in_flight': self.in_flight, 'queued': self.queued,
+                    'admitted': self.admitted, 'rejected': self.rejected}
+
+
+class RateLimiter:
+    """
+    Token bucket per client: ``rate`` requests per second with bursts of ``burst``.
+
+    Buckets of the least recently seen clients are dropped beyond
+    ``max_clients``, so memory stays bounded; a dropped client starts again
+    with a full bucket.
+    """
+
+    def __init__(self, rate, burst=None, max_clients=10000, clock=time.monotonic):
+        """
+        Args:
+            rate (float): Tokens added to each bucket per second
+            burst (float): Bucket capacity; defaults to one second of rate, at least 1
+            max_clients (int): Most client buckets kept
+            clock (callable): Monotonic time source, replaceable in tests
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.max_clients = max_clients
+        self._clock = clock
+        self._lock = threading.Lock()
+        # client -> (tokens, time of last update), least recently seen first
+        self._buckets = OrderedDict()
+        self.limited = 0
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """
+        Build a limiter from EMOTION_RATE_LIMIT and EMOTION_RATE_BURST.
+
+        Args:
+            environ (dict): Mapping to read instead of os.environ
+
+        Returns:
+            RateLimiter: Limiter for the current deployment, or None when
+                EMOTION_RATE_LIMIT is unset or 0
+        """
+        environ = os.environ if environ is None else environ
+        rate = float(environ.get('EMOTION_RATE_LIMIT', 0))
+        if rate <= 0:
+            return None
+        burst = environ.get('EMOTION_RATE_BURST')
+        return cls(rate, burst=float(burst) if burst else None)
+
+    def allow(self, client, cost=1.0):
+        """
+        Spend tokens from a client's bucket.
+
+        Args:
+            client (str): Client identity, such as an API key or address
+            cost (float): Tokens the request costs
+
+        Raises:
+            RejectedError: With status 429 when the bucket holds too few tokens
+        """
+        now = self._clock()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            else:
+                self.limited += 1
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        if not allowed:
+            ADMISSION_REJECTED.inc(reason='rate_limited')
+            raise RejectedError('rate_limited', 429, (cost - tokens) / self.rate)
+
+    def stats(self):
+        """
+        Report rate limiting counters for monitoring.
+
+        Returns:
+            dict: Rate, burst, tracked clients and rejected requests
+        """
+        with self._lock:
+            return {'rate': self.rate, 'burst': self.burst, 'clients': len(self._buckets),
+                    'limited': self.limited}
+
+
+def retry_after_header(seconds):
+    """
+    Format a Retry-After header value.
+
+    Args:
+        seconds (float): Seconds to wait
+
+    Returns:
+        str: Whole seconds, at least 1
+    """
+    return str(max(1, math.ceil(seconds)))
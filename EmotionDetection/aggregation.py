@@ -0,0 +1,360 @@
+"""
+Streaming Emotion Aggregation
+This module keeps running, mergeable emotion statistics per key (for example
+a product) and per time window, so dashboards can read live distributions
+without rescanning stored feedback or keeping every result.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+from .backends import EMOTIONS
+from .results import EMOTION_INDEX, NO_EMOTION, EmotionBatch
+
+# Score histogram bins per emotion; quantiles are exact to within 1 / bins
+DEFAULT_BINS = 100
+
+# Quantiles reported by summaries
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+# Key that absorbs results once an aggregator tracks max_keys keys
+OTHER_KEY = '__other__'
+
+
+class EmotionStats:
+    """
+    Mergeable running statistics of emotion results.
+
+    Keeps the result count, the count per dominant emotion, per-emotion score
+    sums and a fixed-bin score histogram per emotion. Adding a result is O(1),
+    and two EmotionStats merge by adding their counters, so statistics can be
+    combined across windows, keys or processes.
+    """
+
+    __slots__ = ('bins', 'count', 'dominant', 'sums', 'histograms')
+
+    def __init__(self, bins=DEFAULT_BINS):
+        """
+        Args:
+            bins (int): Histogram bins over the [0, 1] score range
+        """
+        self.bins = bins
+        self.count = 0
+        # Count per dominant emotion in EMOTIONS order, then texts without one
+        self.dominant = [0] * (len(EMOTIONS) + 1)
+        self.sums = [0.0] * len(EMOTIONS)
+        self.histograms = [[0] * bins for _ in EMOTIONS]
+
+    @property
+    def detected(self):
+        """int: Number of results with a dominant emotion."""
+        return self.count - self.dominant[-1]
+
+    def _bin(self, score):
+        """Histogram bin of a score in [0, 1]."""
+        return min(max(int(score * self.bins), 0), self.bins - 1)
+
+    def add(self, result):
+        """
+        Fold one result into the statistics.
+
+        Args:
+            result (dict or EmotionResult): Emotion result
+        """
+        self.count += 1
+        dominant_index = EMOTION_INDEX.get(result.get('dominant_emotion'))
+        if dominant_index is None:
+            self.dominant[-1] += 1
+            return
+        self.dominant[dominant_index] += 1
+        for index, emotion in enumerate(EMOTIONS):
+            score = result.get(emotion)
+            if score is not None:
+                self.sums[index] += score
+                self.histograms[index][self._bin(score)] += 1
+
+    def add_batch(self, batch):
+        """
+        Fold a whole EmotionBatch into the statistics with vectorized counting.
+
+        Args:
+            batch (EmotionBatch): Results to add
+        """
+        dominant = batch.dominant_indices()
+        detected = dominant != NO_EMOTION
+        self.count += len(batch)
+        counts = np.bincount(np.where(detected, dominant, len(EMOTIONS)),
+                             minlength=len(EMOTIONS) + 1)
+        self.dominant = [total + int(added) for total, added in zip(self.dominant, counts)]
+        for index, emotion in enumerate(EMOTIONS):
+            scores = batch.column(emotion)[detected]
+            self.sums[index] += float(scores.sum(dtype=np.float64))
+            bins = np.clip((scores * self.bins).astype(np.int64), 0, self.bins - 1)
+            added = np.bincount(bins, minlength=self.bins)
+            self.histograms[index] = [total + int(value) for total, value
+                                      in zip(self.histograms[index], added)]
+
+    def merge(self, other):
+        """
+        Add another EmotionStats into this one.
+
+        Args:
+            other (EmotionStats): Statistics with the same number of bins
+
+        Returns:
+            EmotionStats: This object, for chaining
+        """
+        if other.bins != self.bins:
+            raise ValueError("Cannot merge statistics with different bin counts")
+        self.count += other.count
+        self.dominant = [mine + theirs for mine, theirs in zip(self.dominant, other.dominant)]
+        self.sums = [mine + theirs for mine, theirs in zip(self.sums, other.sums)]
+        self.histograms = [[mine + theirs for mine, theirs in zip(own, their)]
+                           for own, their in zip(self.histograms, other.histograms)]
+        return self
+
+    def copy(self):
+        """
+        Copy the statistics.
+
+        Returns:
+            EmotionStats: Independent copy
+        """
+        return EmotionStats(self.bins).merge(self)
+
+    def quantile(self, emotion, fraction):
+        """
+        Approximate a score quantile from the histogram.
+
+        Args:
+            emotion (str): Emotion name from EMOTIONS
+            fraction (float): Quantile as a fraction, e.g. 0.9
+
+        Returns:
+            float: Score at the quantile, interpolated within its bin, or None
+                when no result had a detected emotion
+        """
+        histogram = self.histograms[EMOTION_INDEX[emotion]]
+        total = sum(histogram)
+        if not total:
+            return None
+        rank = fraction * total
+        seen = 0
+        for index, count in enumerate(histogram):
+            if count and seen + count >= rank:
+                return (index + (rank - seen) / count) / self.bins
+            seen += count
+        return 1.0
+
+    def summary(self, quantiles=DEFAULT_QUANTILES):
+        """
+        Report the statistics for a dashboard.
+
+        Args:
+            quantiles (tuple of float): Quantiles to report per emotion
+
+        Returns:
+            dict: Counts, dominant emotion distribution, mean scores and quantiles
+        """
+        detected = self.detected
+        dominant = dict(zip(EMOTIONS, self.dominant))
+        dominant['none'] = self.dominant[-1]
+        return {
+            'count': self.count,
+            'detected': detected,
+            'dominant': dominant,
+            'mean': {emotion: (total / detected if detected else None)
+                     for emotion, total in zip(EMOTIONS, self.sums)},
+            'quantiles': {emotion: {f'p{fraction * 100:g}': self.quantile(emotion, fraction)
+                                    for fraction in quantiles}
+                          for emotion in EMOTIONS},
+        }
+
+
+class EmotionAggregator:
+    """
+    Thread-safe running statistics per key and per fixed time window.
+
+    Results are folded into the EmotionStats of their key and of the window
+    starting at a multiple of ``window`` seconds. Windows older than
+    ``retention`` seconds are dropped, and once ``max_keys`` keys are tracked
+    further keys are counted under OTHER_KEY, so memory stays bounded.
+    """
+
+    def __init__(self, window=3600, retention=7 * 24 * 3600, max_keys=10000,
+                 bins=DEFAULT_BINS, clock=time.time):
+        """
+        Args:
+            window (float): Window length in seconds
+            retention (float): Seconds of windows kept, or None to keep every window
+            max_keys (int): Maximum number of distinct keys tracked
+            bins (int): Histogram bins per emotion
+            clock (callable): Wall-clock time source, replaceable in tests
+        """
+        if window <= 0:
+            raise ValueError("window must be positive")
+        self.window = window
+        self.retention = retention
+        self.max_keys = max_keys
+        self.bins = bins
+        self._clock = clock
+        self._lock = threading.Lock()
+        # (key, window start) -> EmotionStats
+        self._stats = {}
+        self._keys = set()
+        self._latest_start = float('-inf')
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """
+        Build an aggregator configured from EMOTION_AGGREGATE_* environment variables.
+
+        Args:
+            environ (dict): Mapping to read instead of os.environ
+
+        Returns:
+            EmotionAggregator: Aggregator configured for the current deployment
+        """
+        environ = os.environ if environ is None else environ
+        retention = float(environ.get('EMOTION_AGGREGATE_RETENTION', 7 * 24 * 3600))
+        return cls(window=float(environ.get('EMOTION_AGGREGATE_WINDOW', 3600)),
+                   retention=retention if retention > 0 else None,
+                   max_keys=int(environ.get('EMOTION_AGGREGATE_MAX_KEYS', 10000)))
+
+    def _stats_for(self, key, timestamp):
+        """Return the statistics of a key and timestamp's window; lock held."""
+        start = timestamp - timestamp % self.window
+        if start > self._latest_start:
+            # First result of a new window: a good time to drop expired ones
+            self._latest_start = start
+            self._expire(timestamp)
+        if key not in self._keys:
+            if len(self._keys) >= self.max_keys:
+                key = OTHER_KEY
+            self._keys.add(key)
+        slot = (key, start)
+        stats = self._stats.get(slot)
+        if stats is None:
+            stats = self._stats[slot] = EmotionStats(self.bins)
+        return stats
+
+    def _expire(self, now):
+        """Drop windows older than the retention period; lock held."""
+        if self.retention is None:
+            return
+        oldest = now - self.retention
+        for slot in [slot for slot in self._stats if slot[1] + self.window <= oldest]:
+            del self._stats[slot]
+        self._keys = {key for key, _ in self._stats}
+
+    def add(self, result, key=None, timestamp=None):
+        """
+        Fold one result into its key's current window.
+
+        Args:
+            result (dict or EmotionResult): Emotion result
+            key (str): Grouping key such as a product id, or None
+            timestamp (float): Time of the feedback; defaults to now
+        """
+        timestamp = self._clock() if timestamp is None else timestamp
+        with self._lock:
+            self._stats_for(key, timestamp).add(result)
+
+    def add_batch(self, results, key=None, timestamp=None):
+        """
+        Fold many results sharing a key and time into the statistics.
+
+        Args:
+            results (EmotionBatch or iterable): Emotion results
+            key (str): Grouping key such as a product id, or None
+            timestamp (float): Time of the feedback; defaults to now
+        """
+        timestamp = self._clock() if timestamp is None else timestamp
+        with self._lock:
+            stats = self._stats_for(key, timestamp)
+            if isinstance(results, EmotionBatch):
+                stats.add_batch(results)
+            else:
+                for result in results:
+                    stats.add(result)
+
+    def collect(self, key=None, since=None, all_keys=False):
+        """
+        Merge the statistics of matching windows.
+
+        Args:
+            key (str): Only include this key
+            since (float): Only include windows ending after this time
+            all_keys (bool): Include every key instead of only ``key``
+
+        Returns:
+            dict: key -> list of (window start, EmotionStats copy), oldest first
+        """
+        with self._lock:
+            slots = sorted((slot for slot in self._stats
+                            if (all_keys or slot[0] == key)
+                            and (since is None or slot[1] + self.window > since)),
+                           key=lambda slot: (str(slot[0]), slot[1]))
+            collected = {}
+            for slot in slots:
+                collected.setdefault(slot[0], []).append((slot[1], self._stats[slot].copy()))
+        return collected
+
+    def summary(self, key=None, since=None, all_keys=False, per_window=False,
+                quantiles=DEFAULT_QUANTILES):
+        """
+        Summarize the statistics of one key, or of every key.
+
+        Args:
+            key (str): Key to summarize
+            since (float): Only include windows ending after this time
+            all_keys (bool): Summarize every key, plus their total
+            per_window (bool): Also report each window separately
+            quantiles (tuple of float): Quantiles to report per emotion
+
+        Returns:
+            dict: Window length, the merged 'total' summary and one entry per key
+        """
+        collected = self.collect(key=key, since=since, all_keys=all_keys)
+        total = EmotionStats(self.bins)
+        keys = {}
+        for group_key, windows in collected.items():
+            merged = EmotionStats(self.bins)
+            for _, stats in windows:
+                merged.merge(stats)
+            total.merge(merged)
+            entry = merged.summary(quantiles)
+            if per_window:
+                entry['windows'] = [dict(stats.summary(quantiles), start=start)
+                                    for start, stats in windows]
+            keys['' if group_key is None else group_key] = entry
+        return {'window_seconds': self.window, 'total': total.summary(quantiles), 'keys': keys}
+
+    def clear(self):
+        """Drop every statistic."""
+        with self._lock:
+            self._stats.clear()
+            self._keys.clear()
+            self._latest_start = float('-inf')
+
+
+_default_aggregator = None
+_default_aggregator_lock = threading.Lock()
+
+
+def get_default_aggregator():
+    """
+    Return the process-wide aggregator fed by the web server.
+
+    Returns:
+        EmotionAggregator: Shared aggregator configured from the environment
+    """
+    global _default_aggregator  # pylint: disable=global-statement
+    if _default_aggregator is None:
+        with _default_aggregator_lock:
+            if _default_aggregator is None:
+                _default_aggregator = EmotionAggregator.from_env()
+    return _default_aggregator
@@ -0,0 +1,421 @@
+"""
+Asyncio Emotion Detection Module
+This module provides an asyncio-native variant of emotion_detector that keeps
+many backend calls in flight from a single thread, bounded by a semaphore.
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+
+import requests
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - exercised only without aiohttp installed
+    aiohttp = None
+
+from .backends import empty_result, get_default_backend
+from .client import (DEFAULT_MODEL_ID, WATSON_URL, BackendCall, WatsonClient,
+                     client_options_from_env, format_prediction, get_default_client)
+from .emotion_detection import _analyse, _Detection, _error_result, _fallback_result
+from .metrics import BACKEND_RESPONSES, STAGE_LATENCY, record_backend_status
+from .routing import LanguageRouter, _unsupported_result
+from .singleflight import get_default_async_single_flight
+
+# Exceptions meaning the backend could not be reached or did not answer in time
+NETWORK_ERRORS = (asyncio.TimeoutError, OSError, requests.exceptions.RequestException)
+if aiohttp is not None:
+    NETWORK_ERRORS += (aiohttp.ClientError,)
+
+
+class AsyncWatsonClient:
+    """
+    Asyncio client for the Watson EmotionPredict endpoint.
+
+    With aiohttp installed the client owns one aiohttp.ClientSession whose
+    connector keeps connections alive. Without it, each call runs the pooled
+    synchronous WatsonClient in the loop's default executor. In both modes at
+    most ``max_concurrency`` calls are in flight at once. Failed calls are
+    retried by its RetryPolicy and slow calls hedged by its HedgePolicy; the
+    losing hedge is cancelled.
+
+    Like an aiohttp session, a client belongs to the event loop it is first
+    used in; use get_default_async_client() to get one per running loop.
+    """
+
+    def __init__(self, url=WATSON_URL, model_id=DEFAULT_MODEL_ID, max_concurrency=100,
+                 connect_timeout=3.05, read_timeout=10, sync_client=None, breaker=None,
+                 retry_policy=None, hedge_policy=None):
+        """
+        Args:
+            url (str): Watson EmotionPredict endpoint
+            model_id (str): Value of the grpc-metadata-mm-model-id header
+            max_concurrency (int): Maximum number of backend calls in flight
+            connect_timeout (float): Seconds to wait for a connection to be established
+            read_timeout (float): Seconds to wait for the backend response
+            sync_client (WatsonClient): Client used when aiohttp is not installed
+            breaker (CircuitBreaker): Circuit breaker guarding the backend, or None
+            retry_policy (RetryPolicy): Retry policy, or None to never retry
+            hedge_policy (HedgePolicy): Hedged-request policy, or None to never hedge
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.url = url
+        self.model_id = model_id
+        self.max_concurrency = max_concurrency
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.sync_client = sync_client
+        self.breaker = breaker
+        self.retry_policy = retry_policy
+        self.hedge_policy = hedge_policy
+        self._semaphore = None
+        self._session = None
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """
+        Build a client configured from WATSON_* environment variables.
+
+        Args:
+            environ (dict): Mapping to read instead of os.environ
+
+        Returns:
+            AsyncWatsonClient: Client configured for the current deployment
+        """
+        environ = os.environ if environ is None else environ
+        return cls(max_concurrency=int(environ.get('WATSON_MAX_CONCURRENCY', 100)),
+                   **client_options_from_env(environ))
+
+    @property
+    def total_timeout(self):
+        """float: Upper bound in seconds for one backend call."""
+        return self.connect_timeout + self.read_timeout
+
+    async def post(self, text_to_analyse):
+        """
+        Send one text to the EmotionPredict endpoint under the retry and hedging policies.
+
+        Args:
+            text_to_analyse (str): Text to analyze for emotions
+
+        Returns:
+            tuple: HTTP status code and decoded JSON body (None unless status is 200)
+        """
+        async def attempt():
+            if self.hedge_policy is None:
+                return await self._post_once(text_to_analyse)
+            return await self.hedge_policy.call_async(lambda: self._post_once(text_to_analyse))
+
+        if self.retry_policy is None:
+            return await attempt()
+        return await self.retry_policy.call_async(attempt, NETWORK_ERRORS)
+
+    async def _post_once(self, text_to_analyse):
+        """
+        Send one text once.
+
+        The concurrency slot and the HTTP connection are released even when
+        the calling task is cancelled, for example by a timeout.
+
+        Returns:
+            tuple: HTTP status code and decoded JSON body (None unless status is 200)
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            if aiohttp is None:
+                return await self._post_in_executor(text_to_analyse)
+            session = self._get_session()
+            # aiohttp is known to be installed here
+            async with session.post(  # pylint: disable=not-async-context-manager
+                    self.url, json={"raw_document": {"text": text_to_analyse}}) as response:
+                if response.status != 200:
+                    return response.status, None
+                return response.status, await response.json(content_type=None)
+
+    async def _post_in_executor(self, text_to_analyse):
+        """Run the synchronous pooled client without blocking the event loop."""
+        sync_client = self.sync_client or get_default_client()
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(None, sync_client.post, text_to_analyse)
+        if response.status_code != 200:
+            return response.status_code, None
+        return response.status_code, response.json()
+
+    def _get_session(self):
+        """Create the aiohttp session lazily, inside the running event loop."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers={"grpc-metadata-mm-model-id": self.model_id},
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                timeout=aiohttp.ClientTimeout(sock_connect=self.connect_timeout,
+                                              sock_read=self.read_timeout))
+        return self._session
+
+    async def aclose(self):
+        """Close the aiohttp session and its pooled connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+# Shared async clients of each event loop: loop -> {model id or None: client}
+_default_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_default_async_client(model_id=None):
+    """
+    Return the shared async client for the running event loop.
+
+    Args:
+        model_id (str): Model the client should score with, e.g. the model of
+            a language route; defaults to the configured one
+
+    Returns:
+        AsyncWatsonClient: Client configured from the environment
+    """
+    loop = asyncio.get_running_loop()
+    clients = _default_async_clients.setdefault(loop, {})
+    client = clients.get(model_id)
+    if client is None:
+        client = clients[model_id] = AsyncWatsonClient.from_env()
+        if model_id is not None:
+            client.model_id = model_id
+    return client
+
+
+# Event loop of each process running in a daemon thread: pid -> loop
+_background_loops = {}
+_background_loops_lock = threading.Lock()
+
+
+def get_background_loop():
+    """
+    Return this process's background event loop, starting its thread on first use.
+
+    Synchronous code, or async frameworks that run every request on a new
+    event loop as Flask does, can schedule coroutines on this long-lived loop
+    so that its shared async client keeps connections alive between calls.
+
+    Returns:
+        asyncio.AbstractEventLoop: Loop running in a daemon thread of this process
+    """
+    with _background_loops_lock:
+        # A forked worker inherits the loop of its parent but not the thread running it
+        loop = _background_loops.get(os.getpid())
+        if loop is None:
+            loop = _background_loops[os.getpid()] = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='emotion-async-loop',
+                             daemon=True).start()
+        return loop
+
+
+def run_in_background_loop(coroutine):
+    """
+    Schedule a coroutine on the background event loop.
+
+    Args:
+        coroutine (coroutine): Coroutine to run, e.g. async_emotion_detector_batch(texts)
+
+    Returns:
+        concurrent.futures.Future: Future of its result; await it from another
+            loop with asyncio.wrap_future
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, get_background_loop())
+
+
+def close_background_loop(timeout=5):
+    """
+    Close the background loop's async clients and stop the loop, if it was started.
+
+    Args:
+        timeout (float): Seconds to wait for the clients' connections to close
+    """
+    with _background_loops_lock:
+        loop = _background_loops.pop(os.getpid(), None)
+    if loop is None:
+        return
+    for client in list(_default_async_clients.get(loop, {}).values()):
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(timeout=timeout)
+    loop.call_soon_threadsafe(loop.stop)
+
+
+async def async_emotion_detector(text_to_analyse, client=None, cache=None, use_cache=True,
+                                 timeout=None, coalesce=True, preprocessor=None, preprocess=True,
+                                 similarity_index=None, use_similarity=True, router=None):
+    """
+    Coroutine to detect emotions in the provided text using Watson NLP.
+
+    It returns the same result format as emotion_detector, shares its result
+    cache and similarity index, and cleans texts with the same preprocessor.
+    Concurrent calls on the same event loop for the same normalized text
+    share one backend call. That shared call is shielded: cancelling an
+    awaiting task, for example by its timeout, stops the wait but not the
+    call, which completes for the other callers and the cache. With coalesce
+    set to False, cancelling the task cancels its backend call.
+
+    Without a client, texts are routed by language like emotion_detector
+    routes them when the default backend is a LanguageRouter. Watson routes
+    are scored by the loop's async client for their model; other routes,
+    such as the local engine, are scored off the event loop.
+
+    Args:
+        text_to_analyse (str): Text to analyze for emotions
+        client (AsyncWatsonClient): Async backend client; defaults to the loop's shared client
+        cache (ResultCache): Result cache to use; defaults to the shared cache
+        use_cache (bool): Whether to read from and write to the result cache
+        timeout (float): Seconds before the call is abandoned; defaults to the client timeout
+        coalesce (bool): Whether to share in-flight backend calls with concurrent callers
+        preprocessor (Preprocessor): Text preprocessor; defaults to the shared one
+        preprocess (bool): Whether to clean the text, e.g. False when it already was
+        similarity_index (SimilarityIndex): Near-duplicate index; defaults to the shared one
+        use_similarity (bool): Whether to reuse and index scores of near duplicates
+        router (LanguageRouter): Routes used when no client is given; defaults to
+            the default backend when it is a LanguageRouter
+
+    Returns:
+        dict: Dictionary containing emotion scores and dominant emotion
+    """
+    detection = _Detection.create(text_to_analyse, cache, use_cache, similarity_index,
+                                  use_similarity, preprocessor, preprocess)
+    if detection is None:
+        return empty_result()
+    if client is None:
+        router = router or _default_router()
+    if client is None and router is not None:
+        # Cached under the routing table, like the results of emotion_detector
+        return (detection.known_result(router.model_id)
+                or await _async_score(detection, lambda: _async_route(detection, router, timeout),
+                                      coalesce))
+    client = client or get_default_async_client()
+    return (detection.known_result(client.model_id)
+            or await _async_score(detection, lambda: _async_analyse(detection, client, timeout),
+                                  coalesce))
+
+
+def _default_router():
+    """Return the default backend when it routes texts by language, else None."""
+    backend = get_default_backend()
+    return backend if isinstance(backend, LanguageRouter) else None
+
+
+async def _async_score(detection, analyse, coalesce):
+    """
+    Score a text missing from the cache, sharing the call with concurrent callers.
+
+    Args:
+        detection (_Detection): Text to score, with its cache and similarity index
+        analyse (callable): Zero-argument coroutine function scoring the text
+        coalesce (bool): Whether to share in-flight backend calls with concurrent callers
+
+    Returns:
+        dict: Dictionary containing emotion scores and dominant emotion
+    """
+    if coalesce:
+        # Every concurrent caller gets its own copy of the shared result
+        return dict(await get_default_async_single_flight().do(detection.flight_key, analyse))
+    return await analyse()
+
+
+async def _async_route(detection, router, timeout):
+    """
+    Score a text with the route of its language and cache the result.
+
+    Args:
+        detection (_Detection): Text to score, with its cache and similarity index
+        router (LanguageRouter): Routes of each language
+        timeout (float): Seconds before a Watson call is abandoned; defaults to the client timeout
+
+    Returns:
+        dict: Dictionary containing emotion scores and dominant emotion
+    """
+    language, backend = router.route(detection.text)
+    if backend is None:
+        return _unsupported_result(language)
+    if isinstance(backend, WatsonClient):
+        return await _async_analyse(detection, get_default_async_client(backend.model_id),
+                                    timeout)
+    return await asyncio.get_running_loop().run_in_executor(None, _analyse, detection, backend)
+
+
+async def _async_analyse(detection, client, timeout):
+    """
+    Score a text with an async client and cache the result.
+
+    Args:
+        detection (_Detection): Text to score, with its cache and similarity index
+        client (AsyncWatsonClient): Async backend client
+        timeout (float): Seconds before the call is abandoned; defaults to the client timeout
+
+    Returns:
+        dict: Dictionary containing emotion scores and dominant emotion
+    """
+    text_to_analyse = detection.text
+    # Fail fast while the backend's circuit is open
+    breaker = getattr(client, 'breaker', None)
+    if breaker is not None and not breaker.allow():
+        return _fallback_result(text_to_analyse)
+
+    # A call cancelled by the caller leaves healthy unset: not the backend's fault
+    with BackendCall(breaker) as call:
+        try:
+            status_code, response_json = await asyncio.wait_for(
+                client.post(text_to_analyse), timeout or client.total_timeout)
+        except NETWORK_ERRORS:
+            # Handle network errors and timeouts the same way as emotion_detector
+            call.healthy = False
+            BACKEND_RESPONSES.inc(outcome='exception')
+            return _fallback_result(text_to_analyse)
+        call.healthy = status_code < 500
+
+    record_backend_status(status_code)
+    if status_code != 200:
+        return empty_result()
+    with STAGE_LATENCY.time(stage='parse'):
+        formatted_output = format_prediction(response_json)
+    return detection.remember(formatted_output)
+
+
+async def async_emotion_detector_batch(texts, client=None, cache=None, use_cache=True,
+                                       timeout=None, coalesce=True, router=None):
+    """
+    Coroutine to detect emotions for many texts concurrently.
+
+    Concurrency is bounded by the client's max_concurrency. A failure on one
+    text does not abort the batch: its slot holds an empty result with an
+    additional 'error' key.
+
+    Args:
+        texts (iterable of str): Texts to analyze for emotions
+        client (AsyncWatsonClient): Async backend client shared by all calls
+        cache (ResultCache): Result cache shared by all calls
+        use_cache (bool): Whether to read from and write to the result cache
+        timeout (float): Per-text timeout in seconds
+        coalesce (bool): Whether duplicate texts share one backend call
+        router (LanguageRouter): Routes used when no client is given; defaults to
+            the default backend when it is a LanguageRouter
+
+    Returns:
+        list: One result dictionary per input text, in input order
+    """
+    if client is None:
+        router = router or _default_router()
+        if router is None:
+            client = get_default_async_client()
+    outcomes = await asyncio.gather(
+        *(async_emotion_detector(text, client=client, cache=cache, use_cache=use_cache,
+                                 timeout=timeout, coalesce=coalesce, router=router)
+          for text in texts),
+        return_exceptions=True)
+
+    return [_error_result(outcome) if isinstance(outcome, BaseException) else outcome
+            for outcome in outcomes]
@@ -0,0 +1,190 @@
+"""
+Emotion Backend Interface
+This module defines the interface shared by every emotion scoring backend,
+the result helpers they use, and the process-wide backend selection.
+"""
+
+import os
+import threading
+
+# Emotion labels scored by every backend, in result order
+EMOTIONS = ('anger', 'disgust', 'fear', 'joy', 'sadness')
+
+# Result of a text in which no emotion was detected; copied by empty_result()
+_EMPTY_RESULT = dict.fromkeys(EMOTIONS + ('dominant_emotion',))
+
+
+class BackendError(Exception):
+    """Raised when a backend cannot be reached or does not answer in time."""
+
+
+class EmotionBackend:
+    """
+    Base class for emotion scoring backends.
+
+    Subclasses implement analyse() and set model_id, which identifies the
+    model in cache keys. Backends that score many texts at once more cheaply
+    than one by one set supports_batch and override analyse_batch().
+    """
+
+    model_id = None
+    supports_batch = False
+
+    def analyse(self, text_to_analyse):
+        """
+        Score one text.
+
+        Args:
+            text_to_analyse (str): Text to analyze for emotions
+
+        Returns:
+            dict: Dictionary containing emotion scores and dominant emotion
+
+        Raises:
+            BackendError: When the backend is unavailable
+        """
+        raise NotImplementedError
+
+    def analyse_batch(self, texts):
+        """
+        Score many texts.
+
+        Args:
+            texts (list of str): Texts to analyze for emotions
+
+        Returns:
+            list: One result dictionary per text, in input order
+
+        Raises:
+            BackendError: When the backend is unavailable
+        """
+        return [self.analyse(text) for text in texts]
+
+    def close(self):
+        """Release any resource held by the backend."""
+
+
+def empty_result():
+    """
+    Build the result returned when no emotion could be detected.
+
+    Returns:
+        dict: Dictionary with every emotion score and the dominant emotion set to None
+    """
+    return dict(_EMPTY_RESULT)
+
+
+def format_scores(emotions):
+    """
+    Build a result from a mapping of emotion names to scores.
+
+    Args:
+        emotions (dict): Score per emotion name; missing emotions score 0
+
+    Returns:
+        dict: Dictionary containing emotion scores and dominant emotion
+    """
+    # Find the dominant emotion
+    dominant_emotion = max(emotions, key=emotions.get)
+
+    # Format the output
+    result = {emotion: emotions.get(emotion, 0) for emotion in EMOTIONS}
+    result['dominant_emotion'] = dominant_emotion
+    return result
+
+
+def create_backend(name):
+    """
+    Create a backend from its configuration name.
+
+    Args:
+        name (str): 'watson' for the shared WatsonClient, 'local' for the
+            in-process LocalEmotionEngine, or 'none'
+
+    Returns:
+        EmotionBackend: Backend instance, or None for 'none'
+    """
+    # Imported here because both backend modules import this one
+    if name == 'watson':
+        from .client import get_default_client  # pylint: disable=import-outside-toplevel
+        return get_default_client()
+    if name == 'local':
+        from .local_engine import LocalEmotionEngine  # pylint: disable=import-outside-toplevel
+        return LocalEmotionEngine.from_env()
+    if name == 'none':
+        return None
+    raise ValueError(f"Unknown emotion backend: {name!r}")
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+# Role name -> (environment variable, default backend name)
+_BACKEND_ROLES = {
+    'default': ('EMOTION_BACKEND', 'watson'),
+    'fallback': ('EMOTION_FALLBACK_BACKEND', 'local'),
+}
+
+
+def _get_backend(role):
+    """Return the backend configured for a role, creating it on first use."""
+    if role not in _backends:
+        with _backends_lock:
+            if role not in _backends:
+                variable, default_name = _BACKEND_ROLES[role]
+                backend = create_backend(os.environ.get(variable, default_name))
+                if role == 'default':
+                    # Imported here because both wrapper modules import this one
+                    from .microbatch import MicroBatcher  # pylint: disable=import-outside-toplevel
+                    from .routing import LanguageRouter  # pylint: disable=import-outside-toplevel
+                    backend = LanguageRouter.from_env(MicroBatcher.from_env(backend))
+                _backends[role] = backend
+    return _backends[role]
+
+
+def get_default_backend():
+    """
+    Return the backend used by emotion_detector when none is given.
+
+    It is selected by EMOTION_BACKEND ('watson' by default, or 'local'),
+    wrapped in a MicroBatcher when EMOTION_MICROBATCH_SIZE is set and in a
+    LanguageRouter when EMOTION_LANGUAGE_MODELS is set.
+
+    Returns:
+        EmotionBackend: Shared default backend
+    """
+    return _get_backend('default')
+
+
+def set_default_backend(backend):
+    """
+    Replace the backend used by emotion_detector when none is given.
+
+    Args:
+        backend (EmotionBackend): Backend to share
+    """
+    with _backends_lock:
+        _backends['default'] = backend
+
+
+def get_fallback_backend():
+    """
+    Return the backend used when the primary backend raises BackendError.
+
+    It is selected by EMOTION_FALLBACK_BACKEND ('local' by default, or 'none').
+
+    Returns:
+        EmotionBackend: Shared fallback backend, or None when disabled
+    """
+    return _get_backend('fallback')
+
+
+def set_fallback_backend(backend):
+    """
+    Replace the backend used when the primary backend is unavailable.
+
+    Args:
+        backend (EmotionBackend): Backend to fall back to, or None to disable fallback
+    """
+    with _backends_lock:
+        _backends['fallback'] = backend
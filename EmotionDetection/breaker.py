@@ -0,0 +1,172 @@
+"""
+Backend Circuit Breaker
+This module provides a thread-safe circuit breaker that stops calling a
+failing backend for a while, so callers fail fast instead of waiting for
+every request to time out.
+"""
+
+import os
+import threading
+import time
+
+from .backends import BackendError
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(BackendError):
+    """Raised instead of calling the backend while the circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker.
+
+    The circuit opens after ``failure_threshold`` consecutive failures. While
+    open, allow() returns False without touching the backend. After
+    ``recovery_timeout`` seconds it becomes half-open and lets up to
+    ``half_open_max_calls`` probe calls through: a successful probe closes
+    the circuit, a failed one opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0, half_open_max_calls=1,
+                 clock=time.monotonic):
+        """
+        Args:
+            failure_threshold (int): Consecutive failures that open the circuit
+            recovery_timeout (float): Seconds the circuit stays open before probing
+            half_open_max_calls (int): Concurrent probe calls allowed while half-open
+            clock (callable): Monotonic time source, replaceable in tests
+        """
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1")
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._probes_in_flight = 0
+        self.times_opened = 0
+        self.rejected_calls = 0
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """
+        Build a breaker configured from WATSON_BREAKER_* environment variables.
+
+        Args:
+            environ (dict): Mapping to read instead of os.environ
+
+        Returns:
+            CircuitBreaker: Breaker configured for the current deployment
+        """
+        environ = os.environ if environ is None else environ
+        return cls(failure_threshold=int(environ.get('WATSON_BREAKER_THRESHOLD', 5)),
+                   recovery_timeout=float(environ.get('WATSON_BREAKER_RECOVERY', 30)),
+                   half_open_max_calls=int(environ.get('WATSON_BREAKER_PROBES', 1)))
+
+    @property
+    def state(self):
+        """str: Current state, one of 'closed', 'open' or 'half_open'."""
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        """Move from open to half-open once the recovery timeout elapsed; lock held."""
+        if self._state == OPEN and self._clock() - self._opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+        return self._state
+
+    def allow(self):
+        """
+        Decide whether a backend call may proceed.
+
+        Every call that is allowed must be followed by record_success(),
+        record_failure() or, when the caller gave up on it, release().
+
+        Returns:
+            bool: True to call the backend, False to fail fast
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes_in_flight < self.half_open_max_calls:
+                self._probes_in_flight += 1
+                return True
+            self.rejected_calls += 1
+            return False
+
+    def record_success(self):
+        """Record a call that reached a healthy backend."""
+        with self._lock:
+            self._consecutive_failures = 0
+            if self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._probes_in_flight = 0
+
+    def record_failure(self):
+        """Record a call that failed because of the backend."""
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == HALF_OPEN or \
+                    self._consecutive_failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.times_opened += 1
+                self._state = OPEN
+                self._opened_at = self._clock()
+                self._probes_in_flight = 0
+
+    def release(self):
+        """Give back a half-open probe slot for a call abandoned by its caller."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes_in_flight > 0:
+                self._probes_in_flight -= 1
+
+    def reset(self):
+        """Close the circuit and clear the failure count."""
+        with self._lock:
+            self._state = CLOSED
+            self._consecutive_failures = 0
+            self._probes_in_flight = 0
+
+    def stats(self):
+        """
+        Report the breaker state for monitoring.
+
+        Returns:
+            dict: State, consecutive failures, times opened and rejected calls
+        """
+        with self._lock:
+            return {
+                'state': self._current_state(),
+                'consecutive_failures': self._consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'times_opened': self.times_opened,
+                'rejected_calls': self.rejected_calls,
+            }
+
+
+_default_breaker = None
+_default_breaker_lock = threading.Lock()
+
+
+def get_default_breaker():
+    """
+    Return the breaker shared by every Watson client in the process.
+
+    Returns:
+        CircuitBreaker: Shared breaker configured from the environment
+    """
+    global _default_breaker  # pylint: disable=global-statement
+    if _default_breaker is None:
+        with _default_breaker_lock:
+            if _default_breaker is None:
+                _default_breaker = CircuitBreaker.from_env()
+    return _default_breaker
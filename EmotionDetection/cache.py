@@ -0,0 +1,218 @@
+"""
+Emotion Result Cache
+This module provides a bounded, thread-safe LRU cache with an optional TTL
+that sits in front of the emotion detection backend.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .results import EmotionResult
+
+
+def normalize_text(text):
+    """
+    Normalize text so that trivially different submissions share a cache entry.
+
+    Leading and trailing whitespace is removed, inner whitespace runs are
+    collapsed to a single space and the text is case-folded.
+
+    Args:
+        text (str): Raw text submitted for analysis
+
+    Returns:
+        str: Normalized text
+    """
+    return ' '.join(text.split()).casefold()
+
+
+class ResultCache:
+    """
+    Size-bounded LRU cache of emotion results with an optional time-to-live.
+
+    Entries are keyed on the normalized text plus the backend model id, so
+    results from different models never mix. Results are stored as compact
+    EmotionResult objects and handed out as fresh dictionaries. Any object
+    exposing the same get(text, model_id) and put(text, model_id, result)
+    methods can be used in its place by emotion_detector.
+    """
+
+    def __init__(self, maxsize=10000, ttl=None, clock=time.monotonic):
+        """
+        Args:
+            maxsize (int): Maximum number of results kept before evicting the oldest
+            ttl (float): Seconds an entry stays valid, or None to never expire
+            clock (callable): Monotonic time source, replaceable in tests
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(text, model_id):
+        """
+        Build the cache key for a text and model id.
+
+        Args:
+            text (str): Raw text submitted for analysis
+            model_id (str): Backend model id
+
+        Returns:
+            tuple: Hashable cache key
+        """
+        return (model_id, normalize_text(text))
+
+    def get(self, text, model_id):
+        """
+        Look up a cached result.
+
+        Args:
+            text (str): Raw text submitted for analysis
+            model_id (str): Backend model id
+
+        Returns:
+            dict: Copy of the cached result, or None on a miss
+        """
+        key = self.make_key(text, model_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, result = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return result.to_dict()
+
+    def put(self, text, model_id, result):
+        """
+        Store a result, evicting the least recently used entry when full.
+
+        Args:
+            text (str): Raw text submitted for analysis
+            model_id (str): Backend model id
+            result (dict): Emotion result to cache
+        """
+        key = self.make_key(text, model_id)
+        expires_at = None if self.ttl is None else self._clock() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires_at, EmotionResult.from_dict(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_many(self, texts, model_id):
+        """
+        Look up many cached results.
+
+        Args:
+            texts (list of str): Raw texts submitted for analysis
+            model_id (str): Backend model id
+
+        Returns:
+            list: Copy of the cached result or None per text, in input order
+        """
+        return [self.get(text, model_id) for text in texts]
+
+    def put_many(self, texts, model_id, results):
+        """
+        Store many results.
+
+        Args:
+            texts (list of str): Raw texts submitted for analysis
+            model_id (str): Backend model id
+            results (list of dict): One emotion result per text
+        """
+        for text, result in zip(texts, results):
+            self.put(text, model_id, result)
+
+    def clear(self):
+        """Remove every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def stats(self):
+        """
+        Report cache counters for monitoring.
+
+        Returns:
+            dict: Current size, capacity and hit/miss/eviction/expiration counters
+        """
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+_default_cache_configured = False
+
+
+def get_default_cache():
+    """
+    Return the process-wide result cache, creating it on first use.
+
+    The cache is sized by EMOTION_CACHE_SIZE (0 disables caching) and its
+    entries expire after EMOTION_CACHE_TTL seconds when that is set. When
+    EMOTION_STORE_PATH names a SQLite file, the cache is backed by a
+    persistent ScoreStore that survives restarts.
+
+    Returns:
+        ResultCache: Shared cache (a StoreBackedCache with a store), or None
+            when caching is disabled
+    """
+    global _default_cache, _default_cache_configured  # pylint: disable=global-statement
+    if not _default_cache_configured:
+        with _default_cache_lock:
+            if not _default_cache_configured:
+                maxsize = int(os.environ.get('EMOTION_CACHE_SIZE', 10000))
+                ttl = os.environ.get('EMOTION_CACHE_TTL')
+                if maxsize > 0:
+                    _default_cache = ResultCache(maxsize=maxsize,
+                                                 ttl=float(ttl) if ttl else None)
+                # Imported here because the store module imports this one
+                from .store import ScoreStore, StoreBackedCache  # pylint: disable=import-outside-toplevel
+                store = ScoreStore.from_env()
+                if store is not None:
+                    _default_cache = StoreBackedCache(store, memory=_default_cache)
+                _default_cache_configured = True
+    return _default_cache
+
+
+def set_default_cache(cache):
+    """
+    Replace the process-wide result cache.
+
+    Args:
+        cache (ResultCache): Cache to share, or None to disable caching
+    """
+    global _default_cache, _default_cache_configured  # pylint: disable=global-statement
+    with _default_cache_lock:
+        _default_cache = cache
+        _default_cache_configured = True
@@ -0,0 +1,239 @@
+"""
+Long-Text Chunking Module
+This module splits long texts on sentence boundaries, scores the chunks in
+parallel and merges their emotion scores weighted by chunk length, so long
+reviews and transcripts stay within backend size limits and their latency is
+bounded by the largest chunk instead of the whole text. Batches are chunked
+text by text, with the chunks of every long text scored in one batch.
+"""
+
+import os
+import re
+
+from .backends import EMOTIONS, empty_result
+from .emotion_detection import DEFAULT_BATCH_WORKERS, emotion_detector, emotion_detector_batch
+
+# Longest chunk, in characters, sent to the backend in one call
+DEFAULT_MAX_CHUNK_CHARS = int(os.environ.get('EMOTION_CHUNK_CHARS', 2000))
+
+# End of a sentence: terminal punctuation (and closing quotes or brackets)
+# followed by whitespace, or a line break
+_SENTENCE_END = re.compile(r'(?<=[.!?…])["\')\]]*\s+|\n\s*')
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def sentence_spans(text):
+    """
+    Find the sentences of a text.
+
+    Args:
+        text (str): Text to split
+
+    Returns:
+        list of tuple: (start, end) offsets of each non-blank sentence, without
+            surrounding whitespace
+    """
+    spans = []
+    start = 0
+    for end, next_start in [(match.start(), match.end())
+                            for match in _SENTENCE_END.finditer(text)] + [(len(text), None)]:
+        sentence = text[start:end]
+        stripped = sentence.strip()
+        if stripped:
+            # Trim surrounding whitespace off the span
+            offset = start + len(sentence) - len(sentence.lstrip())
+            spans.append((offset, offset + len(stripped)))
+        start = next_start
+    return spans
+
+
+def _split_long(start, end, text, max_chars):
+    """Split a span longer than max_chars on whitespace, or anywhere as a last resort."""
+    spans = []
+    while end - start > max_chars:
+        cut = start + max_chars
+        gap = None
+        for gap in _WHITESPACE.finditer(text, start, cut):
+            pass
+        if gap is not None and gap.start() > start:
+            spans.append((start, gap.start()))
+            start = gap.end()
+        else:
+            spans.append((start, cut))
+            start = cut
+    if start < end:
+        spans.append((start, end))
+    return spans
+
+
+def chunk_spans(text, max_chars=DEFAULT_MAX_CHUNK_CHARS):
+    """
+    Group consecutive sentences into chunks of at most ``max_chars`` characters.
+
+    Sentences longer than ``max_chars`` are split on whitespace.
+
+    Args:
+        text (str): Text to split
+        max_chars (int): Longest chunk in characters
+
+    Returns:
+        list of tuple: (start, end) offsets of each chunk, in text order
+    """
+    if max_chars < 1:
+        raise ValueError("max_chars must be at least 1")
+    chunks = []
+    # Chunk being filled, as (start, end); empty until the first piece
+    current = ()
+    for start, end in sentence_spans(text):
+        for piece in _split_long(start, end, text, max_chars):
+            if current and piece[1] - current[0] <= max_chars:
+                current = (current[0], piece[1])
+            else:
+                if current:
+                    chunks.append(current)
+                current = piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def merge_results(results, weights):
+    """
+    Average chunk results weighted by chunk length and recompute the dominant emotion.
+
+    Chunks without a detected emotion, such as failed ones, are left out.
+
+    Args:
+        results (list of dict): One emotion result per chunk
+        weights (list of float): One weight per chunk, e.g. its length
+
+    Returns:
+        dict: Merged emotion result; empty when no chunk had a detected emotion
+    """
+    scored = [(result, weight) for result, weight in zip(results, weights)
+              if result.get('dominant_emotion') is not None and weight > 0]
+    total_weight = sum(weight for _, weight in scored)
+    if not total_weight:
+        return empty_result()
+    merged = {emotion: sum(result[emotion] * weight for result, weight in scored) / total_weight
+              for emotion in EMOTIONS}
+    merged['dominant_emotion'] = max(EMOTIONS, key=merged.get)
+    return merged
+
+
+def emotion_detector_chunked(text_to_analyse, max_chars=DEFAULT_MAX_CHUNK_CHARS,
+                             max_workers=DEFAULT_BATCH_WORKERS, backend=None, cache=None,
+                             use_cache=True, include_chunks=False):
+    """
+    Detect emotions in a long text by scoring its chunks in parallel.
+
+    Texts of at most ``max_chars`` characters are scored in one call like
+    emotion_detector does. Longer texts are split on sentence boundaries,
+    the chunks are scored with emotion_detector_batch (cached and coalesced
+    per chunk) and their scores merged, weighted by chunk length.
+
+    Args:
+        text_to_analyse (str): Text to analyze for emotions
+        max_chars (int): Longest chunk in characters
+        max_workers (int): Maximum number of chunks scored concurrently
+        backend (EmotionBackend): Backend to use; defaults to the shared default backend
+        cache (ResultCache): Result cache to use; defaults to the shared cache
+        use_cache (bool): Whether to read from and write to the result cache
+        include_chunks (bool): Whether to add a 'chunks' list holding the start
+            and end offsets and the result of every chunk
+
+    Returns:
+        dict: Dictionary containing merged emotion scores and dominant emotion
+    """
+    spans = chunk_spans(text_to_analyse, max_chars) if len(text_to_analyse) > max_chars else None
+    if not spans or len(spans) == 1:
+        result = emotion_detector(text_to_analyse, backend=backend, cache=cache,
+                                  use_cache=use_cache)
+        if include_chunks:
+            result['chunks'] = [{'start': 0, 'end': len(text_to_analyse), 'result': dict(result)}]
+        return result
+
+    chunk_results = emotion_detector_batch([text_to_analyse[start:end] for start, end in spans],
+                                           max_workers=max_workers, backend=backend,
+                                           cache=cache, use_cache=use_cache)
+    result = merge_results(chunk_results, [end - start for start, end in spans])
+    if include_chunks:
+        result['chunks'] = [{'start': start, 'end': end, 'result': chunk_result}
+                            for (start, end), chunk_result in zip(spans, chunk_results)]
+    return result
+
+
+def split_batch(texts, max_chars=DEFAULT_MAX_CHUNK_CHARS):
+    """
+    Replace the long texts of a batch by their chunks.
+
+    Args:
+        texts (list): Texts to split; items that are not strings are kept as they are
+        max_chars (int): Longest chunk in characters
+
+    Returns:
+        tuple: Flat list of texts and chunks to score, and the layout that
+            merge_batch() needs to rebuild one result per input text
+    """
+    pieces = []
+    layout = []
+    for text in texts:
+        spans = (chunk_spans(text, max_chars)
+                 if isinstance(text, str) and len(text) > max_chars else None)
+        if not spans or len(spans) == 1:
+            # Scored whole, like emotion_detector_chunked does
+            layout.append((len(pieces), None))
+            pieces.append(text)
+        else:
+            layout.append((len(pieces), spans))
+            pieces.extend(text[start:end] for start, end in spans)
+    return pieces, layout
+
+
+def merge_batch(results, layout):
+    """
+    Merge the results of a batch split by split_batch() back into one result per text.
+
+    Args:
+        results (list of dict): One result per piece returned by split_batch()
+        layout (list): Layout returned by split_batch()
+
+    Returns:
+        list: One result dictionary per text of the original batch, in input order
+    """
+    merged = []
+    for first, spans in layout:
+        if spans is None:
+            merged.append(results[first])
+        else:
+            merged.append(merge_results(results[first:first + len(spans)],
+                                        [end - start for start, end in spans]))
+    return merged
+
+
+def emotion_detector_batch_chunked(texts, max_chars=DEFAULT_MAX_CHUNK_CHARS,
+                                   max_workers=DEFAULT_BATCH_WORKERS, backend=None, cache=None,
+                                   use_cache=True):
+    """
+    Detect emotions for many texts, scoring the long ones by chunks.
+
+    Texts longer than ``max_chars`` characters are split as by
+    emotion_detector_chunked, and the chunks of every text are scored
+    together with the short texts by one emotion_detector_batch call.
+
+    Args:
+        texts (list): Texts to analyze for emotions
+        max_chars (int): Longest chunk in characters
+        max_workers (int): Maximum number of texts and chunks scored concurrently
+        backend (EmotionBackend): Backend to use; defaults to the shared default backend
+        cache (ResultCache): Result cache to use; defaults to the shared cache
+        use_cache (bool): Whether to read from and write to the result cache
+
+    Returns:
+        list: One result dictionary per text, in input order
+    """
+    pieces, layout = split_batch(texts, max_chars)
+    results = emotion_detector_batch(pieces, max_workers=max_workers, backend=backend,
+                                     cache=cache, use_cache=use_cache)
+    return merge_batch(results, layout)
@@ -0,0 +1,361 @@
+"""
+Watson NLP Backend Client
+This module provides a reusable, thread-safe HTTP client for the Watson
+EmotionPredict endpoint that keeps connections alive between calls.
+"""
+
+import copy
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .backends import BackendError, EmotionBackend, empty_result, format_scores
+from .breaker import CircuitOpenError, get_default_breaker
+from .metrics import (BACKEND_IN_FLIGHT, BACKEND_LATENCY, BACKEND_RESPONSES, STAGE_LATENCY,
+                      record_backend_status)
+from .resilience import HedgePolicy, RetryBudget, RetryPolicy
+
+# Watson NLP Emotion Predict URL
+WATSON_URL = ('https://sn-watson-emotion.labs.skills.network'
+              '/v1/watson.runtime.nlp.v1/NlpService/EmotionPredict')
+
+# Model used when no other model id is configured
+DEFAULT_MODEL_ID = 'emotion_aggregated-workflow_lang_en_stock'
+
+
+def client_options_from_env(environ):
+    """
+    Read the WATSON_* settings shared by the sync and async clients.
+
+    Args:
+        environ (dict): Mapping to read, such as os.environ
+
+    Returns:
+        dict: Keyword arguments for WatsonClient or AsyncWatsonClient
+    """
+    return {'url': environ.get('WATSON_URL', WATSON_URL),
+            'model_id': environ.get('WATSON_MODEL_ID', DEFAULT_MODEL_ID),
+            'connect_timeout': float(environ.get('WATSON_CONNECT_TIMEOUT', 3.05)),
+            'read_timeout': float(environ.get('WATSON_READ_TIMEOUT', 10)),
+            'breaker': get_default_breaker(),
+            'retry_policy': RetryPolicy.from_env(environ),
+            'hedge_policy': HedgePolicy.from_env(environ)}
+
+
+class BackendCall:
+    """
+    Accounts for one Watson call: the in-flight gauge, its latency and the breaker.
+
+    Set ``healthy`` inside the block once the call's outcome is known. On
+    exit the breaker records a success or a failure, or gets its probe slot
+    back when ``healthy`` is still None, for a call abandoned by its caller.
+    """
+
+    def __init__(self, breaker, healthy=None):
+        """
+        Args:
+            breaker (CircuitBreaker): Circuit breaker guarding the backend, or None
+            healthy (bool): Outcome assumed when the block exits without setting one
+        """
+        self.breaker = breaker
+        self.healthy = healthy
+        self._started = None
+
+    def __enter__(self):
+        BACKEND_IN_FLIGHT.inc()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        BACKEND_IN_FLIGHT.dec()
+        elapsed = time.perf_counter() - self._started
+        BACKEND_LATENCY.observe(elapsed, backend='watson')
+        STAGE_LATENCY.observe(elapsed, stage='backend')
+        if self.breaker is not None:
+            if self.healthy is None:
+                self.breaker.release()
+            elif self.healthy:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+
+class WatsonClient(EmotionBackend):
+    """
+    Pooled, keep-alive client for the Watson EmotionPredict endpoint.
+
+    A single instance owns one requests.Session whose connection pool is
+    shared by every thread that calls post(), so the TCP connection and TLS
+    handshake are paid once per pooled connection instead of once per text.
+    Failed calls are retried by its RetryPolicy, and slow calls are hedged
+    by its HedgePolicy when one is set.
+    """
+
+    def __init__(self, url=WATSON_URL, model_id=DEFAULT_MODEL_ID, pool_maxsize=32,
+                 retries=2, backoff_factor=0.1, connect_timeout=3.05, read_timeout=10,
+                 breaker=None, retry_policy=None, hedge_policy=None):
+        """
+        Args:
+            url (str): Watson EmotionPredict endpoint
+            model_id (str): Value of the grpc-metadata-mm-model-id header
+            pool_maxsize (int): Maximum number of kept-alive connections per host
+            retries (int): Retries for network errors and 502/503/504 when no
+                retry_policy is given
+            backoff_factor (float): Backoff ceiling in seconds before the first retry when
+                no retry_policy is given
+            connect_timeout (float): Seconds to wait for a connection to be established
+            read_timeout (float): Seconds to wait for the backend response
+            breaker (CircuitBreaker): Circuit breaker guarding the backend, or None
+            retry_policy (RetryPolicy): Retry policy replacing retries and backoff_factor
+            hedge_policy (HedgePolicy): Hedged-request policy, or None to never hedge
+        """
+        self.url = url
+        self.breaker = breaker
+        self.pool_maxsize = pool_maxsize
+        self.model_id = model_id
+        self.timeout = (connect_timeout, read_timeout)
+        if retry_policy is None:
+            retry_policy = RetryPolicy(max_attempts=retries + 1, base_delay=backoff_factor,
+                                       budget=RetryBudget())
+        self.retry_policy = retry_policy
+        self.hedge_policy = hedge_policy
+        self._hedge_executor = None
+        self._hedge_executor_lock = threading.Lock()
+
+        # Retries happen in analyse(), under the retry budget, not in the transport
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0)
+
+        # Headers are set once on the session instead of being rebuilt per call
+        self.session = requests.Session()
+        self.session.headers.update({"grpc-metadata-mm-model-id": model_id})
+        # Model named by the session's header; clients derived for another model override it
+        self._session_model_id = model_id
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        _live_clients.add(self)
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """
+        Build a client configured from WATSON_* environment variables.
+
+        Args:
+            environ (dict): Mapping to read instead of os.environ
+
+        Returns:
+            WatsonClient: Client configured for the current deployment
+        """
+        environ = os.environ if environ is None else environ
+        return cls(pool_maxsize=int(environ.get('WATSON_POOL_SIZE', 32)),
+                   **client_options_from_env(environ))
+
+    def with_options(self, retry_policy=None, hedge_policy=None, model_id=None):
+        """
+        Derive a client with other retry or hedging policies, or another model, for some calls.
+
+        The derived client shares this client's session, connection pool and
+        circuit breaker, but hedges on threads of its own.
+
+        Args:
+            retry_policy (RetryPolicy): Retry policy to use instead of this client's
+            hedge_policy (HedgePolicy): Hedge policy to use instead of this client's
+            model_id (str): Model id to send instead of this client's
+
+        Returns:
+            WatsonClient: Client using the given policies and model
+        """
+        client = copy.copy(self)
+        if model_id is not None:
+            client.model_id = model_id
+        if retry_policy is not None:
+            client.retry_policy = retry_policy
+        if hedge_policy is not None:
+            client.hedge_policy = hedge_policy
+        return client
+
+    def __copy__(self):
+        client = object.__new__(type(self))
+        # Hedging threads are per client, so that a fork resets those of copies too
+        vars(client).update(vars(self), _hedge_executor=None,
+                            _hedge_executor_lock=threading.Lock())
+        _live_clients.add(client)
+        return client
+
+    def _reset_after_fork(self):
+        """Drop connections and hedging threads inherited from the parent process."""
+        self.session.close()
+        self._hedge_executor = None
+        self._hedge_executor_lock = threading.Lock()
+
+    def _get_hedge_executor(self):
+        """Create the threads running hedged calls lazily."""
+        if self._hedge_executor is None:
+            with self._hedge_executor_lock:
+                if self._hedge_executor is None:
+                    self._hedge_executor = ThreadPoolExecutor(
+                        max_workers=2 * self.pool_maxsize, thread_name_prefix='watson-hedge')
+        return self._hedge_executor
+
+    def _send(self, text_to_analyse):
+        """
+        Post one text under the hedging and retry policies.
+
+        Returns:
+            requests.Response: Backend response of the attempt that counted
+        """
+        def attempt():
+            if self.hedge_policy is None:
+                return self.post(text_to_analyse)
+            return self.hedge_policy.call(lambda: self.post(text_to_analyse),
+                                          self._get_hedge_executor())
+
+        if self.retry_policy is None:
+            return attempt()
+        return self.retry_policy.call(attempt)
+
+    def post(self, text_to_analyse):
+        """
+        Send one text to the EmotionPredict endpoint.
+
+        Args:
+            text_to_analyse (str): Text to analyze for emotions
+
+        Returns:
+            requests.Response: Raw backend response
+
+        Raises:
+            requests.exceptions.RequestException: On network errors or timeouts
+        """
+        headers = None
+        if self.model_id != self._session_model_id:
+            headers = {"grpc-metadata-mm-model-id": self.model_id}
+        return self.session.post(self.url, json={"raw_document": {"text": text_to_analyse}},
+                                 headers=headers, timeout=self.timeout)
+
+    def analyse(self, text_to_analyse):
+        """
+        Score one text with the Watson backend.
+
+        Args:
+            text_to_analyse (str): Text to analyze for emotions
+
+        Returns:
+            dict: Emotion result; an empty result when the backend rejects the text
+
+        Raises:
+            BackendError: On network errors or timeouts
+            CircuitOpenError: Without calling the backend while its circuit is open
+        """
+        breaker = self.breaker
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpenError("Watson backend circuit is open")
+
+        with BackendCall(breaker, healthy=False) as call:
+            try:
+                response = self._send(text_to_analyse)
+            except requests.exceptions.RequestException as error:
+                BACKEND_RESPONSES.inc(outcome='exception')
+                raise BackendError(str(error)) from error
+            call.healthy = response.status_code < 500
+
+        record_backend_status(response.status_code)
+        # Parsing the response
+        if response.status_code == 200:
+            with STAGE_LATENCY.time(stage='parse'):
+                return format_prediction(response.json())
+        # Bad Request (400) for invalid or blank input, or another HTTP error
+        return empty_result()
+
+    def analyse_batch(self, texts):
+        """
+        Score many texts with concurrent calls over the connection pool.
+
+        Args:
+            texts (list of str): Texts to analyze for emotions
+
+        Returns:
+            list: One result dictionary per text, in input order
+
+        Raises:
+            BackendError: When any call fails on network errors or timeouts
+        """
+        if len(texts) <= 1:
+            return [self.analyse(text) for text in texts]
+        with ThreadPoolExecutor(max_workers=min(self.pool_maxsize, len(texts))) as executor:
+            return list(executor.map(self.analyse, texts))
+
+    def close(self):
+        """Close every pooled connection and hedging thread held by the client."""
+        self.session.close()
+        if self._hedge_executor is not None:
+            self._hedge_executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def format_prediction(response_json):
+    """
+    Turn a successful EmotionPredict response body into the result format.
+
+    Args:
+        response_json (dict): Decoded JSON body of a 200 response
+
+    Returns:
+        dict: Dictionary containing emotion scores and dominant emotion
+    """
+    # Extract emotion scores
+    return format_scores(response_json['emotionPredictions'][0]['emotion'])
+
+
+# Clients whose pooled sockets a forked child (e.g. a gunicorn worker) must not reuse
+_live_clients = weakref.WeakSet()
+
+
+def _reset_clients_after_fork():
+    """Give every client of a forked child its own connections and threads."""
+    for client in list(_live_clients):
+        client._reset_after_fork()  # pylint: disable=protected-access
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_clients_after_fork)
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client():
+    """
+    Return the process-wide shared client, creating it on first use.
+
+    Returns:
+        WatsonClient: Shared client configured from the environment
+    """
+    global _default_client  # pylint: disable=global-statement
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = WatsonClient.from_env()
+    return _default_client
+
+
+def set_default_client(client):
+    """
+    Replace the process-wide shared client.
+
+    Args:
+        client (WatsonClient): Client to share, or None to recreate it lazily
+    """
+    global _default_client  # pylint: disable=global-statement
+    with _default_client_lock:
+        _default_client = client
@@ -3,92 +3,488 @@ Emotion Detection Module using Watson NLP
 This module provides emotion detection functionality for text analysis.
 """
 
-import requests
-import json
+from concurrent.futures import ThreadPoolExecutor
 
+from .backends import BackendError, empty_result, get_default_backend, get_fallback_backend
+from .breaker import get_default_breaker
+from .cache import get_default_cache, normalize_text
+from .metrics import BACKEND_RESPONSES
+from .preprocessing import get_default_preprocessor, prepare_text
+from .results import EmotionBatch
+from .similarity import get_default_similarity_index
+from .singleflight import get_default_single_flight
 
-def emotion_detector(text_to_analyse):
+# Default number of concurrent backend calls made by emotion_detector_batch
+DEFAULT_BATCH_WORKERS = 8
+
+
+def emotion_detector(text_to_analyse, backend=None, cache=None, use_cache=True, coalesce=True,
+                     similarity_index=None, use_similarity=True, preprocessor=None,
+                     preprocess=True):
     """
     Function to detect emotions in the provided text using Watson NLP.
 
+    The text is first cleaned by the preprocessor (HTML stripped, Unicode and
+    whitespace normalized, long texts truncated); a text left empty, or a
+    value that is not a string, gets the empty result without a backend call.
+    Successful backend results are stored in the result cache, and later
+    calls for the same normalized text and model are answered from it.
+    Concurrent calls for the same normalized text share one backend call.
+    When the backend is unreachable the text is scored by the fallback
+    backend (the local engine by default) and the result is not cached.
+
+    With a similarity index (enabled by EMOTION_SIMILARITY_THRESHOLD), a text
+    missing from the cache that is a near duplicate of an already scored one
+    reuses its scores: the result then has 'approximate' set to True and the
+    estimated 'similarity' of the two texts.
+
     Args:
         text_to_analyse (str): Text to analyze for emotions
+        backend (EmotionBackend): Backend to use; defaults to the shared default backend
+        cache (ResultCache): Result cache to use; defaults to the shared cache
+        use_cache (bool): Whether to read from and write to the result cache
+        coalesce (bool): Whether to share in-flight backend calls with concurrent callers
+        similarity_index (SimilarityIndex): Near-duplicate index; defaults to the shared one
+        use_similarity (bool): Whether to reuse and index scores of near duplicates
+        preprocessor (Preprocessor): Text preprocessor; defaults to the shared one
+        preprocess (bool): Whether to clean the text, e.g. False when it already was
 
     Returns:
         dict: Dictionary containing emotion scores and dominant emotion
     """
-    # Watson NLP Emotion Predict URL
-    url = 'https://sn-watson-emotion.labs.skills.network/v1/watson.runtime.nlp.v1/NlpService/EmotionPredict'
+    detection = _Detection.create(text_to_analyse, cache, use_cache, similarity_index,
+                                  use_similarity, preprocessor, preprocess)
+    if detection is None:
+        return empty_result()
+    backend = backend or get_default_backend()
+    return detection.known_result(backend.model_id) or _score(detection, backend, coalesce)
+
+
+def _score(detection, backend, coalesce):
+    """
+    Score a text missing from the cache, sharing the call with concurrent callers.
+
+    Args:
+        detection (_Detection): Text to score, with its cache and similarity index
+        backend (EmotionBackend): Backend to use
+        coalesce (bool): Whether to share in-flight backend calls with concurrent callers
 
-    # Headers for the request
-    headers = {
-        "grpc-metadata-mm-model-id": "emotion_aggregated-workflow_lang_en_stock"}
+    Returns:
+        dict: Dictionary containing emotion scores and dominant emotion
+    """
+    if coalesce:
+        # Every concurrent caller gets its own copy of the shared result
+        return dict(get_default_single_flight().do(
+            detection.flight_key, lambda: _analyse(detection, backend)))
+    return _analyse(detection, backend)
+
+
+class _Detection:
+    """
+    One text being scored by the sync or async detector.
+
+    Holds the result cache and similarity index consulted before the backend
+    call and fed after it, so both detectors apply the same rules.
+    """
 
-    # Input data for the request
-    myobj = {"raw_document": {"text": text_to_analyse}}
+    def __init__(self, text_to_analyse, cache=None, use_cache=True, similarity_index=None,
+                 use_similarity=True):
+        """
+        Args:
+            text_to_analyse (str): Cleaned text to score
+            cache (ResultCache): Result cache to use; defaults to the shared cache
+            use_cache (bool): Whether to read from and write to the result cache
+            similarity_index (SimilarityIndex): Near-duplicate index; defaults to the shared one
+            use_similarity (bool): Whether to reuse and index scores of near duplicates
+        """
+        self.text = text_to_analyse
+        self.model_id = None
+        self.cache = (get_default_cache() if cache is None else cache) if use_cache else None
+        if not use_similarity:
+            similarity_index = None
+        elif similarity_index is None:
+            similarity_index = get_default_similarity_index()
+        self.similarity_index = similarity_index
+
+    @classmethod
+    def create(cls, text_to_analyse, cache=None, use_cache=True, similarity_index=None,
+               use_similarity=True, preprocessor=None, preprocess=True):
+        """
+        Validate and clean a text, then set up its detection.
+
+        Args:
+            text_to_analyse (str): Text submitted for analysis
+            cache (ResultCache): Result cache to use; defaults to the shared cache
+            use_cache (bool): Whether to read from and write to the result cache
+            similarity_index (SimilarityIndex): Near-duplicate index; defaults to the shared one
+            use_similarity (bool): Whether to reuse and index scores of near duplicates
+            preprocessor (Preprocessor): Text preprocessor; defaults to the shared one
+            preprocess (bool): Whether to clean the text
+
+        Returns:
+            _Detection: Detection of the cleaned text, or None when the text gets
+                the empty result without a backend call: a value that is not a
+                string, or nothing left to score
+        """
+        if not isinstance(text_to_analyse, str):
+            # Not a text: answer as the backend answers invalid input, before it
+            # reaches the preprocessor or the cache key
+            return None
+        if preprocess:
+            text_to_analyse = prepare_text(text_to_analyse, preprocessor)
+        if not text_to_analyse or text_to_analyse.isspace():
+            return None
+        return cls(text_to_analyse, cache, use_cache, similarity_index, use_similarity)
+
+    @property
+    def flight_key(self):
+        """tuple: Key under which concurrent calls for this text and model are coalesced."""
+        return (self.model_id, normalize_text(self.text))
+
+    def known_result(self, model_id):
+        """
+        Answer without the backend when the text, or a near duplicate, was already scored.
+
+        Args:
+            model_id (str): Model id of the backend that would score the text
+
+        Returns:
+            dict: Cached result, a near duplicate's result marked 'approximate',
+                or None when the backend has to be called
+        """
+        self.model_id = model_id
+        if self.cache is not None:
+            cached_result = self.cache.get(self.text, model_id)
+            if cached_result is not None:
+                return cached_result
+
+        # Reuse the scores of a near-identical text scored by the same model
+        if self.similarity_index is not None:
+            match = self.similarity_index.query(self.text, model_id)
+            if match is not None:
+                result, similarity = match
+                result['approximate'] = True
+                result['similarity'] = round(similarity, 3)
+                return result
+        return None
+
+    def remember(self, result):
+        """
+        Cache and index a backend result, unless no emotion was detected.
+
+        Args:
+            result (dict): Emotion result returned by the backend
+
+        Returns:
+            dict: The result
+        """
+        if result['dominant_emotion'] is not None:
+            if self.cache is not None:
+                self.cache.put(self.text, self.model_id, result)
+            if self.similarity_index is not None:
+                self.similarity_index.add(self.text, self.model_id, result)
+        return result
+
+
+def _analyse(detection, backend):
+    """
+    Score a text with a backend and cache the result.
+
+    Args:
+        detection (_Detection): Text to score, with its cache and similarity index
+        backend (EmotionBackend): Backend to use
 
+    Returns:
+        dict: Dictionary containing emotion scores and dominant emotion
+    """
+    try:
+        result = backend.analyse(detection.text)
+    except BackendError:
+        # Handle network errors by scoring with the fallback backend
+        return _fallback_result(detection.text, backend)
+    return detection.remember(result)
+
+
+def _fallback_result(text_to_analyse, failed_backend=None):
+    """
+    Score a text with the fallback backend after the primary one failed.
+
+    Args:
+        text_to_analyse (str): Text to analyze for emotions
+        failed_backend (EmotionBackend): Backend that could not be reached
+
+    Returns:
+        dict: Fallback emotion result, or an empty result when no fallback is available
+    """
+    BACKEND_RESPONSES.inc(outcome='fallback')
+    fallback = get_fallback_backend()
+    if fallback is None or fallback is failed_backend:
+        return empty_result()
     try:
-        # Making the POST request
-        response = requests.post(url, json=myobj, headers=headers, timeout=10)
-
-        # Parsing the response
-        if response.status_code == 200:
-            response_json = response.json()
-
-            # Extract emotion scores
-            emotions = response_json['emotionPredictions'][0]['emotion']
-
-            # Find the dominant emotion
-            dominant_emotion = max(emotions, key=emotions.get)
-
-            # Format the output
-            formatted_output = {
-                'anger': emotions.get('anger', 0),
-                'disgust': emotions.get('disgust', 0),
-                'fear': emotions.get('fear', 0),
-                'joy': emotions.get('joy', 0),
-                'sadness': emotions.get('sadness', 0),
-                'dominant_emotion': dominant_emotion
-            }
-
-            return formatted_output
-        elif response.status_code == 400:
-            # Handle Bad Request (400) - usually invalid or blank input
-            return {
-                'anger': None,
-                'disgust': None,
-                'fear': None,
-                'joy': None,
-                'sadness': None,
-                'dominant_emotion': None
-            }
+        return fallback.analyse(text_to_analyse)
+    except BackendError:
+        return empty_result()
+
+
+def emotion_detector_batch(texts, max_workers=DEFAULT_BATCH_WORKERS, backend=None,
+                           cache=None, use_cache=True, compact=False, preprocessor=None,
+                           preprocess=True):
+    """
+    Function to detect emotions for many texts with bounded concurrency.
+
+    Texts are scored concurrently by up to ``max_workers`` threads, each one
+    calling emotion_detector. Backends that support batch scoring, such as the
+    local engine, instead score every uncached text in one analyse_batch call.
+    A failure on one text, including a value that is not a string, does not
+    abort the batch: its slot holds an empty result with an additional
+    'error' key. Texts are cleaned as by emotion_detector, and texts left
+    empty get the empty result without a backend call.
+
+    Args:
+        texts (iterable of str): Texts to analyze for emotions
+        max_workers (int): Maximum number of concurrent backend calls
+        backend (EmotionBackend): Backend shared by all workers
+        cache (ResultCache): Result cache shared by all workers
+        use_cache (bool): Whether to read from and write to the result cache
+        compact (bool): Whether to return an array-backed EmotionBatch instead of
+            a list of dictionaries, for keeping many results in memory
+        preprocessor (Preprocessor): Text preprocessor; defaults to the shared one
+        preprocess (bool): Whether to clean the texts, e.g. False when they already were
+
+    Returns:
+        list: One result dictionary per input text, in input order, or an
+            EmotionBatch when compact is set
+    """
+    texts = list(texts)
+    if texts and max_workers < 1:
+        raise ValueError("max_workers must be at least 1")
+    # Values that are not strings get an error slot before any bulk cache lookup
+    results = [empty_result() if isinstance(text, str) else
+               _error_result(TypeError(f"Text must be a string, not {type(text).__name__}"))
+               for text in texts]
+    if preprocess:
+        preprocessor = get_default_preprocessor() if preprocessor is None else preprocessor
+        if preprocessor is not None:
+            texts = [_prepare_or_error(text, preprocessor, results, index)
+                     for index, text in enumerate(texts)]
+    scorable = [index for index, text in enumerate(texts)
+                if isinstance(text, str) and text and not text.isspace()]
+
+    if scorable:
+        backend = backend or get_default_backend()
+        scorable_texts = [texts[index] for index in scorable]
+        if backend.supports_batch:
+            if use_cache and cache is None:
+                cache = get_default_cache()
+            scored = _detect_batch_vectorized(scorable_texts, backend,
+                                              cache if use_cache else None)
         else:
-            # Handle other HTTP error responses
-            return {
-                'anger': None,
-                'disgust': None,
-                'fear': None,
-                'joy': None,
-                'sadness': None,
-                'dominant_emotion': None
-            }
-    except (requests.exceptions.RequestException, requests.exceptions.Timeout):
-        # Handle network errors - for demo purposes, return mock data
-        # In production, this should handle the error appropriately
-        mock_emotions = {
-            'anger': 0.005,
-            'disgust': 0.002,
-            'fear': 0.001,
-            'joy': 0.987,
-            'sadness': 0.005
-        }
-        dominant_emotion = max(mock_emotions, key=mock_emotions.get)
-
-        return {
-            'anger': mock_emotions['anger'],
-            'disgust': mock_emotions['disgust'],
-            'fear': mock_emotions['fear'],
-            'joy': mock_emotions['joy'],
-            'sadness': mock_emotions['sadness'],
-            'dominant_emotion': dominant_emotion
-        }
+            scored = _detect_batch_pooled(scorable_texts, max_workers, backend, cache, use_cache)
+        for index, result in zip(scorable, scored):
+            results[index] = result
+    return EmotionBatch.from_results(results) if compact else results
+
+
+def _prepare_or_error(text, preprocessor, results, index):
+    """
+    Clean one text of a batch, turning any exception into an error slot.
+
+    Args:
+        text (str): Raw text, or a value already given an error slot
+        preprocessor (Preprocessor): Text preprocessor
+        results (list): Batch results; the text's slot is set when cleaning fails
+        index (int): Position of the text in the batch
+
+    Returns:
+        str: Cleaned text, or None when the text cannot be scored
+    """
+    if not isinstance(text, str):
+        return None
+    try:
+        return preprocessor.prepare(text)
+    except Exception as error:  # pylint: disable=broad-except
+        results[index] = _error_result(error)
+        return None
+
+
+def _detect_batch_pooled(texts, max_workers, backend, cache, use_cache):
+    """
+    Score the uncached texts of a batch with concurrent emotion_detector calls.
+
+    Cached results, including those of a persistent store, are fetched with
+    one bulk lookup first, so a re-run of known texts needs no worker at all.
+
+    Args:
+        texts (list of str): Texts to analyze for emotions
+        max_workers (int): Maximum number of concurrent backend calls
+        backend (EmotionBackend): Backend shared by all workers
+        cache (ResultCache): Result cache, or None for the shared one
+        use_cache (bool): Whether to read from and write to the result cache
+
+    Returns:
+        list: One result dictionary per input text, in input order
+    """
+    if use_cache:
+        cache = get_default_cache() if cache is None else cache
+        results = _cached_results(texts, backend.model_id, cache)
+    else:
+        results = [None] * len(texts)
+    missing = [index for index, result in enumerate(results) if result is None]
+    if not missing:
+        return results
+
+    options = {'backend': backend, 'cache': cache, 'use_cache': use_cache, 'preprocess': False}
+    if max_workers == 1 or len(missing) == 1:
+        # Scored on the calling thread, e.g. a worker of a stream's pool
+        for index in missing:
+            results[index] = _detect_or_error(texts[index], **options)
+        return results
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as executor:
+        scored = executor.map(lambda index: _detect_or_error(texts[index], **options), missing)
+        for index, result in zip(missing, scored):
+            results[index] = result
+    return results
+
+
+def _detect_or_error(text_to_analyse, **options):
+    """
+    Run emotion_detector and turn any exception into an error slot.
+
+    Args:
+        text_to_analyse (str): Text to analyze for emotions
+        **options: Keyword arguments forwarded to emotion_detector
+
+    Returns:
+        dict: Emotion result, or an empty result with an 'error' message
+    """
+    try:
+        return emotion_detector(text_to_analyse, **options)
+    except Exception as error:  # pylint: disable=broad-except
+        return _error_result(error)
+
+
+def _detect_batch_vectorized(texts, backend, cache):
+    """
+    Score the uncached texts of a batch with one analyse_batch call.
+
+    Args:
+        texts (list of str): Texts to analyze for emotions
+        backend (EmotionBackend): Backend that supports batch scoring
+        cache (ResultCache): Result cache, or None to bypass caching
+
+    Returns:
+        list: One result dictionary per input text, in input order
+    """
+    results = _cached_results(texts, backend.model_id, cache)
+    missing = [index for index, result in enumerate(results) if result is None]
+    if not missing:
+        return results
+
+    missing_texts = [texts[index] for index in missing]
+    try:
+        scored = backend.analyse_batch(missing_texts)
+    except BackendError:
+        scored = [_fallback_result(text, backend) for text in missing_texts]
+        cache = None
+    except Exception as error:  # pylint: disable=broad-except
+        scored = [_error_result(error) for _ in missing_texts]
+        cache = None
+
+    for index, result in zip(missing, scored):
+        results[index] = result
+    if cache is not None:
+        scored_indices = [index for index in missing
+                          if results[index]['dominant_emotion'] is not None]
+        put_many = getattr(cache, 'put_many', None)
+        if put_many is not None:
+            put_many([texts[index] for index in scored_indices], backend.model_id,
+                     [results[index] for index in scored_indices])
+        else:
+            for index in scored_indices:
+                cache.put(texts[index], backend.model_id, results[index])
+    return results
+
+
+def _cached_results(texts, model_id, cache):
+    """
+    Look up a batch of texts in the cache, in bulk when the cache supports it.
+
+    Args:
+        texts (list of str): Texts to look up
+        model_id (str): Backend model id
+        cache (ResultCache): Result cache, or None to bypass caching
+
+    Returns:
+        list: Cached result, None on a miss, or an error slot when the lookup
+            of that text failed, per text, in input order
+    """
+    if cache is None:
+        return [None] * len(texts)
+    get_many = getattr(cache, 'get_many', None)
+    if get_many is not None:
+        try:
+            return get_many(texts, model_id)
+        except Exception:  # pylint: disable=broad-except
+            # Look the texts up one by one so only those that fail get an error slot
+            pass
+    return [_cached_or_error(text, model_id, cache) for text in texts]
+
+
+def _cached_or_error(text, model_id, cache):
+    """
+    Look up one text in the cache, turning any exception into an error slot.
+
+    Returns:
+        dict: Cached result, None on a miss, or an empty result with an 'error' message
+    """
+    try:
+        return cache.get(text, model_id)
+    except Exception as error:  # pylint: disable=broad-except
+        return _error_result(error)
+
+
+def warmup(backend=None):
+    """
+    Load the shared scoring state ahead of the first text.
+
+    Builds the default backend and its fallback, the result cache, the
+    similarity index, the circuit breaker and the single-flight group, and
+    scores one text with each in-process backend so the local model and
+    NumPy are fully loaded. Called in a parent process before it forks
+    workers, as under gunicorn's preload_app, the workers share this state
+    copy-on-write instead of each loading it; remote clients still open
+    their connections in each worker.
+
+    Args:
+        backend (EmotionBackend): Backend to warm; defaults to the shared default backend
+
+    Returns:
+        EmotionBackend: The warmed backend
+    """
+    # Imported here so that importing this module does not load NumPy
+    from .local_engine import LocalEmotionEngine  # pylint: disable=import-outside-toplevel
+    backend = backend or get_default_backend()
+    fallback = get_fallback_backend()
+    get_default_cache()
+    get_default_similarity_index()
+    get_default_single_flight()
+    get_default_breaker()
+    for engine in {id(candidate): candidate for candidate in (backend, fallback)}.values():
+        if isinstance(engine, LocalEmotionEngine):
+            engine.analyse_batch(['Warming up the emotion model.'])
+    return backend
+
+
+def _error_result(error):
+    """
+    Build the error slot used by batch functions for a text that failed.
+
+    Args:
+        error (BaseException): Exception raised while scoring the text
+
+    Returns:
+        dict: Empty result with an additional 'error' message
+    """
+    result = empty_result()
+    result['error'] = str(error) or error.__class__.__name__
+    return result
@@ -0,0 +1,582 @@
+"""
+Background Scoring Jobs
+This module provides a SQLite-backed queue of scoring jobs and a runner that
+scores them chunk by chunk on background threads, so large submissions run to
+completion outside the request that submitted them, can be cancelled, and
+resume from their last finished chunk after a restart.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from itertools import count, islice
+
+from .emotion_detection import _error_result, emotion_detector_batch
+
+# Job states; queued and running jobs are picked up by runners
+UPLOADING, QUEUED, RUNNING = 'uploading', 'queued', 'running'
+COMPLETED, FAILED, CANCELLED = 'completed', 'failed', 'cancelled'
+
+# Error stored for the slot of an input that was not a text
+INVALID_TEXT_ERROR = 'Input must be a string.'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    grouping_key TEXT,
+    chunk_size INTEGER NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created);
+CREATE TABLE IF NOT EXISTS job_inputs (
+    job_id TEXT NOT NULL,
+    chunk INTEGER NOT NULL,
+    texts TEXT NOT NULL,
+    PRIMARY KEY (job_id, chunk)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS job_results (
+    job_id TEXT NOT NULL,
+    chunk INTEGER NOT NULL,
+    results TEXT NOT NULL,
+    PRIMARY KEY (job_id, chunk)
+) WITHOUT ROWID;
+'''
+
+_JOB_COLUMNS = ('id', 'status', 'key', 'chunk_size', 'total', 'done', 'error', 'created',
+                'updated')
+
+
+class JobQueue:
+    """
+    Durable queue of scoring jobs in a SQLite database.
+
+    Inputs and results are stored in chunks of ``chunk_size`` texts, so
+    neither submitting nor reading a job ever holds it whole in memory. A
+    running job whose runner stopped updating it for ``stale_after`` seconds,
+    for example because its process died, is queued again and continues
+    from its last finished chunk. A forked child process opens its own
+    connection, as SQLite connections must not cross a fork.
+    """
+
+    def __init__(self, path, chunk_size=500, stale_after=300.0, timeout=5.0):
+        """
+        Args:
+            path (str): SQLite database file, created when missing
+            chunk_size (int): Texts stored and scored per chunk
+            stale_after (float): Seconds without progress after which a running job is requeued
+            timeout (float): Seconds to wait for a lock held by another process
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        self.path = path
+        self.chunk_size = chunk_size
+        self.stale_after = stale_after
+        self.timeout = timeout
+        self._lock = threading.RLock()
+        self._pid = None
+        self._db = None
+        self._connection()
+
+    def _connection(self):
+        """Return the process's connection, opening a new one after a fork."""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    connection = sqlite3.connect(self.path, timeout=self.timeout,
+                                                 check_same_thread=False, isolation_level=None)
+                    connection.execute('PRAGMA journal_mode=WAL')
+                    connection.execute('PRAGMA synchronous=NORMAL')
+                    connection.executescript(_SCHEMA)
+                    self._db, self._pid = connection, os.getpid()
+        return self._db
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """
+        Open the queue named by EMOTION_JOBS_PATH.
+
+        Args:
+            environ (dict): Mapping to read instead of os.environ
+
+        Returns:
+            JobQueue: Queue at the configured path, or None when it is not set
+        """
+        environ = os.environ if environ is None else environ
+        path = environ.get('EMOTION_JOBS_PATH')
+        if not path:
+            return None
+        return cls(path, chunk_size=int(environ.get('EMOTION_JOB_CHUNK_SIZE', 500)))
+
+    def _transaction(self):
+        """Run a with block in one write transaction."""
+        return _Transaction(self)
+
+    def submit(self, texts, key=None):
+        """
+        Store a new job, reading its texts lazily chunk by chunk.
+
+        The job is queued only once every text is stored, so runners never
+        pick up a partial submission.
+
+        Args:
+            texts (iterable): Texts to score; items that are not strings get an error slot
+            key (str): Grouping key for the live statistics, or None
+
+        Returns:
+            dict: The queued job
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute(
+                'INSERT INTO jobs (id, status, grouping_key, chunk_size, created, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?)', (job_id, UPLOADING, key, self.chunk_size, now, now))
+
+        total = 0
+        iterator = iter(texts)
+        try:
+            for chunk in count():
+                batch = [text if isinstance(text, str) else None
+                         for text in islice(iterator, self.chunk_size)]
+                if not batch:
+                    break
+                with self._transaction() as connection:
+                    connection.execute('INSERT INTO job_inputs VALUES (?, ?, ?)',
+                                       (job_id, chunk, json.dumps(batch, ensure_ascii=False)))
+                total += len(batch)
+        except BaseException as error:
+            self._update(job_id, only_from=UPLOADING, status=FAILED,
+                         error=f'Upload failed: {error}')
+            raise
+
+        # A job cancelled during its upload stays cancelled, and can be resumed
+        self._update(job_id, total=total)
+        self._update(job_id, only_from=UPLOADING, status=QUEUED if total else COMPLETED)
+        return self.get(job_id)
+
+    def _update(self, job_id, only_from=None, **values):
+        """Set job columns and refresh its update time, only in status only_from if given."""
+        values['updated'] = time.time()
+        assignments = ', '.join(f'{name} = ?' for name in values)
+        condition = 'id = ?' if only_from is None else 'id = ? AND status = ?'
+        parameters = [job_id] if only_from is None else [job_id, only_from]
+        with self._transaction() as connection:
+            connection.execute(f'UPDATE jobs SET {assignments} WHERE {condition}',
+                               list(values.values()) + parameters)
+
+    def get(self, job_id):
+        """
+        Read a job.
+
+        Args:
+            job_id (str): Job id returned by submit
+
+        Returns:
+            dict: Job id, status, key, chunk size, total and done counts, error
+                and timestamps, or None for an unknown job
+        """
+        with self._lock:
+            row = self._connection().execute(
+                'SELECT id, status, grouping_key, chunk_size, total, done, error, created, '
+                'updated FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return dict(zip(_JOB_COLUMNS, row)) if row else None
+
+    def cancel(self, job_id):
+        """
+        Cancel a job; a running job stops after its current chunk.
+
+        Args:
+            job_id (str): Job id
+
+        Returns:
+            dict: The job, or None for an unknown job
+        """
+        with self._transaction() as connection:
+            connection.execute(
+                'UPDATE jobs SET status = ?, updated = ? WHERE id = ? AND status IN (?, ?, ?)',
+                (CANCELLED, time.time(), job_id, UPLOADING, QUEUED, RUNNING))
+        return self.get(job_id)
+
+    def resume(self, job_id):
+        """
+        Queue a cancelled or failed job again; it continues from its last finished chunk.
+
+        Args:
+            job_id (str): Job id
+
+        Returns:
+            dict: The job, or None for an unknown job
+        """
+        with self._transaction() as connection:
+            connection.execute(
+                'UPDATE jobs SET status = ?, error = NULL, updated = ? '
+                'WHERE id = ? AND status IN (?, ?) AND total > 0',
+                (QUEUED, time.time(), job_id, CANCELLED, FAILED))
+        return self.get(job_id)
+
+    def claim(self):
+        """
+        Take the oldest queued job for a runner, requeueing stale running jobs first.
+
+        Returns:
+            dict: The job, now running, or None when no job is waiting
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute('UPDATE jobs SET status = ? WHERE status = ? AND updated < ?',
+                               (QUEUED, RUNNING, now - self.stale_after))
+            row = connection.execute(
+                'SELECT id FROM jobs WHERE status = ? ORDER BY created LIMIT 1',
+                (QUEUED,)).fetchone()
+            if row is None:
+                return None
+            connection.execute('UPDATE jobs SET status = ?, updated = ? WHERE id = ?',
+                               (RUNNING, now, row[0]))
+        return self.get(row[0])
+
+    def heartbeat(self, job_id):
+        """
+        Refresh the update time of a running job, so it is not taken for stale.
+
+        Args:
+            job_id (str): Job id
+        """
+        with self._transaction() as connection:
+            connection.execute('UPDATE jobs SET updated = ? WHERE id = ? AND status = ?',
+                               (time.time(), job_id, RUNNING))
+
+    def release(self, job_id):
+        """
+        Give a running job back to the queue, e.g. when its runner shuts down.
+
+        Args:
+            job_id (str): Job id
+        """
+        with self._transaction() as connection:
+            connection.execute(
+                'UPDATE jobs SET status = ?, updated = ? WHERE id = ? AND status = ?',
+                (QUEUED, time.time(), job_id, RUNNING))
+
+    def pending_chunks(self, job_id):
+        """
+        Lazily read the chunks of a job that have no results yet.
+
+        Args:
+            job_id (str): Job id
+
+        Yields:
+            tuple: Chunk number and its list of texts (None for invalid inputs)
+        """
+        with self._lock:
+            chunks = [row[0] for row in self._connection().execute(
+                'SELECT chunk FROM job_inputs WHERE job_id = ? AND chunk NOT IN '
+                '(SELECT chunk FROM job_results WHERE job_id = ?) ORDER BY chunk',
+                (job_id, job_id))]
+        for chunk in chunks:
+            with self._lock:
+                row = self._connection().execute(
+                    'SELECT texts FROM job_inputs WHERE job_id = ? AND chunk = ?',
+                    (job_id, chunk)).fetchone()
+            if row is not None:
+                yield chunk, json.loads(row[0])
+
+    def save_chunk(self, job_id, chunk, results):
+        """
+        Store the results of a chunk and advance the job's progress.
+
+        Args:
+            job_id (str): Job id
+            chunk (int): Chunk number
+            results (list of dict): One result per text of the chunk
+
+        Returns:
+            bool: True while the job is still running, False once it was cancelled
+        """
+        with self._transaction() as connection:
+            stored = connection.execute(
+                'INSERT OR IGNORE INTO job_results VALUES (?, ?, ?)',
+                (job_id, chunk, json.dumps(results, ensure_ascii=False))).rowcount
+            connection.execute('UPDATE jobs SET done = done + ?, updated = ? WHERE id = ?',
+                               (len(results) if stored else 0, time.time(), job_id))
+            status = connection.execute('SELECT status FROM jobs WHERE id = ?',
+                                        (job_id,)).fetchone()
+        return status is not None and status[0] == RUNNING
+
+    def finish(self, job_id, error=None):
+        """
+        Mark a running job completed, or failed with an error.
+
+        The inputs of a completed job are deleted; its results are kept.
+
+        Args:
+            job_id (str): Job id
+            error (str): Error message of a failed job, or None
+        """
+        with self._transaction() as connection:
+            connection.execute('UPDATE jobs SET status = ?, error = ?, updated = ? '
+                               'WHERE id = ? AND status = ?',
+                               (FAILED if error else COMPLETED, error, time.time(), job_id,
+                                RUNNING))
+            if error is None:
+                connection.execute('DELETE FROM job_inputs WHERE job_id = ?', (job_id,))
+
+    def results(self, job_id, offset=0, limit=None):
+        """
+        Lazily read the stored results of a job, chunk by chunk.
+
+        Args:
+            job_id (str): Job id
+            offset (int): Index of the first result to read
+            limit (int): Most results to read, or None for all of them
+
+        Yields:
+            dict: Result of each finished text from ``offset`` on, in input order,
+                stopping at the first chunk not finished yet
+        """
+        job = self.get(job_id)
+        if job is None:
+            return
+        chunk_size = job['chunk_size']
+        chunk = offset // chunk_size
+        skip = offset % chunk_size
+        remaining = limit
+        while remaining is None or remaining > 0:
+            with self._lock:
+                row = self._connection().execute(
+                    'SELECT results FROM job_results WHERE job_id = ? AND chunk = ?',
+                    (job_id, chunk)).fetchone()
+            if row is None:
+                return
+            results = json.loads(row[0])[skip:]
+            if remaining is not None:
+                results = results[:remaining]
+                remaining -= len(results)
+            yield from results
+            chunk += 1
+            skip = 0
+
+    def delete(self, job_id):
+        """
+        Delete a job with its inputs and results.
+
+        Args:
+            job_id (str): Job id
+        """
+        with self._transaction() as connection:
+            for table, column in (('job_inputs', 'job_id'), ('job_results', 'job_id'),
+                                  ('jobs', 'id')):
+                connection.execute(f'DELETE FROM {table} WHERE {column} = ?', (job_id,))
+
+    def stats(self):
+        """
+        Count jobs per status for monitoring.
+
+        Returns:
+            dict: Number of jobs per status
+        """
+        with self._lock:
+            return dict(self._connection().execute(
+                'SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            if self._pid == os.getpid():
+                self._db.close()
+            self._pid = self._db = None
+
+
+class _Transaction:
+    """Context manager running a with block in one immediate write transaction."""
+
+    __slots__ = ('queue',)
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def __enter__(self):
+        self.queue._lock.acquire()  # pylint: disable=protected-access
+        connection = self.queue._connection()  # pylint: disable=protected-access
+        connection.execute('BEGIN IMMEDIATE')
+        return connection
+
+    def __exit__(self, exc_type, *exc_info):
+        connection = self.queue._connection()  # pylint: disable=protected-access
+        try:
+            connection.execute('ROLLBACK' if exc_type is not None else 'COMMIT')
+        finally:
+            self.queue._lock.release()  # pylint: disable=protected-access
+
+
+class _Heartbeat:
+    """Context manager refreshing a running job while one of its chunks is scored."""
+
+    __slots__ = ('queue', 'job_id', '_done', '_thread')
+
+    def __init__(self, queue, job_id):
+        self.queue = queue
+        self.job_id = job_id
+        self._done = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        # Several beats per stale_after period, so one missed beat is harmless
+        if self.queue.stale_after > 0:
+            self._thread = threading.Thread(target=self._beat, args=(self.queue.stale_after / 3,),
+                                            name='emotion-jobs-heartbeat', daemon=True)
+            self._thread.start()
+        return self
+
+    def _beat(self, interval):
+        while not self._done.wait(interval):
+            try:
+                self.queue.heartbeat(self.job_id)
+            except sqlite3.Error:
+                pass
+
+    def __exit__(self, *exc_info):
+        self._done.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class JobRunner:
+    """
+    Background threads scoring the jobs of a JobQueue.
+
+    Each thread claims one job at a time and scores its pending chunks with
+    emotion_detector_batch, storing results after every chunk. While a chunk
+    is scored, the job's update time is refreshed a few times per
+    ``stale_after`` period of the queue, so a slow chunk is not mistaken for a
+    dead runner. Several
+    processes may run runners on the same database; each job is claimed by
+    one of them. Like MicroBatcher, a runner restarts its threads in a
+    forked child process, and the queue opens its own connection there.
+    """
+
+    def __init__(self, queue, workers=1, batch_workers=8, backend=None, cache=None,
+                 aggregator=None, poll_interval=1.0):
+        """
+        Args:
+            queue (JobQueue): Queue to take jobs from
+            workers (int): Jobs scored concurrently
+            batch_workers (int): Concurrent backend calls per chunk
+            backend (EmotionBackend): Backend to use; defaults to the shared default backend
+            cache (ResultCache): Result cache to use; defaults to the shared cache
+            aggregator (EmotionAggregator): Live statistics fed with results, or None
+            poll_interval (float): Seconds an idle thread waits before looking for jobs again
+        """
+        self.queue = queue
+        self.workers = workers
+        self.batch_workers = batch_workers
+        self.backend = backend
+        self.cache = cache
+        self.aggregator = aggregator
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._pid = None
+
+    @classmethod
+    def from_env(cls, queue, environ=None, **options):
+        """
+        Build a runner with EMOTION_JOB_WORKERS threads.
+
+        Args:
+            queue (JobQueue): Queue to take jobs from
+            environ (dict): Mapping to read instead of os.environ
+            **options: Keyword arguments forwarded to the constructor
+
+        Returns:
+            JobRunner: Runner for the current deployment
+        """
+        environ = os.environ if environ is None else environ
+        return cls(queue, workers=int(environ.get('EMOTION_JOB_WORKERS', 1)), **options)
+
+    def start(self):
+        """Start the runner threads, again in a forked child process."""
+        if self._threads and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._threads and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            self._threads = [threading.Thread(target=self._run, name=f'emotion-jobs-{index}',
+                                              daemon=True)
+                             for index in range(self.workers)]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop the runner threads after their current chunk.
+
+        Jobs they were scoring are queued again and continue later.
+
+        Args:
+            timeout (float): Seconds to wait for each thread, or None to wait for ever
+        """
+        with self._lock:
+            threads, self._threads = self._threads, []
+            self._stop.set()
+        if self._pid == os.getpid():
+            for thread in threads:
+                thread.join(timeout)
+
+    def _run(self):
+        """Claim and score jobs until stopped."""
+        stop = self._stop
+        while not stop.is_set():
+            try:
+                job = self.queue.claim()
+            except sqlite3.Error:
+                job = None
+            if job is None:
+                stop.wait(self.poll_interval)
+                continue
+            self.run_job(job, stop)
+
+    def run_job(self, job, stop=None):
+        """
+        Score the pending chunks of a claimed job.
+
+        Args:
+            job (dict): Running job returned by JobQueue.claim
+            stop (threading.Event): Event asking to give the job back, or None
+        """
+        job_id = job['id']
+        try:
+            for chunk, texts in self.queue.pending_chunks(job_id):
+                if stop is not None and stop.is_set():
+                    self.queue.release(job_id)
+                    return
+                with _Heartbeat(self.queue, job_id):
+                    results = self._score(texts)
+                if self.aggregator is not None:
+                    self.aggregator.add_batch(results, key=job['key'])
+                if not self.queue.save_chunk(job_id, chunk, results):
+                    return
+            self.queue.finish(job_id)
+        except Exception as error:  # pylint: disable=broad-except
+            self.queue.finish(job_id, error=str(error) or type(error).__name__)
+
+    def _score(self, texts):
+        """Score a chunk, giving inputs that were not texts an error slot."""
+        valid = [index for index, text in enumerate(texts) if text is not None]
+        scored = emotion_detector_batch([texts[index] for index in valid],
+                                        max_workers=self.batch_workers, backend=self.backend,
+                                        cache=self.cache)
+        results = [_error_result(ValueError(INVALID_TEXT_ERROR)) for _ in texts]
+        for index, result in zip(valid, scored):
+            results[index] = result
+        return results
@@ -0,0 +1,232 @@
+"""
+Local Emotion Engine
+This module provides a CPU-only, in-process emotion backend: a lexicon-based
+linear model over the five emotions, scored with NumPy one batch at a time.
+"""
+
+import json
+import os
+import re
+
+import numpy as np
+
+from .backends import EMOTIONS, EmotionBackend, empty_result
+from .results import EmotionBatch
+
+# Built-in lexicon: word -> emotion it signals; each hit adds LEXICON_WEIGHT to that emotion
+DEFAULT_LEXICON = {
+    'anger': (
+        'angry', 'anger', 'furious', 'mad', 'hate', 'hated', 'hates', 'rage', 'outraged',
+        'annoyed', 'annoying', 'irritated', 'irritating', 'infuriating', 'frustrated',
+        'frustrating', 'unacceptable', 'ridiculous', 'rude', 'worst', 'scam', 'livid',
+        'pissed', 'fuming', 'hostile', 'insulting', 'useless', 'incompetent',
+    ),
+    'disgust': (
+        'disgusting', 'disgusted', 'gross', 'nasty', 'filthy', 'dirty', 'revolting',
+        'repulsive', 'vile', 'sickening', 'yuck', 'rotten', 'moldy', 'stinks', 'smelly',
+        'appalling', 'awful', 'horrible', 'unsanitary', 'greasy', 'slimy', 'foul',
+    ),
+    'fear': (
+        'afraid', 'scared', 'fear', 'frightened', 'terrified', 'terrifying', 'worried',
+        'worry', 'anxious', 'nervous', 'panic', 'dangerous', 'unsafe', 'threat', 'alarming',
+        'concerned', 'uneasy', 'risky', 'insecure', 'dread', 'scary', 'hacked', 'fraud',
+    ),
+    'joy': (
+        'happy', 'glad', 'joy', 'love', 'loved', 'loves', 'great', 'excellent', 'amazing',
+        'awesome', 'wonderful', 'fantastic', 'delighted', 'pleased', 'perfect', 'thanks',
+        'thank', 'best', 'enjoy', 'enjoyed', 'satisfied', 'recommend', 'friendly', 'helpful',
+        'good', 'nice', 'brilliant', 'superb', 'excited', 'impressed', 'smooth', 'fast',
+    ),
+    'sadness': (
+        'sad', 'unhappy', 'disappointed', 'disappointing', 'sorry', 'miss', 'missed',
+        'lonely', 'depressed', 'upset', 'regret', 'heartbroken', 'unfortunately', 'lost',
+        'crying', 'cried', 'hurt', 'gloomy', 'miserable', 'letdown', 'broken', 'poor',
+    ),
+}
+
+# Logit added to an emotion for each lexicon hit
+LEXICON_WEIGHT = 2.0
+
+# Multiplier applied to words shortly after a negator ("not happy")
+NEGATION_FACTOR = -0.5
+NEGATORS = frozenset(('not', 'no', 'never', "don't", "didn't", "isn't", "wasn't", "won't",
+                      "can't", 'cannot', 'hardly', 'nothing', 'without'))
+NEGATION_WINDOW = 3
+
+TOKEN_PATTERN = re.compile(r"[a-z]+(?:'[a-z]+)?")
+
+
+class LocalEmotionEngine(EmotionBackend):
+    """
+    Lexicon-based linear emotion model that runs in-process.
+
+    Each known word contributes a weight vector over the five emotions; the
+    summed vector plus a bias is turned into scores with a softmax. Words in
+    a short window after a negator contribute with a reduced, flipped weight.
+    Batches are scored with one vectorized NumPy accumulation.
+    """
+
+    supports_batch = True
+
+    def __init__(self, weights=None, bias=None, model_id='local-lexicon-v1'):
+        """
+        Args:
+            weights (dict): word -> sequence of five weights, one per emotion in EMOTIONS
+                order; defaults to the built-in lexicon
+            bias (sequence of float): Per-emotion bias logits
+            model_id (str): Model id used in cache keys
+        """
+        if weights is None:
+            weights = {}
+            for column, emotion in enumerate(EMOTIONS):
+                for word in DEFAULT_LEXICON[emotion]:
+                    vector = weights.setdefault(word, [0.0] * len(EMOTIONS))
+                    vector[column] += LEXICON_WEIGHT
+        self.model_id = model_id
+        self.vocabulary = {word: index for index, word in enumerate(weights)}
+        self.weights = np.array(list(weights.values()), dtype=np.float32).reshape(
+            len(weights), len(EMOTIONS))
+        self.bias = np.zeros(len(EMOTIONS), dtype=np.float32) if bias is None \
+            else np.asarray(bias, dtype=np.float32)
+
+    @classmethod
+    def from_json(cls, path):
+        """
+        Load a model from a JSON file of the form
+        {"model_id": ..., "bias": [...], "weights": {"word": [five weights]}}.
+
+        Args:
+            path (str): Path of the JSON model file
+
+        Returns:
+            LocalEmotionEngine: Engine using the stored weights
+        """
+        with open(path, encoding='utf-8') as model_file:
+            model = json.load(model_file)
+        return cls(weights=model['weights'], bias=model.get('bias'),
+                   model_id=model.get('model_id', 'local-lexicon-custom'))
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """
+        Build the engine from EMOTION_LOCAL_MODEL_PATH, or the built-in lexicon.
+
+        Args:
+            environ (dict): Mapping to read instead of os.environ
+
+        Returns:
+            LocalEmotionEngine: Engine configured for the current deployment
+        """
+        environ = os.environ if environ is None else environ
+        path = environ.get('EMOTION_LOCAL_MODEL_PATH')
+        return cls.from_json(path) if path else cls()
+
+    def _encode(self, text_to_analyse):
+        """
+        Turn a text into vocabulary indices and per-token multipliers.
+
+        Args:
+            text_to_analyse (str): Text to analyze for emotions
+
+        Returns:
+            tuple: Number of tokens, list of vocabulary indices, list of multipliers
+        """
+        tokens = TOKEN_PATTERN.findall(text_to_analyse.lower())
+        indices = []
+        factors = []
+        negated_until = -1
+        for position, token in enumerate(tokens):
+            if token in NEGATORS:
+                negated_until = position + NEGATION_WINDOW
+                continue
+            index = self.vocabulary.get(token)
+            if index is not None:
+                indices.append(index)
+                factors.append(NEGATION_FACTOR if position <= negated_until else 1.0)
+        return len(tokens), indices, factors
+
+    def score_matrix(self, texts):
+        """
+        Score many texts into a matrix of emotion probabilities.
+
+        Args:
+            texts (list of str): Texts to analyze for emotions
+
+        Returns:
+            tuple: (n, 5) float32 score matrix in EMOTIONS column order, and a
+                boolean mask of texts that contained at least one token
+        """
+        rows, columns, factors = [], [], []
+        has_tokens = np.zeros(len(texts), dtype=bool)
+        for row, text in enumerate(texts):
+            token_count, indices, text_factors = self._encode(text)
+            has_tokens[row] = token_count > 0
+            rows.extend([row] * len(indices))
+            columns.extend(indices)
+            factors.extend(text_factors)
+
+        # Sum each text's weighted word vectors in one scatter-add
+        logits = np.tile(self.bias, (len(texts), 1))
+        if rows:
+            contributions = self.weights[columns] * np.asarray(factors, dtype=np.float32)[:, None]
+            np.add.at(logits, np.asarray(rows), contributions)
+
+        # Softmax over the five emotions
+        logits -= logits.max(axis=1, keepdims=True)
+        scores = np.exp(logits)
+        scores /= scores.sum(axis=1, keepdims=True)
+        return scores, has_tokens
+
+    def score_batch(self, texts):
+        """
+        Score many texts into a compact EmotionBatch without per-text dictionaries.
+
+        Args:
+            texts (list of str): Texts to analyze for emotions
+
+        Returns:
+            EmotionBatch: One result per text, in input order
+        """
+        scores, has_tokens = self.score_matrix(texts)
+        return EmotionBatch.from_matrix(scores, has_tokens)
+
+    def analyse(self, text_to_analyse):
+        """
+        Score one text.
+
+        Args:
+            text_to_analyse (str): Text to analyze for emotions
+
+        Returns:
+            dict: Dictionary containing emotion scores and dominant emotion
+        """
+        return self.analyse_batch([text_to_analyse])[0]
+
+    def analyse_batch(self, texts):
+        """
+        Score many texts with one vectorized pass.
+
+        Texts without any word get an empty result, like a blank submission
+        to the Watson backend.
+
+        Args:
+            texts (list of str): Texts to analyze for emotions
+
+        Returns:
+            list: One result dictionary per text, in input order
+        """
+        if not texts:
+            return []
+        scores, has_tokens = self.score_matrix(texts)
+        dominant = scores.argmax(axis=1)
+
+        results = []
+        for row_scores, dominant_index, valid in zip(scores.tolist(), dominant.tolist(),
+                                                     has_tokens.tolist()):
+            if not valid:
+                results.append(empty_result())
+                continue
+            result = dict(zip(EMOTIONS, row_scores))
+            result['dominant_emotion'] = EMOTIONS[dominant_index]
+            results.append(result)
+        return results
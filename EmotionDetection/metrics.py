@@ -0,0 +1,356 @@
+"""
+Prometheus-Style Metrics
+This module provides low-overhead counters, gauges and histograms, a registry
+rendering them in the Prometheus text exposition format, and the metrics
+recorded by the detector, the backends and the web server.
+"""
+
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds in seconds of the default latency histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value):
+    """Format a sample value the way Prometheus expects."""
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names, values, extra=()):
+    """Format a label set, e.g. {route="/",status="200"}."""
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"'
+                          for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class _Metric:
+    """Base class holding one value per label combination."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        """
+        Args:
+            name (str): Metric name, e.g. 'emotion_backend_requests_total'
+            documentation (str): Help text shown in the exposition
+            labelnames (tuple of str): Names of the labels distinguishing series
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        """Turn label keyword arguments into the tuple identifying a series."""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """
+        List the current samples.
+
+        Returns:
+            list of tuple: (suffix, label values, extra labels, value) per sample
+        """
+        raise NotImplementedError
+
+    def render(self):
+        """
+        Render the metric in the text exposition format.
+
+        Returns:
+            list of str: HELP and TYPE lines followed by one line per sample
+        """
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for suffix, values, extra, value in self.samples():
+            lines.append(f'{self.name}{suffix}{_format_labels(self.labelnames, values, extra)} '
+                         f'{_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, such as responses by status; names end in _total."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """
+        Add to the counter.
+
+        Args:
+            amount (float): Non-negative increment
+            **labels: Value of every label of the metric
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """
+        Read one series.
+
+        Args:
+            **labels: Value of every label of the metric
+
+        Returns:
+            float: Current count, 0 for a series never incremented
+        """
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [('', key, (), value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, such as requests in flight."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        """
+        Args:
+            name (str): Metric name
+            documentation (str): Help text shown in the exposition
+            labelnames (tuple of str): Names of the labels distinguishing series
+            function (callable): Zero-argument function read at render time
+                instead of a stored value; only for unlabelled gauges
+        """
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def inc(self, amount=1, **labels):
+        """Add to the gauge."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        """Subtract from the gauge."""
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        """Set the gauge to a value."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        """
+        Read one series.
+
+        Returns:
+            float: Current value, 0 for a series never set
+        """
+        if self.function is not None:
+            return self.function()
+        return self._values.get(self._key(labels), 0)
+
+    @contextmanager
+    def track_in_progress(self, **labels):
+        """Count the duration of a with block as one unit in progress."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self):
+        if self.function is not None:
+            return [('', (), (), self.function())]
+        with self._lock:
+            return [('', key, (), value) for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values, such as latencies, in cumulative buckets."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        Args:
+            name (str): Metric name
+            documentation (str): Help text shown in the exposition
+            labelnames (tuple of str): Names of the labels distinguishing series
+            buckets (tuple of float): Sorted bucket upper bounds
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        """
+        Record one observation.
+
+        Args:
+            value (float): Observed value, e.g. seconds
+            **labels: Value of every label of the metric
+        """
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), observation count and sum
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a with block in seconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels):
+        """
+        Read the number of observations of one series.
+
+        Returns:
+            int: Observation count
+        """
+        series = self._values.get(self._key(labels))
+        return series[1] if series else 0
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total_count, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), counts):
+                    cumulative += count
+                    samples.append(('_bucket', key, (('le', _format_value(bound)),),
+                                    cumulative))
+                samples.append(('_count', key, (), total_count))
+                samples.append(('_sum', key, (), total))
+        return samples
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together by the /metrics endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def register(self, metric):
+        """
+        Add a metric, or return the one already registered under its name.
+
+        Args:
+            metric (_Metric): Counter, Gauge or Histogram
+
+        Returns:
+            _Metric: Registered metric
+        """
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        """Register and return a Counter."""
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        """Register and return a Gauge."""
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """Register and return a Histogram."""
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: Exposition text, served with CONTENT_TYPE
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+_default_registry = MetricsRegistry()
+
+
+def get_default_registry():
+    """
+    Return the process-wide metrics registry.
+
+    Returns:
+        MetricsRegistry: Registry holding the metrics defined in this module
+    """
+    return _default_registry
+
+
+# Backend calls, recorded by the Watson clients and the fallback path
+BACKEND_LATENCY = _default_registry.histogram(
+    'emotion_backend_request_seconds', 'Latency of backend scoring calls.', ('backend',))
+BACKEND_RESPONSES = _default_registry.counter(
+    'emotion_backend_responses_total',
+    'Backend outcomes: 200, 400, other status, exception or fallback.', ('outcome',))
+BACKEND_IN_FLIGHT = _default_registry.gauge(
+    'emotion_backend_in_flight', 'Backend calls currently waiting for an answer.')
+BACKEND_EXTRA_CALLS = _default_registry.counter(
+    'emotion_backend_extra_calls_total',
+    'Backend calls beyond the first attempt: retry, hedge or budget_exhausted.', ('kind',))
+
+# Time spent in each stage of a request: validate, backend, parse, render
+STAGE_LATENCY = _default_registry.histogram(
+    'emotion_stage_seconds', 'Time spent per processing stage.', ('stage',))
+
+# HTTP requests, recorded by the web server
+REQUEST_LATENCY = _default_registry.histogram(
+    'emotion_http_request_seconds', 'Latency of HTTP requests by route.', ('route', 'status'))
+REQUESTS_IN_FLIGHT = _default_registry.gauge(
+    'emotion_http_requests_in_flight', 'HTTP requests currently being handled.')
+
+# Admission control and rate limiting of scoring requests
+ADMISSION_QUEUE = _default_registry.gauge(
+    'emotion_admission_queued', 'Scoring requests waiting for a free slot.')
+ADMISSION_REJECTED = _default_registry.counter(
+    'emotion_admission_rejected_total',
+    'Requests turned away: rate_limited, queue_full or queue_timeout.', ('reason',))
+
+# Text preprocessing and language routing
+PREPROCESSED_TEXTS = _default_registry.counter(
+    'emotion_preprocessed_texts_total',
+    'Texts changed or answered by preprocessing: markup_stripped, truncated or empty.',
+    ('action',))
+ROUTED_TEXTS = _default_registry.counter(
+    'emotion_routed_texts_total', 'Texts routed by detected language.', ('language', 'route'))
+
+
+def record_backend_status(status_code):
+    """
+    Count one backend answer by HTTP status.
+
+    Args:
+        status_code (int): HTTP status returned by the backend
+    """
+    outcome = str(status_code) if status_code in (200, 400) else 'other'
+    BACKEND_RESPONSES.inc(outcome=outcome)
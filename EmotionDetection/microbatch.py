@@ -0,0 +1,221 @@
+"""
+Micro-Batching Dispatcher
+This module provides a backend wrapper that merges concurrent single-text
+requests into batches, trading a few milliseconds of latency for far fewer,
+larger backend calls.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .backends import EmotionBackend
+
+# Queue item telling the dispatcher thread to stop
+_STOP = object()
+
+
+class MicroBatcher(EmotionBackend):
+    """
+    Backend wrapper that queues analyse() calls and sends them as batches.
+
+    A dispatcher thread takes the first queued text, keeps collecting texts
+    for at most ``max_wait`` seconds or until ``max_batch_size`` texts are
+    queued, then scores them with one analyse_batch() call on the wrapped
+    backend and hands each caller its own result. Batches are scored on the
+    dispatcher thread itself, or on ``dispatch_workers`` threads so that a
+    slow remote backend can have several batches in flight.
+
+    Backends without batch scoring, such as the Watson client, get one
+    analyse() call per text of the batch, made concurrently, so a text that
+    fails or times out only fails its own caller.
+    """
+
+    def __init__(self, backend, max_batch_size=64, max_wait=0.005, dispatch_workers=0):
+        """
+        Args:
+            backend (EmotionBackend): Backend that scores the merged batches
+            max_batch_size (int): Maximum number of texts per batch
+            max_wait (float): Seconds to wait for more texts after the first one
+            dispatch_workers (int): Threads scoring batches; 0 scores on the dispatcher thread
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.backend = backend
+        self.model_id = backend.model_id
+        self.supports_batch = backend.supports_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.dispatch_workers = dispatch_workers
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._executor = None
+        self._item_executor = None
+        self._pid = None
+        self.batches = 0
+        self.items = 0
+
+    @classmethod
+    def from_env(cls, backend, environ=None):
+        """
+        Wrap a backend when EMOTION_MICROBATCH_SIZE enables micro-batching.
+
+        Args:
+            backend (EmotionBackend): Backend to wrap
+            environ (dict): Mapping to read instead of os.environ
+
+        Returns:
+            EmotionBackend: MicroBatcher around the backend, or the backend itself
+        """
+        environ = os.environ if environ is None else environ
+        max_batch_size = int(environ.get('EMOTION_MICROBATCH_SIZE', 0))
+        if max_batch_size <= 0 or backend is None:
+            return backend
+        return cls(backend, max_batch_size=max_batch_size,
+                   max_wait=float(environ.get('EMOTION_MICROBATCH_WAIT_MS', 5)) / 1000,
+                   dispatch_workers=int(environ.get('EMOTION_MICROBATCH_WORKERS', 0)))
+
+    def _ensure_started(self):
+        """Start the dispatcher thread, again in a forked child process."""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                if self.dispatch_workers > 0:
+                    self._executor = ThreadPoolExecutor(max_workers=self.dispatch_workers)
+                if not self.backend.supports_batch:
+                    # As many texts in flight as full batches on every dispatch thread
+                    self._item_executor = ThreadPoolExecutor(
+                        max_workers=self.max_batch_size * max(self.dispatch_workers, 1),
+                        thread_name_prefix='emotion-microbatch-item')
+                self._thread = threading.Thread(target=self._run, name='emotion-microbatch',
+                                                daemon=True)
+                self._thread.start()
+
+    def submit(self, text_to_analyse):
+        """
+        Queue one text for the next batch.
+
+        Args:
+            text_to_analyse (str): Text to analyze for emotions
+
+        Returns:
+            concurrent.futures.Future: Future resolved with the text's result
+        """
+        self._ensure_started()
+        future = Future()
+        self._queue.put((text_to_analyse, future))
+        return future
+
+    def analyse(self, text_to_analyse):
+        """
+        Score one text as part of the next batch.
+
+        Args:
+            text_to_analyse (str): Text to analyze for emotions
+
+        Returns:
+            dict: Dictionary containing emotion scores and dominant emotion
+
+        Raises:
+            BackendError: When the wrapped backend is unavailable
+        """
+        return self.submit(text_to_analyse).result()
+
+    def analyse_batch(self, texts):
+        """
+        Score a batch that is already assembled directly with the wrapped backend.
+
+        Args:
+            texts (list of str): Texts to analyze for emotions
+
+        Returns:
+            list: One result dictionary per text, in input order
+        """
+        return self.backend.analyse_batch(texts)
+
+    def _run(self):
+        """Collect queued texts into batches until stopped."""
+        pending = self._queue
+        stopping = False
+        while not stopping:
+            item = pending.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    item = pending.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            if self._executor is not None:
+                self._executor.submit(self._dispatch, batch)
+            else:
+                self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        """Score one batch and resolve the futures of its callers."""
+        if self._item_executor is not None:
+            self._count(batch)
+            for text, future in batch:
+                self._item_executor.submit(self._resolve, text, future)
+            return
+
+        texts = [text for text, _ in batch]
+        try:
+            results = self.backend.analyse_batch(texts)
+        except Exception as error:  # pylint: disable=broad-except
+            # One vectorized call: its failure is the failure of every text
+            for _, future in batch:
+                future.set_exception(error)
+            return
+        self._count(batch)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _resolve(self, text_to_analyse, future):
+        """Score one text of a batch and resolve its caller's future."""
+        try:
+            future.set_result(self.backend.analyse(text_to_analyse))
+        except Exception as error:  # pylint: disable=broad-except
+            future.set_exception(error)
+
+    def _count(self, batch):
+        """Count a dispatched batch."""
+        with self._lock:
+            self.batches += 1
+            self.items += len(batch)
+
+    def stats(self):
+        """
+        Report batching counters for monitoring.
+
+        Returns:
+            dict: Number of batches sent, texts scored and the mean batch size
+        """
+        with self._lock:
+            return {'batches': self.batches, 'items': self.items,
+                    'mean_batch_size': self.items / self.batches if self.batches else 0.0}
+
+    def close(self):
+        """Stop the dispatcher after the queued texts are scored."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and self._pid == os.getpid():
+            self._queue.put(_STOP)
+            thread.join()
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+            if self._item_executor is not None:
+                self._item_executor.shutdown(wait=True)
@@ -0,0 +1,105 @@
+"""
+Streaming Scoring Pipeline
+This module provides generator helpers that score an unbounded stream of
+texts with a bounded worker pool, in input order and in constant memory.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from .chunking import emotion_detector_batch_chunked
+from .emotion_detection import emotion_detector_batch
+
+
+def chunked(iterable, size):
+    """
+    Split an iterable into lists of at most ``size`` items, lazily.
+
+    Args:
+        iterable (iterable): Items to group
+        size (int): Maximum number of items per chunk
+
+    Yields:
+        list: Next chunk of items
+    """
+    if size < 1:
+        raise ValueError("size must be at least 1")
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def ordered_map(function, iterable, max_workers=8, max_in_flight=None):
+    """
+    Map a function over an iterable on a thread pool, yielding results in input order.
+
+    At most ``max_in_flight`` items are submitted ahead of the one being
+    yielded, so memory stays bounded however long the input is and a slow
+    consumer applies backpressure to the reader. Results are yielded in
+    between reads of the input, as soon as they and every earlier result are
+    ready, so an input iterator that blocks, such as a request body still
+    arriving, also holds back the results finished meanwhile. Closing the
+    generator early cancels the items that have not started yet.
+
+    Args:
+        function (callable): Function applied to each item
+        iterable (iterable): Items to process
+        max_workers (int): Number of worker threads
+        max_in_flight (int): Maximum number of submitted, unconsumed items;
+            defaults to twice max_workers
+
+    Yields:
+        object: function(item) for each item, in input order
+    """
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1")
+    max_in_flight = max(max_in_flight or 2 * max_workers, 1)
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for item in iterable:
+                pending.append(executor.submit(function, item))
+                while pending and (len(pending) >= max_in_flight or pending[0].done()):
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def score_stream(items, key=None, chunk_size=64, max_workers=8, max_chars=None, **options):
+    """
+    Score a stream of items chunk by chunk, yielding results in input order.
+
+    Each chunk is scored by emotion_detector_batch on one worker thread of
+    the stream's pool, so up to ``max_workers`` chunks are in flight at once
+    and batch-capable backends score a whole chunk in one call. With ``max_chars``, texts
+    longer than that are scored by chunks like emotion_detector_chunked does.
+
+    Args:
+        items (iterable): Texts, or records holding a text
+        key (callable): Extracts the text from an item; defaults to the item itself
+        chunk_size (int): Number of texts scored per batch call
+        max_workers (int): Number of chunks scored concurrently
+        max_chars (int): Longest text scored in one call, or None to never split texts
+        **options: Keyword arguments forwarded to emotion_detector_batch
+
+    Yields:
+        tuple: (item, result) for each item, in input order
+    """
+    def score_chunk(chunk):
+        texts = chunk if key is None else [key(item) for item in chunk]
+        if max_chars is not None:
+            return chunk, emotion_detector_batch_chunked(texts, max_chars, max_workers=1,
+                                                         **options)
+        return chunk, emotion_detector_batch(texts, max_workers=1, **options)
+
+    for chunk, results in ordered_map(score_chunk, chunked(items, chunk_size),
+                                      max_workers=max_workers):
+        yield from zip(chunk, results)
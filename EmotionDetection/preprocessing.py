@@ -0,0 +1,313 @@
+"""
+Text Preprocessing
+This module cleans texts before they are scored: it strips HTML markup,
+normalizes Unicode and whitespace and truncates very long texts, so markup
+and formatting neither reach the backend nor split cache entries, and texts
+left empty are answered without a backend call. It also guesses the
+language of a text cheaply, from its script and common words.
+"""
+
+import html
+import os
+import re
+import threading
+import unicodedata
+
+from .metrics import PREPROCESSED_TEXTS
+
+# Longest text, in characters, sent to the backend; longer texts are truncated
+DEFAULT_MAX_TEXT_CHARS = 10000
+
+# Characters of a text looked at to guess its language
+LANGUAGE_SAMPLE_CHARS = 1000
+
+# Elements recognised as markup; other words between '<' and '>', as in
+# 'if a<b and c>d', are left alone
+_HTML_TAGS = ('a', 'abbr', 'address', 'article', 'aside', 'audio', 'b', 'blockquote', 'body',
+              'br', 'button', 'caption', 'center', 'code', 'col', 'dd', 'del', 'div', 'dl', 'dt',
+              'em', 'figcaption', 'figure', 'font', 'footer', 'form', 'h[1-6]', 'head',
+              'header', 'hr', 'html', 'i', 'iframe', 'img', 'input', 'ins', 'label', 'li',
+              'link', 'main', 'mark', 'meta', 'nav', 'noscript', 'ol', 'option', 'p', 'pre',
+              'q', 's', 'section', 'select', 'small', 'source', 'span', 'strong', 'sub', 'sup',
+              'table', 'tbody', 'td', 'textarea', 'tfoot', 'th', 'thead', 'time', 'title', 'tr',
+              'u', 'ul', 'video', 'wbr')
+
+# Script and style elements, whose content is not text, then comments and
+# known tags whose attributes, if any, all have values
+_SCRIPT_OR_STYLE = re.compile(r'<(script|style)\b[^>]*>.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_TAG = re.compile(r'<!--.*?-->|</?(?:' + '|'.join(_HTML_TAGS) + r')(?![-\w])'
+                  r'(?:\s+[a-zA-Z_:][-\w:.]*\s*=\s*(?:"[^"]*"|\'[^\']*\'|[^\s"\'<>=`]+))*'
+                  r'\s*/?>', re.IGNORECASE | re.DOTALL)
+
+# Invisible format characters (zero-width spaces and joiners, BOM) and controls
+_INVISIBLE = re.compile('[\u0000-\u0008\u000b\u000c\u000e-\u001f\u007f'
+                        '\u200b-\u200f\u202a-\u202e\u2060-\u2064\ufeff]')
+
+# Letters of the scripts that identify a language on their own, checked in order:
+# Japanese uses kanji too, so kana are looked for before Han characters
+_SCRIPTS = (
+    ('ja', re.compile('[\u3040-\u30ff]')),
+    ('ko', re.compile('[\u1100-\u11ff\uac00-\ud7af]')),
+    ('zh', re.compile('[\u4e00-\u9fff]')),
+    ('ru', re.compile('[\u0400-\u04ff]')),
+    ('ar', re.compile('[\u0600-\u06ff]')),
+    ('he', re.compile('[\u0590-\u05ff]')),
+    ('el', re.compile('[\u0370-\u03ff]')),
+    ('hi', re.compile('[\u0900-\u097f]')),
+    ('th', re.compile('[\u0e00-\u0e7f]')),
+)
+
+_LATIN_LETTER = re.compile('[a-zA-Z\u00c0-\u024f]')
+_WORD = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+
+# Frequent words of each Latin-script language; a text is given the language
+# most of its words belong to
+_STOPWORDS = {
+    'en': frozenset(('the', 'and', 'is', 'was', 'it', 'this', 'that', 'with', 'for', 'you',
+                     'have', 'not', 'are', 'but', 'my', 'very', 'they', 'of', 'to', 'i')),
+    'es': frozenset(('el', 'los', 'las', 'es', 'y', 'que', 'muy', 'pero', 'por', 'con',
+                     'una', 'del', 'para', 'está', 'fue', 'lo', 'mi', 'su', 'como', 'más')),
+    'fr': frozenset(('le', 'les', 'et', 'est', 'que', 'très', 'mais', 'pour', 'avec', 'une',
+                     'des', 'du', 'je', 'pas', 'ce', 'c\'est', 'été', 'au', 'il', 'nous')),
+    'de': frozenset(('der', 'die', 'das', 'und', 'ist', 'nicht', 'sehr', 'aber', 'mit', 'ein',
+                     'eine', 'ich', 'war', 'für', 'auf', 'zu', 'es', 'wir', 'sie', 'auch')),
+    'pt': frozenset(('o', 'os', 'as', 'e', 'é', 'não', 'muito', 'mas', 'com', 'um', 'uma',
+                     'do', 'da', 'para', 'foi', 'eu', 'meu', 'isso', 'está', 'são')),
+    'it': frozenset(('il', 'gli', 'e', 'è', 'non', 'molto', 'ma', 'con', 'una', 'della',
+                     'per', 'che', 'sono', 'questo', 'mi', 'ho', 'ci', 'anche', 'più', 'stato')),
+    'nl': frozenset(('de', 'het', 'en', 'is', 'niet', 'zeer', 'maar', 'met', 'een', 'ik',
+                     'was', 'voor', 'op', 'dat', 'van', 'ook', 'wij', 'zijn', 'heel', 'erg')),
+}
+
+# Word -> languages it is a frequent word of
+_STOPWORD_LANGUAGES = {word: tuple(language for language, words in _STOPWORDS.items()
+                                    if word in words)
+                       for word in frozenset().union(*_STOPWORDS.values())}
+
+
+def strip_html(text):
+    """
+    Remove HTML markup from a text, keeping its visible text.
+
+    Only comments and tags of known HTML elements are removed, so prose
+    using '<' and '>' as comparison signs is kept as written.
+
+    Args:
+        text (str): Text that may contain tags and character references
+
+    Returns:
+        str: Text without script and style elements, tags or comments, with
+            character references such as &amp; decoded
+    """
+    if '<' in text:
+        text = _TAG.sub(' ', _SCRIPT_OR_STYLE.sub(' ', text))
+    if '&' in text:
+        text = html.unescape(text)
+    return text
+
+
+def normalize_unicode(text):
+    """
+    Normalize the Unicode form and whitespace of a text.
+
+    Args:
+        text (str): Text to normalize
+
+    Returns:
+        str: NFKC-normalized text without invisible characters, with
+            whitespace runs collapsed to single spaces and no surrounding whitespace
+    """
+    if not text.isascii():
+        text = _INVISIBLE.sub('', unicodedata.normalize('NFKC', text))
+    else:
+        text = _INVISIBLE.sub('', text)
+    return ' '.join(text.split())
+
+
+def truncate(text, max_chars):
+    """
+    Shorten a text to at most ``max_chars`` characters, at a word boundary when possible.
+
+    Args:
+        text (str): Text to shorten
+        max_chars (int): Longest text kept
+
+    Returns:
+        str: The text, or its beginning when it is longer than max_chars
+    """
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(' ', 0, max_chars + 1)
+    return text[:cut if cut > max_chars // 2 else max_chars].rstrip()
+
+
+def detect_language(text):
+    """
+    Guess the language of a text from its script and common words.
+
+    Texts in a script used by one language are identified by the script.
+    Latin-script texts are told apart by their frequent words, among English,
+    Spanish, French, German, Portuguese, Italian and Dutch. The guess takes
+    microseconds but needs a few words to go on.
+
+    Args:
+        text (str): Text to inspect
+
+    Returns:
+        str: ISO 639-1 language code, or None when the language is unclear
+    """
+    sample = text[:LANGUAGE_SAMPLE_CHARS]
+    if not sample.isascii():
+        latin = len(_LATIN_LETTER.findall(sample))
+        for language, script in _SCRIPTS:
+            letters = len(script.findall(sample))
+            if letters and letters >= latin:
+                return language
+
+    counts = dict.fromkeys(_STOPWORDS, 0)
+    for word in _WORD.findall(sample.lower()):
+        for language in _STOPWORD_LANGUAGES.get(word, ()):
+            counts[language] += 1
+    ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+    if ranked[0][1] == 0 or ranked[0][1] == ranked[1][1]:
+        return None
+    return ranked[0][0]
+
+
+class Preprocessor:
+    """
+    Cleans texts before they are scored and cached.
+
+    Markup is stripped, Unicode and whitespace are normalized and texts are
+    truncated to ``max_chars`` characters. Counters of the changes made are
+    kept for monitoring.
+    """
+
+    def __init__(self, strip_markup=True, max_chars=DEFAULT_MAX_TEXT_CHARS):
+        """
+        Args:
+            strip_markup (bool): Whether to remove HTML tags and decode character references
+            max_chars (int): Longest text kept, or None to never truncate
+        """
+        self.strip_markup = strip_markup
+        self.max_chars = max_chars
+        self._lock = threading.Lock()
+        self.texts = 0
+        self.markup_stripped = 0
+        self.truncated = 0
+        self.emptied = 0
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """
+        Build a preprocessor from EMOTION_PREPROCESS and EMOTION_MAX_TEXT_CHARS.
+
+        Args:
+            environ (dict): Mapping to read instead of os.environ
+
+        Returns:
+            Preprocessor: Preprocessor for the current deployment, or None when
+                EMOTION_PREPROCESS is 0
+        """
+        environ = os.environ if environ is None else environ
+        if environ.get('EMOTION_PREPROCESS', '1').lower() in ('0', 'false', 'no'):
+            return None
+        max_chars = int(environ.get('EMOTION_MAX_TEXT_CHARS', DEFAULT_MAX_TEXT_CHARS))
+        return cls(strip_markup=environ.get('EMOTION_STRIP_HTML', '1').lower()
+                   not in ('0', 'false', 'no'),
+                   max_chars=max_chars if max_chars > 0 else None)
+
+    def prepare(self, text):
+        """
+        Clean a text for scoring.
+
+        Args:
+            text (str): Raw text submitted for analysis
+
+        Returns:
+            str: Cleaned text; empty when nothing but markup or whitespace was left
+        """
+        cleaned = strip_html(text) if self.strip_markup else text
+        stripped = cleaned is not text and cleaned != text
+        cleaned = normalize_unicode(cleaned)
+        truncated = self.max_chars is not None and len(cleaned) > self.max_chars
+        if truncated:
+            cleaned = truncate(cleaned, self.max_chars)
+
+        with self._lock:
+            self.texts += 1
+            self.markup_stripped += stripped
+            self.truncated += truncated
+            self.emptied += not cleaned
+        if stripped:
+            PREPROCESSED_TEXTS.inc(action='markup_stripped')
+        if truncated:
+            PREPROCESSED_TEXTS.inc(action='truncated')
+        if not cleaned:
+            PREPROCESSED_TEXTS.inc(action='empty')
+        return cleaned
+
+    def stats(self):
+        """
+        Report preprocessing counters for monitoring.
+
+        Returns:
+            dict: Settings, texts seen and how many were stripped, truncated or emptied
+        """
+        with self._lock:
+            return {'strip_markup': self.strip_markup, 'max_chars': self.max_chars,
+                    'texts': self.texts, 'markup_stripped': self.markup_stripped,
+                    'truncated': self.truncated, 'emptied': self.emptied}
+
+
+def prepare_text(text, preprocessor=None):
+    """
+    Clean a text with a preprocessor, or the shared one.
+
+    Args:
+        text (str): Raw text submitted for analysis
+        preprocessor (Preprocessor): Preprocessor to use; defaults to the shared one
+
+    Returns:
+        str: Cleaned text, or the text itself when preprocessing is disabled;
+            empty when the text holds nothing to score
+    """
+    preprocessor = get_default_preprocessor() if preprocessor is None else preprocessor
+    if preprocessor is None:
+        return text if text.strip() else ''
+    return preprocessor.prepare(text)
+
+
+_default_preprocessor = None
+_default_preprocessor_lock = threading.Lock()
+_default_preprocessor_configured = False
+
+
+def get_default_preprocessor():
+    """
+    Return the process-wide preprocessor used by emotion_detector.
+
+    Returns:
+        Preprocessor: Shared preprocessor configured from the environment, or
+            None when EMOTION_PREPROCESS is 0
+    """
+    global _default_preprocessor, _default_preprocessor_configured  # pylint: disable=global-statement
+    if not _default_preprocessor_configured:
+        with _default_preprocessor_lock:
+            if not _default_preprocessor_configured:
+                _default_preprocessor = Preprocessor.from_env()
+                _default_preprocessor_configured = True
+    return _default_preprocessor
+
+
+def set_default_preprocessor(preprocessor):
+    """
+    Replace the process-wide preprocessor.
+
+    Args:
+        preprocessor (Preprocessor): Preprocessor to share, or None to score raw texts
+    """
+    global _default_preprocessor, _default_preprocessor_configured  # pylint: disable=global-statement
+    with _default_preprocessor_lock:
+        _default_preprocessor = preprocessor
+        _default_preprocessor_configured = True
@@ -0,0 +1,414 @@
+"""
+Retry and Hedging Policies
+This module provides the retry policy (exponential backoff with full jitter,
+limited by a retry budget) and the hedged-request policy used by the Watson
+clients to ride out transient failures and cut tail latency without
+amplifying load without bound.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import requests
+
+from .metrics import BACKEND_EXTRA_CALLS
+
+# HTTP status codes worth retrying
+RETRY_STATUS_CODES = (502, 503, 504)
+
+
+class RetryBudget:
+    """
+    Token bucket capping retries (or hedges) to a share of the traffic.
+
+    Every first attempt deposits ``ratio`` tokens and every retry spends one,
+    so retries stay below ``ratio`` times the request rate however badly the
+    backend fails. A floor of ``min_per_second`` tokens per second keeps a
+    little retry capacity at low traffic.
+    """
+
+    def __init__(self, ratio=0.1, min_per_second=1.0, max_tokens=20.0, clock=time.monotonic):
+        """
+        Args:
+            ratio (float): Tokens earned per first attempt
+            min_per_second (float): Tokens earned per second regardless of traffic
+            max_tokens (float): Most tokens that can be saved up for a burst
+            clock (callable): Monotonic time source, replaceable in tests
+        """
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = max_tokens
+        self._updated = clock()
+        self.spent = 0
+        self.rejected = 0
+
+    def _refill(self):
+        """Add the time-based tokens earned since the last update; lock held."""
+        now = self._clock()
+        self._tokens = min(self.max_tokens,
+                           self._tokens + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self):
+        """Earn tokens for one first attempt."""
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self):
+        """
+        Take one token for a retry or hedge.
+
+        Returns:
+            bool: True when the budget allows the extra call
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.spent += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def stats(self):
+        """
+        Report budget counters for monitoring.
+
+        Returns:
+            dict: Available tokens, spent tokens and rejected extra calls
+        """
+        with self._lock:
+            self._refill()
+            return {'tokens': self._tokens, 'spent': self.spent, 'rejected': self.rejected}
+
+
+class RetryPolicy:
+    """
+    Retries failed backend calls with exponential backoff and full jitter.
+
+    Attempt n (from 0) that fails with a network error or a retryable status
+    is followed by a random sleep of up to ``base_delay * 2 ** n`` seconds,
+    capped at ``max_delay``, as long as attempts and the retry budget last.
+    """
+
+    def __init__(self, max_attempts=3, base_delay=0.05, max_delay=1.0, budget=None,
+                 retry_statuses=RETRY_STATUS_CODES, sleep=time.sleep, rand=random.random):
+        """
+        Args:
+            max_attempts (int): Total attempts including the first one
+            base_delay (float): Backoff ceiling in seconds before the first retry
+            max_delay (float): Largest backoff in seconds
+            budget (RetryBudget): Budget shared by the calls using this policy, or None
+            retry_statuses (tuple of int): HTTP statuses that are retried
+            sleep (callable): Blocking sleep, replaceable in tests
+            rand (callable): Uniform [0, 1) random source, replaceable in tests
+        """
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.retry_statuses = tuple(retry_statuses)
+        self._sleep = sleep
+        self._rand = rand
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """
+        Build a policy configured from WATSON_RETRY* environment variables.
+
+        Args:
+            environ (dict): Mapping to read instead of os.environ
+
+        Returns:
+            RetryPolicy: Policy configured for the current deployment
+        """
+        environ = os.environ if environ is None else environ
+        ratio = float(environ.get('WATSON_RETRY_BUDGET', 0.1))
+        return cls(max_attempts=int(environ.get('WATSON_RETRIES', 2)) + 1,
+                   base_delay=float(environ.get('WATSON_RETRY_BASE_DELAY', 0.05)),
+                   max_delay=float(environ.get('WATSON_RETRY_MAX_DELAY', 1.0)),
+                   budget=RetryBudget(ratio=ratio) if ratio > 0 else None)
+
+    def backoff(self, attempt):
+        """
+        Draw the sleep before the retry following a failed attempt.
+
+        Args:
+            attempt (int): Index of the failed attempt, from 0
+
+        Returns:
+            float: Seconds to sleep
+        """
+        return self._rand() * min(self.max_delay, self.base_delay * 2 ** attempt)
+
+    def _should_retry(self, attempt, status):
+        """Decide whether another attempt may follow; spends budget when it may."""
+        if attempt + 1 >= self.max_attempts:
+            return False
+        if status is not None and status not in self.retry_statuses:
+            return False
+        if self.budget is not None and not self.budget.try_spend():
+            BACKEND_EXTRA_CALLS.inc(kind='budget_exhausted')
+            return False
+        BACKEND_EXTRA_CALLS.inc(kind='retry')
+        return True
+
+    def call(self, function):
+        """
+        Call a function returning a requests.Response, retrying transient failures.
+
+        Args:
+            function (callable): Zero-argument function sending one request
+
+        Returns:
+            requests.Response: First non-retryable response, or the last one
+
+        Raises:
+            requests.exceptions.RequestException: When the last attempt failed
+        """
+        if self.budget is not None:
+            self.budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                response = function()
+            except requests.exceptions.RequestException:
+                if not self._should_retry(attempt, None):
+                    raise
+            else:
+                if response.status_code not in self.retry_statuses or \
+                        not self._should_retry(attempt, response.status_code):
+                    return response
+            self._sleep(self.backoff(attempt))
+            attempt += 1
+
+    async def call_async(self, coroutine_function, errors):
+        """
+        Await a coroutine function returning (status, body), retrying transient failures.
+
+        Args:
+            coroutine_function (callable): Zero-argument coroutine function sending one request
+            errors (tuple): Exception types meaning the request failed in transit
+
+        Returns:
+            tuple: First non-retryable (status, body), or the last one
+        """
+        if self.budget is not None:
+            self.budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                answer = await coroutine_function()
+            except errors:
+                if not self._should_retry(attempt, None):
+                    raise
+            else:
+                if answer[0] not in self.retry_statuses or \
+                        not self._should_retry(attempt, answer[0]):
+                    return answer
+            await asyncio.sleep(self.backoff(attempt))
+            attempt += 1
+
+
+class HedgePolicy:
+    """
+    Sends a second, hedged call when the first one is slower than usual.
+
+    The hedge is sent after ``delay`` seconds when set, otherwise after the
+    ``quantile`` of the recently observed latencies, so that only the slowest
+    few percent of calls are hedged. Hedges are limited by their own budget,
+    and the first answer wins.
+    """
+
+    def __init__(self, delay=None, quantile=0.95, initial_delay=0.5, min_delay=0.005,
+                 window=1000, budget=None):
+        """
+        Args:
+            delay (float): Fixed hedge delay in seconds, or None to adapt to latency
+            quantile (float): Latency quantile after which calls are hedged
+            initial_delay (float): Delay used until enough latencies were observed
+            min_delay (float): Smallest adaptive delay in seconds
+            window (int): Number of recent latencies the quantile is computed over
+            budget (RetryBudget): Budget limiting hedges, or None for no limit
+        """
+        self.delay = delay
+        self.quantile = quantile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.budget = budget
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._cached_delay = None
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """
+        Build a policy from WATSON_HEDGE_* environment variables.
+
+        Hedging is enabled by WATSON_HEDGE_QUANTILE (e.g. 0.95) or a fixed
+        WATSON_HEDGE_DELAY_MS; WATSON_HEDGE_BUDGET caps hedges as a share of calls.
+
+        Args:
+            environ (dict): Mapping to read instead of os.environ
+
+        Returns:
+            HedgePolicy: Policy for the current deployment, or None when hedging is off
+        """
+        environ = os.environ if environ is None else environ
+        quantile = environ.get('WATSON_HEDGE_QUANTILE')
+        delay_ms = environ.get('WATSON_HEDGE_DELAY_MS')
+        if not quantile and not delay_ms:
+            return None
+        ratio = float(environ.get('WATSON_HEDGE_BUDGET', 0.05))
+        return cls(delay=float(delay_ms) / 1000 if delay_ms else None,
+                   quantile=float(quantile) if quantile else 0.95,
+                   budget=RetryBudget(ratio=ratio, max_tokens=10) if ratio > 0 else None)
+
+    def observe(self, latency):
+        """
+        Record the latency of a successful call.
+
+        Args:
+            latency (float): Seconds the call took
+        """
+        with self._lock:
+            self._latencies.append(latency)
+            # Recompute the quantile every 1% of the window, not on every call
+            if self._cached_delay is None or \
+                    len(self._latencies) % max(1, self._latencies.maxlen // 100) == 0:
+                self._cached_delay = self._compute_delay()
+
+    def _compute_delay(self):
+        """Quantile of the recent latencies; lock held."""
+        if len(self._latencies) < 20:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(self.quantile * len(ordered)))
+        return max(self.min_delay, ordered[index])
+
+    def hedge_delay(self):
+        """
+        Seconds to wait for the first call before hedging.
+
+        Returns:
+            float: Fixed delay, recent latency quantile, or the initial delay
+        """
+        if self.delay is not None:
+            return self.delay
+        cached = self._cached_delay
+        return self.initial_delay if cached is None else cached
+
+    def _allow_hedge(self):
+        """Spend budget for one hedge."""
+        if self.budget is not None and not self.budget.try_spend():
+            BACKEND_EXTRA_CALLS.inc(kind='budget_exhausted')
+            return False
+        BACKEND_EXTRA_CALLS.inc(kind='hedge')
+        with self._lock:
+            self.hedges += 1
+        return True
+
+    def call(self, function, executor):
+        """
+        Call a function, hedging it on an executor when it is slow.
+
+        The slower call is not interrupted; its answer is discarded.
+
+        Args:
+            function (callable): Zero-argument function sending one request
+            executor (concurrent.futures.Executor): Executor running the calls
+
+        Returns:
+            object: Answer of the first call to complete successfully
+        """
+        if self.budget is not None:
+            self.budget.deposit()
+        started = time.perf_counter()
+        primary = executor.submit(function)
+        done, _ = wait([primary], timeout=self.hedge_delay())
+        if done or not self._allow_hedge():
+            answer = primary.result()
+            self.observe(time.perf_counter() - started)
+            return answer
+
+        hedge = executor.submit(function)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    self.observe(time.perf_counter() - started)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def call_async(self, coroutine_function):
+        """
+        Await a coroutine function, hedging it when it is slow.
+
+        The slower call is cancelled as soon as one answers.
+
+        Args:
+            coroutine_function (callable): Zero-argument coroutine function sending one request
+
+        Returns:
+            object: Answer of the first call to complete successfully
+        """
+        if self.budget is not None:
+            self.budget.deposit()
+        started = time.perf_counter()
+        primary = asyncio.ensure_future(coroutine_function())
+        done, _ = await asyncio.wait([primary], timeout=self.hedge_delay())
+        if done or not self._allow_hedge():
+            try:
+                answer = await primary
+            finally:
+                primary.cancel()
+            self.observe(time.perf_counter() - started)
+            return answer
+
+        hedge = asyncio.ensure_future(coroutine_function())
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        self.observe(time.perf_counter() - started)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in (primary, hedge):
+                task.cancel()
+
+    def stats(self):
+        """
+        Report hedging counters for monitoring.
+
+        Returns:
+            dict: Current hedge delay, hedges sent and hedges that answered first
+        """
+        with self._lock:
+            return {'delay': self.hedge_delay(), 'hedges': self.hedges,
+                    'hedge_wins': self.hedge_wins}
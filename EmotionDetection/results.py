@@ -0,0 +1,287 @@
+"""
+Compact Emotion Results
+This module provides a slotted EmotionResult and an array-backed EmotionBatch
+that hold emotion scores with far less memory than one dictionary per text,
+and convert to and from the dictionary format returned by emotion_detector.
+NumPy is only imported by the methods taking or returning arrays, so caching
+results does not load it.
+"""
+
+from array import array
+
+from .backends import EMOTIONS
+
+# Position of each emotion in EMOTIONS, used for the compact dominant emotion index
+EMOTION_INDEX = {emotion: index for index, emotion in enumerate(EMOTIONS)}
+
+# Dominant emotion index meaning "no emotion detected"
+NO_EMOTION = -1
+
+
+class EmotionResult:
+    """
+    Emotion scores of one text in a fixed-size slotted object.
+
+    Scores are stored in EMOTIONS order and the dominant emotion as its index,
+    so a result takes a fraction of the memory of the equivalent dictionary.
+    Results can still be read like dictionaries, e.g. result['joy'].
+    """
+
+    __slots__ = ('scores', 'dominant_index', 'error')
+
+    def __init__(self, scores=None, dominant_index=NO_EMOTION, error=None):
+        """
+        Args:
+            scores (tuple of float): Scores in EMOTIONS order, or None when nothing was detected
+            dominant_index (int): Index of the dominant emotion in EMOTIONS, or NO_EMOTION
+            error (str): Error message of a batch slot that failed
+        """
+        self.scores = scores
+        self.dominant_index = dominant_index
+        self.error = error
+
+    @classmethod
+    def from_dict(cls, result):
+        """
+        Build a compact result from the dictionary format.
+
+        Args:
+            result (dict): Emotion result as returned by emotion_detector
+
+        Returns:
+            EmotionResult: Equivalent compact result
+        """
+        dominant_emotion = result.get('dominant_emotion')
+        if dominant_emotion is None:
+            return cls(error=result.get('error'))
+        return cls(tuple(result[emotion] for emotion in EMOTIONS),
+                   EMOTION_INDEX[dominant_emotion], result.get('error'))
+
+    @property
+    def dominant_emotion(self):
+        """str: Dominant emotion name, or None when nothing was detected."""
+        return EMOTIONS[self.dominant_index] if self.dominant_index != NO_EMOTION else None
+
+    def to_dict(self):
+        """
+        Convert to the dictionary format returned by emotion_detector.
+
+        Returns:
+            dict: Dictionary containing emotion scores and dominant emotion
+        """
+        result = dict(zip(EMOTIONS, self.scores or (None,) * len(EMOTIONS)))
+        result['dominant_emotion'] = self.dominant_emotion
+        if self.error is not None:
+            result['error'] = self.error
+        return result
+
+    def __getitem__(self, key):
+        if key == 'dominant_emotion':
+            return self.dominant_emotion
+        if key == 'error' and self.error is not None:
+            return self.error
+        index = EMOTION_INDEX[key]
+        return self.scores[index] if self.scores is not None else None
+
+    def get(self, key, default=None):
+        """
+        Read a field like dict.get.
+
+        Args:
+            key (str): Emotion name, 'dominant_emotion' or 'error'
+            default (object): Value returned for a missing field
+
+        Returns:
+            object: Field value, or default
+        """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other):
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        if not isinstance(other, EmotionResult):
+            return NotImplemented
+        return (self.scores, self.dominant_index, self.error) == \
+            (other.scores, other.dominant_index, other.error)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'EmotionResult({self.to_dict()!r})'
+
+
+class EmotionBatch:
+    """
+    Growable, column-oriented container of many emotion results.
+
+    Each emotion's scores live in their own float32 array, and the dominant
+    emotion indices in a signed byte array; texts without a detected emotion
+    hold NaN scores. Error messages are kept sparsely by position. Columns are
+    read into NumPy with one memory copy each for vectorized aggregation.
+    """
+
+    def __init__(self):
+        self._columns = tuple(array('f') for _ in EMOTIONS)
+        self._dominant = array('b')
+        self.errors = {}
+
+    @classmethod
+    def from_results(cls, results):
+        """
+        Build a batch from results in dictionary or EmotionResult form.
+
+        Args:
+            results (iterable): Emotion results
+
+        Returns:
+            EmotionBatch: Batch holding the results in order
+        """
+        batch = cls()
+        batch.extend(results)
+        return batch
+
+    @classmethod
+    def from_matrix(cls, scores, valid=None):
+        """
+        Build a batch from a score matrix without creating per-text objects.
+
+        Args:
+            scores (numpy.ndarray): (n, 5) scores in EMOTIONS column order
+            valid (numpy.ndarray): Boolean mask of rows with a detected emotion;
+                other rows become empty results
+
+        Returns:
+            EmotionBatch: Batch holding one result per row
+        """
+        import numpy as np  # pylint: disable=import-outside-toplevel
+        scores = np.asarray(scores, dtype=np.float32)
+        dominant = scores.argmax(axis=1).astype(np.int8) if len(scores) \
+            else np.zeros(0, dtype=np.int8)
+        if valid is not None:
+            scores = np.where(np.asarray(valid)[:, None], scores, np.float32(np.nan))
+            dominant[~np.asarray(valid)] = NO_EMOTION
+        batch = cls()
+        for column, values in zip(batch._columns, scores.T):
+            column.frombytes(np.ascontiguousarray(values).tobytes())
+        batch._dominant.frombytes(dominant.tobytes())
+        return batch
+
+    def append(self, result):
+        """
+        Add one result at the end of the batch.
+
+        Args:
+            result (dict or EmotionResult): Emotion result
+        """
+        if isinstance(result, dict):
+            result = EmotionResult.from_dict(result)
+        scores = result.scores or (float('nan'),) * len(EMOTIONS)
+        for column, score in zip(self._columns, scores):
+            column.append(score)
+        if result.error is not None:
+            self.errors[len(self._dominant)] = result.error
+        self._dominant.append(result.dominant_index)
+
+    def extend(self, results):
+        """
+        Add many results at the end of the batch.
+
+        Args:
+            results (iterable): Emotion results in dictionary or EmotionResult form
+        """
+        for result in results:
+            self.append(result)
+
+    def __len__(self):
+        return len(self._dominant)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        dominant_index = self._dominant[index]
+        scores = None if dominant_index == NO_EMOTION else \
+            tuple(column[index] for column in self._columns)
+        return EmotionResult(scores, dominant_index, self.errors.get(index))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def to_dicts(self):
+        """
+        Convert every result to the dictionary format.
+
+        Returns:
+            list of dict: One result dictionary per text, in order
+        """
+        return [result.to_dict() for result in self]
+
+    def column(self, emotion):
+        """
+        Read one emotion's scores as a NumPy array.
+
+        The array is a single memory copy of the column: a NumPy view would
+        stop the underlying array from growing while it is alive.
+
+        Args:
+            emotion (str): Emotion name from EMOTIONS
+
+        Returns:
+            numpy.ndarray: float32 scores, NaN for texts without a detected emotion
+        """
+        import numpy as np  # pylint: disable=import-outside-toplevel
+        return np.array(self._columns[EMOTION_INDEX[emotion]], dtype=np.float32)
+
+    def dominant_indices(self):
+        """
+        Read the dominant emotion indices as a NumPy array.
+
+        Returns:
+            numpy.ndarray: int8 indices into EMOTIONS, NO_EMOTION for texts without one
+        """
+        import numpy as np  # pylint: disable=import-outside-toplevel
+        return np.array(self._dominant, dtype=np.int8)
+
+    def to_numpy(self):
+        """
+        Copy the scores into one matrix.
+
+        Returns:
+            numpy.ndarray: (n, 5) float32 scores in EMOTIONS column order
+        """
+        import numpy as np  # pylint: disable=import-outside-toplevel
+        return np.column_stack([self.column(emotion) for emotion in EMOTIONS]) if len(self) \
+            else np.zeros((0, len(EMOTIONS)), dtype=np.float32)
+
+    def dominant_counts(self):
+        """
+        Count texts per dominant emotion.
+
+        Returns:
+            dict: Count per emotion name, plus None for texts without a detected emotion
+        """
+        import numpy as np  # pylint: disable=import-outside-toplevel
+        counts = np.bincount(self.dominant_indices().astype(np.int16) + 1,
+                             minlength=len(EMOTIONS) + 1).tolist()
+        return {None: counts[0], **dict(zip(EMOTIONS, counts[1:]))}
+
+    def mean_scores(self):
+        """
+        Average each emotion's score over texts with a detected emotion.
+
+        Returns:
+            dict: Mean score per emotion name, None when no text had one
+        """
+        detected = self.dominant_indices() != NO_EMOTION
+        if not detected.any():
+            return dict.fromkeys(EMOTIONS)
+        return {emotion: float(self.column(emotion)[detected].mean()) for emotion in EMOTIONS}
+
+    @property
+    def nbytes(self):
+        """int: Bytes used by the score and dominant emotion arrays."""
+        return sum(column.itemsize * len(column) for column in self._columns) + \
+            len(self._dominant)
@@ -0,0 +1,167 @@
+"""
+Language Routing
+This module provides a backend wrapper that guesses the language of every
+text and scores it with the model configured for that language, or answers
+it without a backend call when no model handles the language.
+"""
+
+import os
+
+from .backends import EmotionBackend, create_backend, empty_result
+from .metrics import ROUTED_TEXTS
+from .preprocessing import detect_language
+
+# Route taken by languages without a route of their own
+OTHER_LANGUAGES = '*'
+
+
+class LanguageRouter(EmotionBackend):
+    """
+    Backend sending each text to the backend configured for its language.
+
+    Languages are guessed with detect_language; texts whose language is
+    unclear are routed like ``default_language``. Languages without a route
+    of their own take the OTHER_LANGUAGES route. Texts routed to None get an
+    empty result with an 'error' message, without a backend call.
+    """
+
+    def __init__(self, routes, default_language='en'):
+        """
+        Args:
+            routes (dict): Language code or OTHER_LANGUAGES -> EmotionBackend, or None
+                to answer texts in that language without scoring them
+            default_language (str): Language assumed for texts whose language is unclear
+        """
+        self.routes = dict(routes)
+        self.default_language = default_language
+        self.backends = list({id(backend): backend for backend in self.routes.values()
+                              if backend is not None}.values())
+        self.supports_batch = bool(self.backends) and all(
+            backend.supports_batch for backend in self.backends)
+        # Results are cached under the whole routing table, so changing a route
+        # does not serve results of the previous model
+        self.model_id = 'routed:' + ','.join(
+            f"{language}={backend.model_id if backend is not None else 'none'}"
+            for language, backend in sorted(self.routes.items()))
+
+    @classmethod
+    def from_env(cls, backend, environ=None):
+        """
+        Wrap a backend when EMOTION_LANGUAGE_MODELS configures language routes.
+
+        The variable holds comma-separated ``language=target`` pairs, where a
+        target is 'default' for the wrapped backend, 'local' for the local
+        engine, 'watson:<model id>' for another Watson model, or 'none' to
+        leave the language unscored. The '*' language sets the route of every
+        other language and defaults to 'default'.
+
+        Args:
+            backend (EmotionBackend): Backend to wrap
+            environ (dict): Mapping to read instead of os.environ
+
+        Returns:
+            EmotionBackend: LanguageRouter around the backend, or the backend itself
+        """
+        environ = os.environ if environ is None else environ
+        specification = environ.get('EMOTION_LANGUAGE_MODELS', '').strip()
+        if not specification or backend is None:
+            return backend
+
+        routes = {OTHER_LANGUAGES: backend}
+        for entry in specification.split(','):
+            language, separator, target = entry.strip().partition('=')
+            if not separator or not language:
+                raise ValueError(f"Invalid EMOTION_LANGUAGE_MODELS entry: {entry!r}")
+            routes[language.strip().lower()] = _create_route(target.strip(), backend)
+        return cls(routes, default_language=environ.get('EMOTION_DEFAULT_LANGUAGE', 'en'))
+
+    def route(self, text_to_analyse):
+        """
+        Choose the backend of a text.
+
+        Args:
+            text_to_analyse (str): Text to analyze for emotions
+
+        Returns:
+            tuple: Language code and the backend scoring it, or None
+        """
+        language = detect_language(text_to_analyse) or self.default_language
+        if language in self.routes:
+            backend = self.routes[language]
+            ROUTED_TEXTS.inc(language=language, route=language)
+        else:
+            backend = self.routes.get(OTHER_LANGUAGES)
+            ROUTED_TEXTS.inc(language=language, route=OTHER_LANGUAGES)
+        return language, backend
+
+    def analyse(self, text_to_analyse):
+        """
+        Score one text with the backend of its language.
+
+        Args:
+            text_to_analyse (str): Text to analyze for emotions
+
+        Returns:
+            dict: Emotion result, or an empty result with an 'error' for an unscored language
+        """
+        language, backend = self.route(text_to_analyse)
+        if backend is None:
+            return _unsupported_result(language)
+        return backend.analyse(text_to_analyse)
+
+    def analyse_batch(self, texts):
+        """
+        Score many texts, one analyse_batch call per backend.
+
+        Args:
+            texts (list of str): Texts to analyze for emotions
+
+        Returns:
+            list: One result dictionary per text, in input order
+        """
+        results = {}
+        groups = {}
+        for index, text in enumerate(texts):
+            language, backend = self.route(text)
+            if backend is None:
+                results[index] = _unsupported_result(language)
+            else:
+                groups.setdefault(id(backend), (backend, []))[1].append(index)
+        for backend, indices in groups.values():
+            results.update(zip(indices,
+                               backend.analyse_batch([texts[index] for index in indices])))
+        return [results[index] for index in range(len(texts))]
+
+    def stats(self):
+        """
+        Describe the routing table for monitoring.
+
+        Returns:
+            dict: Default language and the model id of every route, None for unscored ones
+        """
+        return {'default_language': self.default_language,
+                'routes': {language: backend.model_id if backend is not None else None
+                           for language, backend in self.routes.items()}}
+
+    def close(self):
+        """Close every routed backend."""
+        for backend in self.backends:
+            backend.close()
+
+
+def _create_route(target, backend):
+    """Create the backend named by an EMOTION_LANGUAGE_MODELS target."""
+    if target == 'default':
+        return backend
+    if target.startswith('watson:'):
+        # Imported here because the client module imports the backends module
+        from .client import get_default_client  # pylint: disable=import-outside-toplevel
+        return get_default_client().with_options(model_id=target[len('watson:'):])
+    return create_backend(target)
+
+
+def _unsupported_result(language):
+    """Empty result for a text whose language is not scored."""
+    result = empty_result()
+    result['error'] = f"Language not supported: {language}"
+    return result
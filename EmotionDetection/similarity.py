@@ -0,0 +1,295 @@
+"""
+Near-Duplicate Similarity Index
+This module provides a MinHash/LSH index of scored texts, so a text that is
+nearly identical to one already scored (differing only in punctuation,
+casing, numbers or a few words) can reuse its scores without a backend call.
+NumPy is imported once an index is built, so the disabled index costs nothing.
+"""
+
+import os
+import re
+import threading
+from collections import deque
+
+from .cache import normalize_text
+
+# Characters per shingle
+SHINGLE_SIZE = 4
+
+# Runs of digits, such as order numbers, are compared as one placeholder
+_DIGITS = re.compile(r'\d+')
+
+# Punctuation and symbols do not change how similar two texts are
+_PUNCTUATION = re.compile(r'[^\w\s#]')
+
+# Multiplier combining the code points of a shingle into one 64-bit value
+_SHINGLE_BASE = 1000003
+
+
+def shingle_text(text):
+    """
+    Normalize a text for near-duplicate comparison.
+
+    Args:
+        text (str): Raw text submitted for analysis
+
+    Returns:
+        str: Case-folded text with digit runs replaced by '#', punctuation
+            removed and whitespace collapsed
+    """
+    text = _PUNCTUATION.sub(' ', _DIGITS.sub('#', normalize_text(text)))
+    return ' '.join(text.split())
+
+
+def _mix(values):
+    """SplitMix64 finalizer: a cheap, well-distributed 64-bit hash of each value."""
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xbf58476d1ce4e5b9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94d049bb133111eb)
+    return values ^ (values >> np.uint64(31))
+
+
+def _shingle_hashes(text):
+    """Hash every distinct character shingle of a normalized text."""
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    if len(codes) < SHINGLE_SIZE:
+        codes = np.concatenate([codes, np.zeros(SHINGLE_SIZE - len(codes), dtype=np.uint64)])
+    windows = len(codes) - SHINGLE_SIZE + 1
+    hashes = np.zeros(windows, dtype=np.uint64)
+    for offset in range(SHINGLE_SIZE):
+        hashes = hashes * np.uint64(_SHINGLE_BASE) + codes[offset:offset + windows]
+    return np.unique(hashes)
+
+
+class SimilarityIndex:
+    """
+    Thread-safe MinHash/LSH index of scored texts and their results.
+
+    Every text gets a MinHash signature of ``num_perm`` values over its
+    character shingles. Signatures are split into bands, and texts sharing a
+    band are candidates; the candidate whose estimated Jaccard similarity is
+    highest, and at least ``threshold``, is returned. The oldest entries are
+    dropped beyond ``max_entries``.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=64, max_entries=100000, seed=1):
+        """
+        Args:
+            threshold (float): Lowest estimated Jaccard similarity of a match, in (0, 1]
+            num_perm (int): MinHash values per signature
+            max_entries (int): Most texts kept in the index
+            seed (int): Seed of the MinHash permutations
+        """
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be in (0, 1]")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.max_entries = max_entries
+        self.bands, self.rows = _band_layout(num_perm, threshold)
+        import numpy as np  # pylint: disable=import-outside-toplevel
+        self._seeds = np.random.default_rng(seed).integers(
+            0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self._lock = threading.Lock()
+        # entry id -> (model id, signature, result)
+        self._entries = {}
+        self._order = deque()
+        # (model id, band, band values) -> set of entry ids
+        self._buckets = {}
+        # normalized text -> entry id, so re-adding a text replaces its entry
+        self._ids = {}
+        self._next_id = 0
+        self.queries = 0
+        self.hits = 0
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """
+        Build an index from EMOTION_SIMILARITY_* environment variables.
+
+        Args:
+            environ (dict): Mapping to read instead of os.environ
+
+        Returns:
+            SimilarityIndex: Index for the current deployment, or None when
+                EMOTION_SIMILARITY_THRESHOLD is unset
+        """
+        environ = os.environ if environ is None else environ
+        threshold = environ.get('EMOTION_SIMILARITY_THRESHOLD')
+        if not threshold:
+            return None
+        return cls(threshold=float(threshold),
+                   num_perm=int(environ.get('EMOTION_SIMILARITY_PERMUTATIONS', 64)),
+                   max_entries=int(environ.get('EMOTION_SIMILARITY_MAX_ENTRIES', 100000)))
+
+    def signature(self, text):
+        """
+        Compute the MinHash signature of a text.
+
+        Args:
+            text (str): Raw text submitted for analysis
+
+        Returns:
+            numpy.ndarray: ``num_perm`` uint32 MinHash values
+        """
+        import numpy as np  # pylint: disable=import-outside-toplevel
+        hashes = _shingle_hashes(shingle_text(text))
+        mixed = _mix(hashes[:, None] ^ self._seeds[None, :]).min(axis=0)
+        return (mixed >> np.uint64(32)).astype(np.uint32)
+
+    def _band_keys(self, model_id, signature):
+        """Bucket keys of a signature, one per band."""
+        return [(model_id, band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                for band in range(self.bands)]
+
+    def add(self, text, model_id, result):
+        """
+        Index a scored text.
+
+        Args:
+            text (str): Raw text submitted for analysis
+            model_id (str): Backend model id that scored it
+            result (dict): Emotion result with a dominant emotion
+        """
+        if result.get('dominant_emotion') is None:
+            return
+        signature = self.signature(text)
+        keys = self._band_keys(model_id, signature)
+        identity = (model_id, shingle_text(text))
+        with self._lock:
+            previous = self._ids.pop(identity, None)
+            if previous is not None:
+                self._remove(previous)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (model_id, signature, dict(result), keys, identity)
+            self._ids[identity] = entry_id
+            self._order.append(entry_id)
+            for key in keys:
+                self._buckets.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                oldest = self._order.popleft()
+                if oldest in self._entries:
+                    self._ids.pop(self._entries[oldest][4], None)
+                    self._remove(oldest)
+
+    def _remove(self, entry_id):
+        """Drop an entry and its bucket memberships; lock held."""
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        for key in entry[3]:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def query(self, text, model_id):
+        """
+        Find the most similar indexed text scored by the same model.
+
+        Args:
+            text (str): Raw text submitted for analysis
+            model_id (str): Backend model id
+
+        Returns:
+            tuple: Copy of the matching result and its estimated similarity,
+                or None when no indexed text reaches the threshold
+        """
+        import numpy as np  # pylint: disable=import-outside-toplevel
+        signature = self.signature(text)
+        keys = self._band_keys(model_id, signature)
+        with self._lock:
+            self.queries += 1
+            candidates = set()
+            for key in keys:
+                candidates.update(self._buckets.get(key, ()))
+            if not candidates:
+                return None
+            candidates = list(candidates)
+            signatures = np.stack([self._entries[entry_id][1] for entry_id in candidates])
+            similarities = (signatures == signature).mean(axis=1)
+            best = int(similarities.argmax())
+            if similarities[best] < self.threshold:
+                return None
+            self.hits += 1
+            return dict(self._entries[candidates[best]][2]), float(similarities[best])
+
+    def clear(self):
+        """Drop every indexed text."""
+        with self._lock:
+            self._entries.clear()
+            self._order.clear()
+            self._buckets.clear()
+            self._ids.clear()
+
+    def stats(self):
+        """
+        Report index counters for monitoring.
+
+        Returns:
+            dict: Threshold, band layout, entry count and query/hit counters
+        """
+        with self._lock:
+            return {'threshold': self.threshold, 'bands': self.bands, 'rows': self.rows,
+                    'entries': len(self._entries), 'queries': self.queries, 'hits': self.hits}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _band_layout(num_perm, threshold):
+    """
+    Choose bands and rows per band for the LSH.
+
+    Texts of Jaccard similarity s share a band with probability
+    1 - (1 - s ** rows) ** bands, an S-curve rising around
+    (1 / bands) ** (1 / rows). The layout puts that point a little below the
+    threshold, so matches are rarely missed while few dissimilar texts are
+    compared.
+
+    Returns:
+        tuple: Number of bands and rows per band, with bands * rows == num_perm
+    """
+    target = max(threshold - 0.15, 0.05)
+    layouts = [(num_perm // rows, rows) for rows in range(1, num_perm + 1)
+               if num_perm % rows == 0]
+    return min(layouts, key=lambda layout: abs((1 / layout[0]) ** (1 / layout[1]) - target))
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+_default_index_configured = False
+
+
+def get_default_similarity_index():
+    """
+    Return the process-wide similarity index used by emotion_detector.
+
+    Returns:
+        SimilarityIndex: Shared index configured from the environment, or None
+            unless EMOTION_SIMILARITY_THRESHOLD is set
+    """
+    global _default_index, _default_index_configured  # pylint: disable=global-statement
+    if not _default_index_configured:
+        with _default_index_lock:
+            if not _default_index_configured:
+                _default_index = SimilarityIndex.from_env()
+                _default_index_configured = True
+    return _default_index
+
+
+def set_default_similarity_index(index):
+    """
+    Replace the process-wide similarity index.
+
+    Args:
+        index (SimilarityIndex): Index to share, or None to disable near-duplicate reuse
+    """
+    global _default_index, _default_index_configured  # pylint: disable=global-statement
+    with _default_index_lock:
+        _default_index = index
+        _default_index_configured = True
@@ -0,0 +1,166 @@
+"""
+Request Coalescing (Single-Flight)
+This module lets concurrent callers asking for the same key share one
+in-flight computation, in thread-based and asyncio flavors. asyncio is only
+imported by the asyncio flavor, which runs inside an event loop anyway.
+"""
+
+import threading
+import weakref
+
+
+class _Call:
+    """One in-flight computation and the outcome its followers wait for."""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Thread-safe single-flight group.
+
+    The first thread calling do() for a key runs the function; threads that
+    ask for the same key while it runs wait and receive the same result, or
+    the same exception.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, function):
+        """
+        Run function once for all concurrent callers of the same key.
+
+        Args:
+            key (hashable): Identity of the computation
+            function (callable): Zero-argument function computing the result
+
+        Returns:
+            object: Result of the shared call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        """
+        Report coalescing counters for monitoring.
+
+        Returns:
+            dict: Calls in flight, executed calls and coalesced callers
+        """
+        with self._lock:
+            return {'in_flight': len(self._calls), 'executions': self.executions,
+                    'coalesced': self.coalesced}
+
+
+class AsyncSingleFlight:
+    """
+    Asyncio single-flight group.
+
+    The first coroutine calling do() for a key starts a task; coroutines that
+    ask for the same key while it runs await the same task. Each caller
+    awaits it through asyncio.shield, so cancelling one caller does not
+    cancel the shared call for the others.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key, coroutine_function):
+        """
+        Run coroutine_function once for all concurrent callers of the same key.
+
+        Args:
+            key (hashable): Identity of the computation
+            coroutine_function (callable): Zero-argument coroutine function computing the result
+
+        Returns:
+            object: Result of the shared call
+        """
+        import asyncio  # pylint: disable=import-outside-toplevel
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coroutine_function())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        """Drop a finished task unless a newer one already replaced it."""
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+
+    def stats(self):
+        """
+        Report coalescing counters for monitoring.
+
+        Returns:
+            dict: Calls in flight, executed calls and coalesced callers
+        """
+        return {'in_flight': len(self._tasks), 'executions': self.executions,
+                'coalesced': self.coalesced}
+
+
+_default_single_flight = SingleFlight()
+_default_async_single_flights = weakref.WeakKeyDictionary()
+
+
+def get_default_single_flight():
+    """
+    Return the process-wide thread-safe single-flight group.
+
+    Returns:
+        SingleFlight: Shared group used by emotion_detector
+    """
+    return _default_single_flight
+
+
+def get_default_async_single_flight():
+    """
+    Return the single-flight group of the running event loop.
+
+    Returns:
+        AsyncSingleFlight: Group used by async_emotion_detector on this loop
+    """
+    import asyncio  # pylint: disable=import-outside-toplevel
+    loop = asyncio.get_running_loop()
+    group = _default_async_single_flights.get(loop)
+    if group is None:
+        group = _default_async_single_flights[loop] = AsyncSingleFlight()
+    return group
@@ -0,0 +1,357 @@
+"""
+Persistent Score Store
+This module provides a content-addressed SQLite store of emotion results that
+survives process restarts, and a cache that puts the in-memory ResultCache in
+front of it, so re-runs and warm restarts skip the backend for known texts.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from .backends import EMOTIONS
+from .cache import normalize_text
+from .results import EMOTION_INDEX, NO_EMOTION
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_CHUNK = 500
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS scores (
+    text_hash BLOB NOT NULL,
+    model_id TEXT NOT NULL,
+    anger REAL, disgust REAL, fear REAL, joy REAL, sadness REAL,
+    dominant INTEGER NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (text_hash, model_id)
+) WITHOUT ROWID
+'''
+
+
+class ScoreStore:
+    """
+    Thread-safe SQLite store of emotion results keyed by text hash and model id.
+
+    Texts are normalized like ResultCache keys and stored as their SHA-256
+    digest only, never in clear. The database runs in WAL mode, so readers do
+    not block the writer, and connections are pooled across threads and
+    reopened after a fork.
+    """
+
+    def __init__(self, path, timeout=5.0, max_connections=8):
+        """
+        Args:
+            path (str): SQLite database file, created when missing
+            timeout (float): Seconds to wait for a lock held by another connection
+            max_connections (int): Idle connections kept for reuse
+        """
+        self.path = path
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._lock = threading.Lock()
+        self._idle = []
+        self._pid = os.getpid()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        with self._connection() as connection:
+            connection.execute(_SCHEMA)
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """
+        Open the store named by EMOTION_STORE_PATH.
+
+        Args:
+            environ (dict): Mapping to read instead of os.environ
+
+        Returns:
+            ScoreStore: Store at the configured path, or None when it is not set
+        """
+        environ = os.environ if environ is None else environ
+        path = environ.get('EMOTION_STORE_PATH')
+        return cls(path) if path else None
+
+    @staticmethod
+    def make_key(text):
+        """
+        Build the content address of a text.
+
+        Args:
+            text (str): Raw text submitted for analysis
+
+        Returns:
+            bytes: SHA-256 digest of the normalized text
+        """
+        return hashlib.sha256(normalize_text(text).encode('utf-8')).digest()
+
+    def _open(self):
+        """Open a new connection configured for concurrent use."""
+        connection = sqlite3.connect(self.path, timeout=self.timeout,
+                                     check_same_thread=False, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def _connection(self):
+        """Borrow a pooled connection for the duration of a with block."""
+        return _PooledConnection(self)
+
+    def _acquire(self):
+        """Take an idle connection, or open one; drops connections inherited across fork."""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._idle = []
+            if self._idle:
+                return self._idle.pop()
+        return self._open()
+
+    def _release(self, connection):
+        """Return a connection to the pool, closing it when the pool is full."""
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self.max_connections:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def get(self, text, model_id):
+        """
+        Look up one stored result.
+
+        Args:
+            text (str): Raw text submitted for analysis
+            model_id (str): Backend model id
+
+        Returns:
+            dict: Stored result, or None when the text was never scored by the model
+        """
+        return self.get_many([text], model_id)[0]
+
+    def get_many(self, texts, model_id):
+        """
+        Look up many stored results with a few bulk queries.
+
+        Args:
+            texts (list of str): Raw texts submitted for analysis
+            model_id (str): Backend model id
+
+        Returns:
+            list: Stored result or None per text, in input order
+        """
+        keys = [self.make_key(text) for text in texts]
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._connection() as connection:
+            for start in range(0, len(unique_keys), _LOOKUP_CHUNK):
+                chunk = unique_keys[start:start + _LOOKUP_CHUNK]
+                rows = connection.execute(
+                    'SELECT text_hash, anger, disgust, fear, joy, sadness, dominant FROM scores '
+                    f"WHERE model_id = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                    [model_id] + chunk)
+                for row in rows:
+                    found[row[0]] = row[1:]
+
+        results = [_row_to_result(found[key]) if key in found else None for key in keys]
+        hits = sum(result is not None for result in results)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def put(self, text, model_id, result):
+        """
+        Store one result.
+
+        Args:
+            text (str): Raw text submitted for analysis
+            model_id (str): Backend model id
+            result (dict): Emotion result with a dominant emotion
+        """
+        self.put_many([text], model_id, [result])
+
+    def put_many(self, texts, model_id, results):
+        """
+        Store many results in one transaction; results without a dominant emotion are skipped.
+
+        Args:
+            texts (list of str): Raw texts submitted for analysis
+            model_id (str): Backend model id
+            results (list of dict): One emotion result per text
+        """
+        now = time.time()
+        rows = [(self.make_key(text), model_id)
+                + tuple(result[emotion] for emotion in EMOTIONS)
+                + (EMOTION_INDEX[result['dominant_emotion']], now)
+                for text, result in zip(texts, results)
+                if result.get('dominant_emotion') is not None]
+        if not rows:
+            return
+        with self._connection() as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                connection.executemany(
+                    'INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+        with self._lock:
+            self.writes += len(rows)
+
+    def clear(self):
+        """Delete every stored result."""
+        with self._connection() as connection:
+            connection.execute('DELETE FROM scores')
+
+    def stats(self):
+        """
+        Report store counters for monitoring.
+
+        Returns:
+            dict: Database path and hit/miss/write counters
+        """
+        with self._lock:
+            return {'path': self.path, 'hits': self.hits, 'misses': self.misses,
+                    'writes': self.writes}
+
+    def __len__(self):
+        with self._connection() as connection:
+            return connection.execute('SELECT COUNT(*) FROM scores').fetchone()[0]
+
+    def close(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+class _PooledConnection:
+    """Context manager lending one pooled connection of a ScoreStore."""
+
+    __slots__ = ('store', 'connection')
+
+    def __init__(self, store):
+        self.store = store
+        self.connection = None
+
+    def __enter__(self):
+        self.connection = self.store._acquire()  # pylint: disable=protected-access
+        return self.connection
+
+    def __exit__(self, *exc_info):
+        self.store._release(self.connection)  # pylint: disable=protected-access
+
+
+def _row_to_result(row):
+    """Turn stored scores and dominant emotion index into a result dictionary."""
+    result = dict(zip(EMOTIONS, row[:len(EMOTIONS)]))
+    dominant = row[len(EMOTIONS)]
+    result['dominant_emotion'] = EMOTIONS[dominant] if dominant != NO_EMOTION else None
+    return result
+
+
+class StoreBackedCache:
+    """
+    Result cache that consults an in-memory ResultCache, then a ScoreStore.
+
+    Store hits are promoted into the memory cache, and new results are
+    written to both, so the store fills up as texts are scored and a
+    restarted process finds them again. It exposes the same get/put and
+    get_many/put_many methods as ResultCache and can be used in its place.
+    """
+
+    def __init__(self, store, memory=None):
+        """
+        Args:
+            store (ScoreStore): Persistent store
+            memory (ResultCache): In-memory cache in front of the store, or None
+        """
+        self.store = store
+        self.memory = memory
+
+    def get(self, text, model_id):
+        """
+        Look up a result in memory, then in the store.
+
+        Args:
+            text (str): Raw text submitted for analysis
+            model_id (str): Backend model id
+
+        Returns:
+            dict: Copy of the result, or None on a miss
+        """
+        return self.get_many([text], model_id)[0]
+
+    def get_many(self, texts, model_id):
+        """
+        Look up many results, querying the store once for every memory miss.
+
+        Args:
+            texts (list of str): Raw texts submitted for analysis
+            model_id (str): Backend model id
+
+        Returns:
+            list: Result or None per text, in input order
+        """
+        if self.memory is not None:
+            results = self.memory.get_many(texts, model_id)
+        else:
+            results = [None] * len(texts)
+        missing = [index for index, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+
+        stored = self.store.get_many([texts[index] for index in missing], model_id)
+        for index, result in zip(missing, stored):
+            if result is not None:
+                if self.memory is not None:
+                    self.memory.put(texts[index], model_id, result)
+                results[index] = result
+        return results
+
+    def put(self, text, model_id, result):
+        """
+        Store a result in memory and in the store.
+
+        Args:
+            text (str): Raw text submitted for analysis
+            model_id (str): Backend model id
+            result (dict): Emotion result to keep
+        """
+        self.put_many([text], model_id, [result])
+
+    def put_many(self, texts, model_id, results):
+        """
+        Store many results in memory and in one store transaction.
+
+        Args:
+            texts (list of str): Raw texts submitted for analysis
+            model_id (str): Backend model id
+            results (list of dict): One emotion result per text
+        """
+        if self.memory is not None:
+            self.memory.put_many(texts, model_id, results)
+        self.store.put_many(texts, model_id, results)
+
+    def clear(self):
+        """Empty the memory cache; the store keeps its results."""
+        if self.memory is not None:
+            self.memory.clear()
+
+    def stats(self):
+        """
+        Report memory cache and store counters for monitoring.
+
+        Returns:
+            dict: Memory cache counters plus a 'store' entry
+        """
+        stats = self.memory.stats() if self.memory is not None else {}
+        stats['store'] = self.store.stats()
+        return stats
+
+    def __len__(self):
+        return len(self.memory) if self.memory is not None else 0
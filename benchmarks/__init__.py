@@ -0,0 +1,10 @@
+"""
+Benchmark and Load-Test Suite
+
+Measures emotion_detector and the Flask routes of server.py against a local
+stub of the Watson EmotionPredict endpoint, and writes machine-readable
+results that can be compared between releases:
+
+    python -m benchmarks --output bench_results.json
+    python -m benchmarks --baseline bench_results.json --max-regression 0.2
+"""
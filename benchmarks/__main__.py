@@ -0,0 +1,184 @@
+"""
+Benchmark Command Line Interface
+
+Runs the detector and server benchmarks against a stub Watson server and
+writes the results as JSON:
+
+    python -m benchmarks --latency-ms 20 --error-rate 0.01 --output bench_results.json
+
+With --baseline, every scenario is compared with an earlier results file and
+the command exits with status 1 when p95 latency grew, or throughput fell, by
+more than --max-regression.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+from .bench_detector import (bench_batch_sizes, bench_cache_hits, bench_concurrency,
+                             bench_local_engine)
+from .bench_server import bench_server
+from .bench_startup import bench_startup
+from .stub_watson import StubWatsonServer
+
+SUITES = ('detector', 'local', 'server', 'startup')
+
+
+def _int_list(value):
+    """Parse a comma-separated list of integers."""
+    return [int(item) for item in value.split(',') if item]
+
+
+def _float_list(value):
+    """Parse a comma-separated list of floats."""
+    return [float(item) for item in value.split(',') if item]
+
+
+def build_parser():
+    """
+    Build the command line parser.
+
+    Returns:
+        argparse.ArgumentParser: Parser for the benchmark command
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Benchmark emotion detection and the web server against a stub backend.')
+    parser.add_argument('--suites', default=','.join(SUITES),
+                        help=f"comma-separated suites to run (default: {','.join(SUITES)})")
+    parser.add_argument('--latency-ms', type=float, default=20,
+                        help='stub backend latency in milliseconds (default: 20)')
+    parser.add_argument('--jitter-ms', type=float, default=5,
+                        help='maximum extra random stub latency in milliseconds (default: 5)')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='share of stub requests answered with 503 (default: 0)')
+    parser.add_argument('--concurrency', type=_int_list, default=[1, 8, 32],
+                        help='concurrency levels (default: 1,8,32)')
+    parser.add_argument('--cache-hit-ratios', type=_float_list, default=[0.0, 0.5, 0.9],
+                        help='repeated text shares for the cache scenarios (default: 0,0.5,0.9)')
+    parser.add_argument('--batch-sizes', type=_int_list, default=[1, 16, 128],
+                        help='batch sizes (default: 1,16,128)')
+    parser.add_argument('--requests', type=int, default=200,
+                        help='calls per scenario, or texts per batch scenario (default: 200)')
+    parser.add_argument('--startup-runs', type=int, default=10,
+                        help='fresh interpreters started per startup scenario (default: 10)')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='results file of an earlier run to compare with')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='tolerated relative regression against the baseline (default: 0.2)')
+    return parser
+
+
+def run(args):
+    """
+    Run the selected benchmark suites.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments
+
+    Returns:
+        dict: Run settings, environment and one summary per scenario
+    """
+    suites = set(args.suites.split(','))
+    scenarios = {}
+    with StubWatsonServer(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                          error_rate=args.error_rate) as stub:
+        if 'detector' in suites:
+            scenarios.update(bench_concurrency(stub, args.concurrency, args.requests))
+            scenarios.update(bench_cache_hits(stub, args.cache_hit_ratios, args.requests,
+                                              max(args.concurrency)))
+            scenarios.update(bench_batch_sizes(stub, args.batch_sizes, args.requests))
+        if 'local' in suites:
+            scenarios.update(bench_local_engine(args.batch_sizes, args.requests * 10))
+        if 'server' in suites:
+            scenarios.update(bench_server(stub, args.concurrency, args.requests,
+                                          args.batch_sizes, args.requests))
+        if 'startup' in suites:
+            scenarios.update(bench_startup(args.startup_runs))
+        backend_requests = stub.requests
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {'latency_ms': args.latency_ms, 'jitter_ms': args.jitter_ms,
+                     'error_rate': args.error_rate, 'requests': args.requests},
+        'backend_requests': backend_requests,
+        'scenarios': scenarios,
+    }
+
+
+def compare(results, baseline, max_regression):
+    """
+    List the scenarios that regressed against a baseline run.
+
+    Args:
+        results (dict): Results of this run
+        baseline (dict): Results of the earlier run
+        max_regression (float): Tolerated relative change, e.g. 0.2 for 20%
+
+    Returns:
+        list of str: One description per regressed metric
+    """
+    regressions = []
+    for name, summary in results['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if before is None:
+            continue
+        if before['p95_ms'] and summary['p95_ms'] > before['p95_ms'] * (1 + max_regression):
+            regressions.append(f"{name}: p95 {before['p95_ms']:.2f} ms -> "
+                               f"{summary['p95_ms']:.2f} ms")
+        if summary['items_per_second'] < before['items_per_second'] * (1 - max_regression):
+            regressions.append(f"{name}: throughput {before['items_per_second']:.1f}/s -> "
+                               f"{summary['items_per_second']:.1f}/s")
+    return regressions
+
+
+def format_table(scenarios):
+    """
+    Format scenario summaries as a plain-text table.
+
+    Args:
+        scenarios (dict): Scenario name -> summary
+
+    Returns:
+        str: Table with one row per scenario
+    """
+    rows = [f"{'scenario':<42} {'items/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+            f"{'errors':>6}"]
+    for name, summary in scenarios.items():
+        rows.append(f"{name:<42} {summary['items_per_second']:>10.1f} {summary['p50_ms']:>8.2f} "
+                    f"{summary['p95_ms']:>8.2f} {summary['p99_ms']:>8.2f} "
+                    f"{summary['errors']:>6}")
+    return '\n'.join(rows)
+
+
+def main(argv=None):
+    """
+    Entry point of ``python -m benchmarks``.
+
+    Args:
+        argv (list of str): Command line arguments; defaults to sys.argv[1:]
+
+    Returns:
+        int: 0, or 1 when a regression against the baseline was found
+    """
+    args = build_parser().parse_args(argv)
+    results = run(args)
+    print(format_table(results['scenarios']))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Detector Benchmarks
+This module measures emotion_detector and emotion_detector_batch against the
+stub Watson server, and the local engine in process.
+"""
+
+from EmotionDetection import (CircuitBreaker, LocalEmotionEngine, ResultCache, WatsonClient,
+                              emotion_detector, emotion_detector_batch)
+
+from .harness import run_load
+from .workloads import batches, make_texts
+
+
+def _scored(result):
+    """Tell whether a result carries scores rather than an empty or error slot."""
+    return result.get('dominant_emotion') is not None
+
+
+def _make_client(stub, concurrency):
+    """Build a Watson client for the stub with its own closed circuit breaker."""
+    return WatsonClient(url=stub.url, pool_maxsize=max(concurrency, 1),
+                        breaker=CircuitBreaker.from_env())
+
+
+def bench_concurrency(stub, levels, requests_per_level):
+    """
+    Measure single-text calls without caching at several concurrency levels.
+
+    Args:
+        stub (StubWatsonServer): Running stub backend
+        levels (list of int): Concurrent caller counts
+        requests_per_level (int): Calls made at each level
+
+    Returns:
+        dict: Scenario name -> summary
+    """
+    results = {}
+    for concurrency in levels:
+        with _make_client(stub, concurrency) as client:
+            texts = make_texts(requests_per_level, seed=concurrency)
+            results[f'detector/concurrency={concurrency}'] = run_load(
+                lambda text, client=client: _scored(
+                    emotion_detector(text, backend=client, use_cache=False)),
+                texts, concurrency)
+    return results
+
+
+def bench_cache_hits(stub, ratios, requests_per_level, concurrency):
+    """
+    Measure single-text calls through a fresh result cache at several repeat ratios.
+
+    Args:
+        stub (StubWatsonServer): Running stub backend
+        ratios (list of float): Shares of repeated texts in the workload
+        requests_per_level (int): Calls made for each ratio
+        concurrency (int): Concurrent callers
+
+    Returns:
+        dict: Scenario name -> summary, including the hit ratio actually reached
+    """
+    results = {}
+    for ratio in ratios:
+        cache = ResultCache()
+        with _make_client(stub, concurrency) as client:
+            texts = make_texts(requests_per_level, repeat_ratio=ratio, seed=1)
+            summary = run_load(
+                lambda text, client=client, cache=cache: _scored(
+                    emotion_detector(text, backend=client, cache=cache)),
+                texts, concurrency)
+        stats = cache.stats()
+        lookups = stats['hits'] + stats['misses']
+        summary['cache_hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        results[f'detector/cache_hit={ratio:g}'] = summary
+    return results
+
+
+def bench_batch_sizes(stub, sizes, texts_per_size):
+    """
+    Measure emotion_detector_batch calls of several sizes, one batch at a time.
+
+    Args:
+        stub (StubWatsonServer): Running stub backend
+        sizes (list of int): Texts per batch
+        texts_per_size (int): Texts scored for each size
+
+    Returns:
+        dict: Scenario name -> summary; items_per_second counts texts
+    """
+    results = {}
+    with _make_client(stub, 32) as client:
+        for size in sizes:
+            work = batches(make_texts(texts_per_size, seed=2), size)
+            results[f'detector/batch_size={size}'] = run_load(
+                lambda batch: all(_scored(result) for result in emotion_detector_batch(
+                    batch, backend=client, use_cache=False)),
+                work, 1, items_per_call=size)
+    return results
+
+
+def bench_local_engine(sizes, texts_per_size):
+    """
+    Measure the in-process local engine at several batch sizes.
+
+    Args:
+        sizes (list of int): Texts per batch
+        texts_per_size (int): Texts scored for each size
+
+    Returns:
+        dict: Scenario name -> summary; items_per_second counts texts
+    """
+    engine = LocalEmotionEngine()
+    results = {}
+    for size in sizes:
+        work = batches(make_texts(texts_per_size, seed=3), size)
+        results[f'local/batch_size={size}'] = run_load(
+            lambda batch: all(_scored(result) for result in engine.analyse_batch(batch)),
+            work, 1, items_per_call=size)
+    return results
@@ -0,0 +1,107 @@
+"""
+Server Benchmarks
+This module serves the Flask application of server.py on a threaded local
+HTTP server backed by the stub Watson server, and load-tests its routes over
+real HTTP connections.
+"""
+
+import threading
+
+import requests
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from EmotionDetection import CircuitBreaker, ResultCache, WatsonClient
+
+from .harness import run_load
+from .workloads import batches, make_texts
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    """Request handler that does not log every benchmark request."""
+
+    def log_request(self, *args, **kwargs):  # pylint: disable=arguments-differ
+        """Skip the access log line."""
+
+
+class AppServer:
+    """Serve the Flask application on a background thread, bound to a free port."""
+
+    def __init__(self, app):
+        """
+        Args:
+            app (flask.Flask): Application to serve
+        """
+        self._server = make_server('127.0.0.1', 0, app, threaded=True,
+                                   request_handler=_QuietRequestHandler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        """str: Base URL of the running application."""
+        return f'http://127.0.0.1:{self._server.server_port}'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _session_getter():
+    """Return a function giving each load-generating thread its own HTTP session."""
+    local = threading.local()
+
+    def get_session():
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        return local.session
+    return get_session
+
+
+def bench_server(stub, levels, requests_per_level, batch_sizes, texts_per_size):
+    """
+    Load-test the HTML, JSON API and batch routes.
+
+    The server module's backend and result cache are replaced with a client
+    of the stub backend and a fresh cache, so texts are really scored.
+
+    Args:
+        stub (StubWatsonServer): Running stub backend
+        levels (list of int): Concurrent client counts
+        requests_per_level (int): Requests made at each level and route
+        batch_sizes (list of int): Texts per batch request
+        texts_per_size (int): Texts sent for each batch size
+
+    Returns:
+        dict: Scenario name -> summary
+    """
+    import server  # pylint: disable=import-outside-toplevel
+
+    results = {}
+    client = WatsonClient(url=stub.url, pool_maxsize=max(levels + [32]),
+                          breaker=CircuitBreaker.from_env())
+    server.backend = client
+    session = _session_getter()
+    with client, AppServer(server.app) as app_server:
+        for concurrency in levels:
+            server.result_cache = ResultCache()
+            results[f'server/emotionDetector/concurrency={concurrency}'] = run_load(
+                lambda text: session().post(app_server.url + '/emotionDetector',
+                                            data={'textToAnalyze': text}).status_code == 200,
+                make_texts(requests_per_level, seed=10 + concurrency), concurrency)
+
+            server.result_cache = ResultCache()
+            results[f'server/api/concurrency={concurrency}'] = run_load(
+                lambda text: session().post(app_server.url + '/api/v1/emotion',
+                                            json={'text': text}).status_code == 200,
+                make_texts(requests_per_level, seed=20 + concurrency), concurrency)
+
+        for size in batch_sizes:
+            server.result_cache = ResultCache()
+            results[f'server/batch/batch_size={size}'] = run_load(
+                lambda batch: session().post(app_server.url + '/emotionDetector/batch',
+                                             json={'texts': batch}).status_code == 200,
+                batches(make_texts(texts_per_size, seed=30), size), 1, items_per_call=size)
+    return results
@@ -0,0 +1,81 @@
+"""
+Startup Benchmarks
+This module measures import time and cold-start latency of the
+EmotionDetection package, each run in a fresh interpreter as a short-lived
+CLI or serverless invocation would see them.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+from .harness import summarize
+
+# Statements timed in a fresh interpreter, by scenario name
+STARTUP_SCENARIOS = {
+    'startup/import_package': 'import EmotionDetection',
+    'startup/import_detector': 'from EmotionDetection import emotion_detector',
+    'startup/cold_local_score': ('from EmotionDetection import emotion_detector\n'
+                                 'emotion_detector("I love this product")'),
+    'startup/warmup': 'from EmotionDetection import warmup\nwarmup()',
+}
+
+# Modules whose presence after a scenario is reported, to catch eager imports
+HEAVY_MODULES = ('requests', 'aiohttp', 'numpy', 'asyncio')
+
+_PROGRAM = '''
+import json, sys, time
+started = time.perf_counter()
+exec(compile(sys.argv[1], '<scenario>', 'exec'))
+elapsed = time.perf_counter() - started
+print(json.dumps({'seconds': elapsed,
+                  'loaded': [name for name in json.loads(sys.argv[2]) if name in sys.modules]}))
+'''
+
+
+def time_statement(statement, environ=None):
+    """
+    Time a statement in a fresh Python interpreter.
+
+    Args:
+        statement (str): Python source to run, timed from start to end
+        environ (dict): Environment of the interpreter; defaults to os.environ
+
+    Returns:
+        dict: 'seconds' taken and the HEAVY_MODULES 'loaded' by the statement
+    """
+    completed = subprocess.run(
+        [sys.executable, '-c', _PROGRAM, statement, json.dumps(HEAVY_MODULES)],
+        capture_output=True, text=True, check=True,
+        env=os.environ if environ is None else environ,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return json.loads(completed.stdout)
+
+
+def bench_startup(runs):
+    """
+    Measure import and cold-start time, one fresh interpreter per run.
+
+    Scores use the local backend so that no network call is timed.
+
+    Args:
+        runs (int): Interpreters started per scenario
+
+    Returns:
+        dict: Scenario name -> summary, with the heavy modules each scenario loaded
+    """
+    environ = dict(os.environ, EMOTION_BACKEND='local', EMOTION_STORE_PATH='')
+    results = {}
+    for name, statement in STARTUP_SCENARIOS.items():
+        latencies = []
+        loaded = []
+        started = time.perf_counter()
+        for _ in range(runs):
+            measurement = time_statement(statement, environ)
+            latencies.append(measurement['seconds'])
+            loaded = measurement['loaded']
+        results[name] = dict(summarize(latencies, time.perf_counter() - started),
+                             loaded_modules=loaded)
+    return results
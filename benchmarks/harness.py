@@ -0,0 +1,97 @@
+"""
+Load Generation Harness
+This module runs a callable under a fixed number of concurrent workers and
+summarizes throughput and latency percentiles.
+"""
+
+import threading
+import time
+
+
+def percentile(sorted_samples, fraction):
+    """
+    Nearest-rank percentile of already sorted samples.
+
+    Args:
+        sorted_samples (list of float): Samples in ascending order
+        fraction (float): Percentile as a fraction, e.g. 0.95
+
+    Returns:
+        float: Percentile value, or 0.0 without samples
+    """
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, int(round(fraction * len(sorted_samples))) - 1))
+    return sorted_samples[index]
+
+
+def summarize(latencies, elapsed, errors=0, items_per_call=1):
+    """
+    Summarize one load run.
+
+    Args:
+        latencies (list of float): Seconds taken by each successful call
+        elapsed (float): Wall-clock seconds of the whole run
+        errors (int): Number of calls that raised or failed
+        items_per_call (int): Texts scored per call, for item throughput
+
+    Returns:
+        dict: Call count, errors, calls/s, texts/s and latency percentiles in milliseconds
+    """
+    ordered = sorted(latencies)
+    calls = len(ordered) + errors
+    return {
+        'calls': calls,
+        'errors': errors,
+        'throughput': calls / elapsed if elapsed else 0.0,
+        'items_per_second': calls * items_per_call / elapsed if elapsed else 0.0,
+        'mean_ms': 1000 * sum(ordered) / len(ordered) if ordered else 0.0,
+        'p50_ms': 1000 * percentile(ordered, 0.50),
+        'p95_ms': 1000 * percentile(ordered, 0.95),
+        'p99_ms': 1000 * percentile(ordered, 0.99),
+    }
+
+
+def run_load(call, arguments, concurrency, items_per_call=1):
+    """
+    Run call(argument) for every argument with a closed-loop worker pool.
+
+    Args:
+        call (callable): Function under test; returning False counts as an error
+        arguments (list): One argument per call
+        concurrency (int): Number of concurrent workers
+        items_per_call (int): Texts scored per call, for item throughput
+
+    Returns:
+        dict: Summary produced by summarize()
+    """
+    lock = threading.Lock()
+    remaining = iter(arguments)
+    latencies = []
+    errors = [0]
+
+    def worker():
+        while True:
+            with lock:
+                argument = next(remaining, StopIteration)
+            if argument is StopIteration:
+                return
+            started = time.perf_counter()
+            try:
+                succeeded = call(argument) is not False
+            except Exception:  # pylint: disable=broad-except
+                succeeded = False
+            duration = time.perf_counter() - started
+            with lock:
+                if succeeded:
+                    latencies.append(duration)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, time.perf_counter() - started, errors[0], items_per_call)
@@ -0,0 +1,135 @@
+"""
+Stub Watson EmotionPredict Server
+This module provides a local HTTP server that answers like the Watson
+EmotionPredict endpoint, with configurable latency and error rate.
+"""
+
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMOTIONS = ('anger', 'disgust', 'fear', 'joy', 'sadness')
+
+
+def stub_emotions(text):
+    """
+    Derive deterministic emotion scores from a text.
+
+    Args:
+        text (str): Submitted text
+
+    Returns:
+        dict: Score per emotion name
+    """
+    digest = hashlib.sha256(text.encode('utf-8')).digest()
+    return {emotion: round(digest[index] / 255, 6) for index, emotion in enumerate(EMOTIONS)}
+
+
+class _Server(ThreadingHTTPServer):
+    """Threaded server with a listen backlog deep enough for the load tests."""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class StubWatsonServer:
+    """
+    Threaded HTTP server imitating the Watson EmotionPredict endpoint.
+
+    Every request sleeps for ``latency`` plus up to ``jitter`` seconds, then
+    fails with a 503 with probability ``error_rate``. Blank texts get a 400,
+    like the real backend.
+    """
+
+    def __init__(self, latency=0.02, jitter=0.005, error_rate=0.0, seed=0):
+        """
+        Args:
+            latency (float): Base response latency in seconds
+            jitter (float): Maximum extra random latency in seconds
+            error_rate (float): Probability of answering 503
+            seed (int): Seed of the latency and error random generator
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _Server(('127.0.0.1', 0), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self):
+        """str: URL of the stub EmotionPredict endpoint."""
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/v1/watson.runtime.nlp.v1/NlpService/EmotionPredict'
+
+    def _draw(self):
+        """Draw this request's delay and whether it fails."""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            return delay, self._random.random() < self.error_rate
+
+    def _handler_class(self):
+        """Build the request handler bound to this server's settings."""
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Answer EmotionPredict POST requests."""
+
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out as separate writes; without this, Nagle's
+            # algorithm and delayed ACKs add ~40 ms to every keep-alive response
+            disable_nagle_algorithm = True
+
+            def do_POST(self):  # pylint: disable=invalid-name
+                """Handle one EmotionPredict call."""
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                delay, fail = stub._draw()  # pylint: disable=protected-access
+                time.sleep(delay)
+                text = json.loads(body or b'{}').get('raw_document', {}).get('text', '')
+                if fail:
+                    self._send(503, {'error': 'stub failure'})
+                elif not text.strip():
+                    self._send(400, {'error': 'blank text'})
+                else:
+                    self._send(200, {'emotionPredictions': [{'emotion': stub_emotions(text)}]})
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):  # pylint: disable=arguments-differ
+                """Keep benchmark output quiet."""
+
+        return Handler
+
+    def start(self):
+        """
+        Serve requests on a background thread.
+
+        Returns:
+            StubWatsonServer: The started server
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the listening socket."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,52 @@
+"""
+Benchmark Workloads
+This module generates reproducible feedback texts with a chosen share of
+repeated texts, so runs can target a given result cache hit ratio.
+"""
+
+import random
+
+WORDS = ('service', 'delivery', 'support', 'product', 'price', 'quality', 'refund', 'order',
+         'great', 'terrible', 'slow', 'happy', 'angry', 'afraid', 'sad', 'love', 'hate',
+         'disgusting', 'wonderful', 'late', 'broken', 'friendly', 'rude', 'again')
+
+
+def make_texts(count, repeat_ratio=0.0, seed=0, words_per_text=12):
+    """
+    Generate feedback-like texts.
+
+    Args:
+        count (int): Number of texts
+        repeat_ratio (float): Share of texts repeating an earlier text
+        seed (int): Random seed, so every run scores the same texts
+        words_per_text (int): Words in each unique text
+
+    Returns:
+        list of str: Generated texts, in submission order
+    """
+    generator = random.Random(seed)
+    texts = []
+    unique = []
+    for index in range(count):
+        if unique and generator.random() < repeat_ratio:
+            texts.append(generator.choice(unique))
+            continue
+        words = [generator.choice(WORDS) for _ in range(words_per_text)]
+        text = f"Feedback {seed}-{index}: " + ' '.join(words)
+        unique.append(text)
+        texts.append(text)
+    return texts
+
+
+def batches(texts, size):
+    """
+    Split texts into consecutive batches.
+
+    Args:
+        texts (list of str): Texts to split
+        size (int): Texts per batch
+
+    Returns:
+        list of list: Batches of at most ``size`` texts
+    """
+    return [texts[start:start + size] for start in range(0, len(texts), size)]
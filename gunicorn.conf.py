@@ -0,0 +1,62 @@
+"""
+Gunicorn Configuration for the Emotion Detection Web App
+
+Run the production server from the project directory with:
+
+    gunicorn
+
+Gunicorn reads this file from the working directory. The application is
+preloaded in the master process, so the backend client, result cache and
+local model are loaded once and shared copy-on-write by every worker.
+Settings come from EMOTION_* environment variables.
+"""
+
+import gc
+import multiprocessing
+import os
+
+# Application built by server.create_app()
+wsgi_app = 'server:app'
+
+bind = os.environ.get('EMOTION_BIND', '0.0.0.0:5000')
+
+# One process per core, each with a pool of threads for I/O-bound backend calls
+workers = int(os.environ.get('EMOTION_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('EMOTION_THREADS', 8))
+
+preload_app = True
+
+# Seconds a silent worker is given before it is killed and replaced
+timeout = int(os.environ.get('EMOTION_WORKER_TIMEOUT', 60))
+
+# Seconds in-flight requests get to finish after SIGTERM
+graceful_timeout = int(os.environ.get('EMOTION_GRACEFUL_TIMEOUT', 30))
+
+keepalive = int(os.environ.get('EMOTION_KEEPALIVE', 5))
+
+# Recycle workers after this many requests (0 never recycles them)
+max_requests = int(os.environ.get('EMOTION_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+
+def when_ready(server):  # pylint: disable=unused-argument
+    """Freeze the preloaded application's objects before the workers are forked
+
+    Objects moved to the permanent generation are skipped by the garbage
+    collector, so collections in the workers do not write to, and thereby
+    copy, the memory pages they share with the master.
+    """
+    gc.freeze()
+
+
+def post_worker_init(worker):  # pylint: disable=unused-argument
+    """Start the background job runner in each worker, not in the master"""
+    import server as emotion_server  # pylint: disable=import-outside-toplevel
+    emotion_server.start_jobs()
+
+
+def worker_exit(server, worker):  # pylint: disable=unused-argument
+    """Release backend connections once a worker finished its requests"""
+    import server as emotion_server  # pylint: disable=import-outside-toplevel
+    emotion_server.shutdown()
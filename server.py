@@ -5,391 +5,994 @@ This module provides a web interface for the emotion detection functionality.
 Users can input text and get emotion analysis results through a web browser.
 """
 
-from flask import Flask, request, render_template_string
-from EmotionDetection import emotion_detector
+import asyncio
+import functools
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
 
-# Initialize the Flask application
-app = Flask(__name__)
+from flask import (Blueprint, Flask, Response, current_app, g, request, render_template,
+                   jsonify, make_response, stream_with_context)
+from werkzeug.exceptions import RequestEntityTooLarge
+from EmotionDetection import (EMOTIONS, WatsonClient, async_emotion_detector_batch,
+                              emotion_detector, emotion_detector_batch_chunked,
+                              emotion_detector_chunked, get_default_backend,
+                              get_default_aggregator, get_default_breaker, get_default_cache,
+                              get_default_similarity_index, get_default_single_flight,
+                              get_fallback_backend, warmup)
+from EmotionDetection.admission import (AdmissionController, RateLimiter, RejectedError,
+                                        retry_after_header)
+from EmotionDetection.async_detection import close_background_loop, run_in_background_loop
+from EmotionDetection.chunking import DEFAULT_MAX_CHUNK_CHARS, merge_batch, split_batch
+from EmotionDetection.jobs import JobQueue, JobRunner
+from EmotionDetection.preprocessing import get_default_preprocessor, prepare_text
+from EmotionDetection.pipeline import score_stream
+from EmotionDetection.routing import LanguageRouter
+from EmotionDetection.metrics import (CONTENT_TYPE, REQUEST_LATENCY, REQUESTS_IN_FLIGHT,
+                                      STAGE_LATENCY, get_default_registry)
 
+# Optional faster JSON encoder and Brotli compressor
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
-@app.route("/")
+# Maximum number of texts accepted by a single batch request
+MAX_BATCH_SIZE = 10000
+
+# Result fields that API callers can select
+RESULT_FIELDS = EMOTIONS + ('dominant_emotion',)
+
+# API responses smaller than this are not worth compressing
+COMPRESSION_MIN_BYTES = 1024
+
+# Longest grouping key (e.g. a product id) accepted for live statistics
+MAX_KEY_LENGTH = 200
+
+# Texts scored per batch call by the streaming route on batch-capable backends;
+# other backends get one text per call, so the first result comes back quickly
+STREAM_CHUNK_SIZE = 16
+
+# Chunks the streaming route scores concurrently
+STREAM_WORKERS = 8
+
+# Largest request body accepted, in bytes
+MAX_BODY_BYTES = int(os.environ.get('EMOTION_MAX_BODY_BYTES', 4 * 1024 * 1024))
+
+# Results returned per page by the job results route, by default and at most
+JOB_RESULTS_PAGE = 1000
+MAX_JOB_RESULTS_PAGE = 10000
+
+# Routes whose NDJSON bodies are read line by line, so their size is not capped
+STREAMED_ENDPOINTS = frozenset({'emotion.emotion_stream_route', 'emotion.job_submit_route'})
+
+# Routes that call the backend, and so go through rate limiting and admission control
+SCORING_ENDPOINTS = frozenset({'emotion.emotion_detector_route',
+                               'emotion.emotion_detector_batch_route',
+                               'emotion.emotion_detector_batch_async_route',
+                               'emotion.emotion_api_route',
+                               'emotion.emotion_stream_route'})
+
+# Seconds browsers and proxies may reuse the index and error pages
+PAGE_MAX_AGE = 300
+
+# Seconds the versioned stylesheet may be cached
+STATIC_MAX_AGE = 31536000
+
+INVALID_INPUT_ERROR = {'heading': 'Invalid Input',
+                       'message': 'Invalid text! Please provide some text to analyze.'}
+PROCESSING_ERROR = {'heading': 'Processing Error',
+                    'message': 'Unable to process the text for emotion analysis. '
+                               'Please try again with different text.'}
+
+# Routes live on a blueprint so that create_app() can build configured applications
+views = Blueprint('emotion', __name__)
+
+# Pages whose HTML never changes, rendered once per process: key -> (body, etag)
+_static_pages = {}
+
+# Backend shared by every request-handling thread (pooled Watson client or local engine)
+backend = get_default_backend()
+
+# Result cache shared by every route, so repeated feedback skips the backend
+result_cache = get_default_cache()
+
+# Running emotion statistics per key and time window, read by /api/v1/summary
+aggregator = get_default_aggregator()
+
+# Bounds concurrent scoring requests; None when EMOTION_MAX_IN_FLIGHT=0
+admission = AdmissionController.from_env()
+
+# Per-client token buckets; None unless EMOTION_RATE_LIMIT is set
+rate_limiter = RateLimiter.from_env()
+
+# Durable background scoring jobs; None unless EMOTION_JOBS_PATH is set
+job_queue = JobQueue.from_env()
+job_runner = (JobRunner.from_env(job_queue, backend=backend, cache=result_cache,
+                                 aggregator=aggregator)
+              if job_queue is not None else None)
+
+# Set once shared state is loaded, cleared when the process starts shutting down
+_ready = threading.Event()
+
+
+def _static_version(flask_app):
+    """
+    Hash the stylesheet so its URL changes whenever its content does
+
+    Args:
+        flask_app (Flask): Application whose static folder holds the stylesheet
+
+    Returns:
+        str: Short content hash used as a cache-busting query parameter
+    """
+    with flask_app.open_resource('static/style.css') as stylesheet:
+        return hashlib.sha1(stylesheet.read()).hexdigest()[:12]
+
+
+def create_app(config=None):
+    """
+    Build the Flask application serving the emotion detection routes
+
+    Every application built in a process shares its backend, result cache
+    and live statistics. Shared state is loaded before the application is
+    returned, so a server preloading the application before forking workers
+    (gunicorn's preload_app) loads it once for all of them.
+
+    Args:
+        config (dict): Flask configuration values overriding the defaults, e.g.
+            EMOTION_CHUNK_CHARS, the longest text scored in one backend call
+
+    Returns:
+        Flask: Configured application
+    """
+    flask_app = Flask(__name__)
+    flask_app.config['SEND_FILE_MAX_AGE_DEFAULT'] = STATIC_MAX_AGE
+    flask_app.config['MAX_CONTENT_LENGTH'] = MAX_BODY_BYTES
+    flask_app.config['EMOTION_CHUNK_CHARS'] = DEFAULT_MAX_CHUNK_CHARS
+    if config:
+        flask_app.config.update(config)
+    flask_app.add_template_global(_static_version(flask_app), 'static_version')
+    flask_app.register_blueprint(views)
+    preload()
+    return flask_app
+
+
+def preload():
+    """Load the shared state served by every worker and mark the process ready"""
+    # The fallback backend (the local model by default) is otherwise loaded on
+    # the first backend failure, and NumPy on the first local score
+    warmup(backend)
+    _ready.set()
+
+
+def start_jobs():
+    """
+    Start the background job runner of this process, resuming unfinished jobs
+
+    Called by gunicorn's post_worker_init hook, so every worker runs jobs
+    while the master stays idle, and again by each job submission.
+    """
+    if job_runner is not None:
+        job_runner.start()
+
+
+def shutdown():
+    """
+    Stop reporting ready and release the backend connections and the store
+
+    Called by gunicorn's worker_exit hook once in-flight requests finished.
+    """
+    _ready.clear()
+    if job_runner is not None:
+        # Jobs being scored are queued again and resumed by another worker
+        job_runner.stop(timeout=5)
+    fallback = get_fallback_backend()
+    backend.close()
+    if fallback is not None and fallback is not backend:
+        fallback.close()
+    store = getattr(result_cache, 'store', None)
+    if store is not None:
+        store.close()
+    close_background_loop()
+
+
+@views.before_app_request
+def start_request_metrics():
+    """Count the request as in flight and start its latency timer"""
+    g.request_started = time.perf_counter()
+    g.in_flight = True
+    REQUESTS_IN_FLIGHT.inc()
+
+
+@views.before_app_request
+def limit_body_size():
+    """
+    Reject oversized bodies before they are read
+
+    Werkzeug only enforces MAX_CONTENT_LENGTH while parsing forms, so JSON
+    bodies are checked against the declared Content-Length here.
+    """
+    if request.endpoint in STREAMED_ENDPOINTS and request.mimetype == 'application/x-ndjson':
+        # Streamed bodies are read line by line, so their size does not matter
+        return
+    limit = current_app.config.get('MAX_CONTENT_LENGTH')
+    if limit is not None and (request.content_length or 0) > limit:
+        raise RequestEntityTooLarge()
+
+
+@views.before_app_request
+def admit_scoring_request():
+    """
+    Apply the client's rate limit and wait for a scoring slot
+
+    Returns:
+        Response: 429 or 503 rejection with a Retry-After header, or None
+            to handle the request
+    """
+    if request.endpoint not in SCORING_ENDPOINTS:
+        return None
+    try:
+        if rate_limiter is not None:
+            rate_limiter.allow(client_identity())
+        if admission is not None:
+            admission.acquire()
+            g.admitted = admission
+    except RejectedError as error:
+        response = jsonify({'error': 'Too many requests, please retry later.'
+                                     if error.status == 429 else
+                                     'The service is overloaded, please retry later.'})
+        response.status_code = error.status
+        response.headers['Retry-After'] = retry_after_header(error.retry_after)
+        return response
+    return None
+
+
+def client_identity():
+    """
+    Identify the client a request is rate limited as
+
+    Returns:
+        str: The X-API-Key header when present, otherwise the remote address
+    """
+    api_key = request.headers.get('X-API-Key')
+    if api_key:
+        return 'key:' + api_key
+    return 'addr:' + str(request.remote_addr)
+
+
+@views.app_errorhandler(RequestEntityTooLarge)
+def request_too_large(error):  # pylint: disable=unused-argument
+    """
+    Reject request bodies larger than EMOTION_MAX_BODY_BYTES
+
+    Returns:
+        Response: JSON error with status 413
+    """
+    limit = current_app.config.get('MAX_CONTENT_LENGTH')
+    return jsonify({'error': f'Request body must be at most {limit} bytes.'}), 413
+
+
+@views.after_app_request
+def record_request_metrics(response):
+    """
+    Record the latency of a request that produced a response
+
+    Args:
+        response (Response): Outgoing response
+
+    Returns:
+        Response: The same response
+    """
+    _observe_request(response.status_code)
+    return response
+
+
+@views.teardown_app_request
+def finish_request_metrics(error=None):
+    """Stop counting the request as in flight, recording requests that raised"""
+    admitted = g.pop('admitted', None)
+    if admitted is not None:
+        admitted.release()
+    if not g.pop('in_flight', False):
+        return
+    if error is not None:
+        _observe_request(500)
+    REQUESTS_IN_FLIGHT.dec()
+
+
+def _observe_request(status_code):
+    """Observe the current request's latency once, labelled by route and status"""
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    REQUEST_LATENCY.observe(time.perf_counter() - started, route=route, status=status_code)
+
+
+@views.route("/")
 def render_index_page():
     """
     Render the main index page with the emotion detection interface
 
     Returns:
-        str: HTML content for the main page
-    """
-    return render_template_string('''
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>AI-Based Emotion Detection</title>
-        <style>
-            body {
-                font-family: 'Arial', sans-serif;
-                max-width: 800px;
-                margin: 0 auto;
-                padding: 20px;
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                min-height: 100vh;
-                color: #333;
-            }
-            .container {
-                background: white;
-                border-radius: 15px;
-                padding: 30px;
-                box-shadow: 0 10px 30px rgba(0,0,0,0.3);
-            }
-            h1 {
-                text-align: center;
-                color: #4a5568;
-                margin-bottom: 30px;
-                font-size: 2.5em;
-            }
-            .form-group {
-                margin-bottom: 20px;
-            }
-            label {
-                display: block;
-                margin-bottom: 8px;
-                font-weight: bold;
-                color: #2d3748;
-            }
-            textarea {
-                width: 100%;
-                min-height: 120px;
-                padding: 12px;
-                border: 2px solid #e2e8f0;
-                border-radius: 8px;
-                font-size: 16px;
-                resize: vertical;
-                box-sizing: border-box;
-                transition: border-color 0.3s ease;
-            }
-            textarea:focus {
-                outline: none;
-                border-color: #667eea;
-                box-shadow: 0 0 0 3px rgba(102, 126, 234, 0.1);
-            }
-            .btn-submit {
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                color: white;
-                padding: 12px 30px;
-                border: none;
-                border-radius: 25px;
-                font-size: 16px;
-                cursor: pointer;
-                transition: transform 0.2s ease;
-                display: block;
-                margin: 20px auto;
-            }
-            .btn-submit:hover {
-                transform: translateY(-2px);
-                box-shadow: 0 5px 15px rgba(0,0,0,0.2);
-            }
-            .footer {
-                text-align: center;
-                margin-top: 30px;
-                color: #718096;
-                font-size: 14px;
-            }
-            .description {
-                background: #f7fafc;
-                padding: 20px;
-                border-radius: 10px;
-                margin-bottom: 25px;
-                border-left: 4px solid #667eea;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>🧠 AI-Based Emotion Detection</h1>
-            
-            <div class="description">
-                <p><strong>Welcome to our Emotion Analysis Tool!</strong></p>
-                <p>Enter any text below and our AI will analyze the emotional content, 
-                   detecting emotions like joy, sadness, anger, fear, and disgust. 
-                   Perfect for analyzing customer feedback, social media posts, or any text content.</p>
-            </div>
-            
-            <form action="/emotionDetector" method="POST">
-                <div class="form-group">
-                    <label for="textToAnalyze">Enter text to analyze:</label>
-                    <textarea 
-                        name="textToAnalyze" 
-                        id="textToAnalyze" 
-                        placeholder="Type or paste your text here... (e.g., 'I love this new product, it makes me so happy!')"
-                        required
-                    ></textarea>
-                </div>
-                <button type="submit" class="btn-submit">🔍 Run Sentiment Analysis</button>
-            </form>
-            
-            <div class="footer">
-                <p>Powered by Watson NLP • Built with Flask</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    ''')
-
-
-@app.route("/emotionDetector", methods=["POST"])
+        Response: Cacheable HTML content for the main page
+    """
+    return send_static_page('index.html')
+
+
+@views.route("/emotionDetector", methods=["POST"])
 def emotion_detector_route():
     """
     Handle emotion detection requests from the web interface
 
     Returns:
-        str: HTML response with emotion analysis results
-    """
-    # Get text to analyze from form data
-    text_to_analyze = request.form.get('textToAnalyze')
-
-    # Enhanced error handling for invalid input
-    if not text_to_analyze or text_to_analyze.strip() == '' or text_to_analyze.isspace():
-        return render_template_string('''
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Error - Emotion Detection</title>
-            <style>
-                body {
-                    font-family: 'Arial', sans-serif;
-                    max-width: 800px;
-                    margin: 0 auto;
-                    padding: 20px;
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    min-height: 100vh;
-                    color: #333;
-                }
-                .container {
-                    background: white;
-                    border-radius: 15px;
-                    padding: 30px;
-                    box-shadow: 0 10px 30px rgba(0,0,0,0.3);
-                    text-align: center;
-                }
-                .error-message {
-                    color: #e53e3e;
-                    font-size: 1.2em;
-                    margin: 20px 0;
-                }
-                .btn-back {
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    color: white;
-                    padding: 12px 30px;
-                    text-decoration: none;
-                    border-radius: 25px;
-                    display: inline-block;
-                    margin-top: 20px;
-                    transition: transform 0.2s ease;
-                }
-                .btn-back:hover {
-                    transform: translateY(-2px);
-                    text-decoration: none;
-                    color: white;
-                }
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1>⚠️ Invalid Input</h1>
-                <div class="error-message">
-                    Invalid text! Please provide some text to analyze.
-                </div>
-                <a href="/" class="btn-back">← Go Back</a>
-            </div>
-        </body>
-        </html>
-        ''')
+        Response: HTML response with emotion analysis results
+    """
+    with STAGE_LATENCY.time(stage='validate'):
+        # Get text to analyze from form data
+        text_to_analyze = request.form.get('textToAnalyze')
+
+        # Text left empty once markup and whitespace are removed is invalid,
+        # and answered without a backend call
+        prepared_text = prepare_text(text_to_analyze) if text_to_analyze else ''
+    if not prepared_text:
+        return send_static_page('error.html', **INVALID_INPUT_ERROR)
 
     # Perform emotion detection
-    emotion_result = emotion_detector(text_to_analyze)
+    emotion_result = emotion_detector(prepared_text, backend=backend, cache=result_cache,
+                                      preprocess=False)
+
+    key, _ = read_key(request.form)
+    aggregator.add(emotion_result, key=key)
 
     # Check if emotion detection failed and handle the error
     if emotion_result is None or emotion_result.get('dominant_emotion') is None:
-        return render_template_string('''
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Error - Emotion Detection</title>
-            <style>
-                body {
-                    font-family: 'Arial', sans-serif;
-                    max-width: 800px;
-                    margin: 0 auto;
-                    padding: 20px;
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    min-height: 100vh;
-                    color: #333;
-                }
-                .container {
-                    background: white;
-                    border-radius: 15px;
-                    padding: 30px;
-                    box-shadow: 0 10px 30px rgba(0,0,0,0.3);
-                    text-align: center;
-                }
-                .error-message {
-                    color: #e53e3e;
-                    font-size: 1.2em;
-                    margin: 20px 0;
-                }
-                .btn-back {
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    color: white;
-                    padding: 12px 30px;
-                    text-decoration: none;
-                    border-radius: 25px;
-                    display: inline-block;
-                    margin-top: 20px;
-                    transition: transform 0.2s ease;
-                }
-                .btn-back:hover {
-                    transform: translateY(-2px);
-                    text-decoration: none;
-                    color: white;
-                }
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1>⚠️ Processing Error</h1>
-                <div class="error-message">
-                    Unable to process the text for emotion analysis. Please try again with different text.
-                </div>
-                <a href="/" class="btn-back">← Go Back</a>
-            </div>
-        </body>
-        </html>
-        ''')
-
-    # Format the response
-    response_text = f"""
-    <h2>📊 Emotion Analysis Results</h2>
-    <div class="analysis-input">
-        <strong>Analyzed Text:</strong> "{text_to_analyze}"
-    </div>
-    <div class="emotion-scores">
-        <h3>Emotion Scores:</h3>
-        <div class="emotion-item">😠 <strong>Anger:</strong> {emotion_result['anger']}</div>
-        <div class="emotion-item">🤢 <strong>Disgust:</strong> {emotion_result['disgust']}</div>
-        <div class="emotion-item">😨 <strong>Fear:</strong> {emotion_result['fear']}</div>
-        <div class="emotion-item">😊 <strong>Joy:</strong> {emotion_result['joy']}</div>
-        <div class="emotion-item">😢 <strong>Sadness:</strong> {emotion_result['sadness']}</div>
-    </div>
-    <div class="dominant-emotion">
-        <h3>🎯 Dominant Emotion: <span class="highlight">
-        {emotion_result['dominant_emotion'].title()}</span></h3>
-    </div>
-    """
-
-    return render_template_string(f'''
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Results - Emotion Detection</title>
-        <style>
-            body {{
-                font-family: 'Arial', sans-serif;
-                max-width: 800px;
-                margin: 0 auto;
-                padding: 20px;
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                min-height: 100vh;
-                color: #333;
-            }}
-            .container {{
-                background: white;
-                border-radius: 15px;
-                padding: 30px;
-                box-shadow: 0 10px 30px rgba(0,0,0,0.3);
-            }}
-            h1 {{
-                text-align: center;
-                color: #4a5568;
-                margin-bottom: 30px;
-            }}
-            .analysis-input {{
-                background: #f7fafc;
-                padding: 15px;
-                border-radius: 8px;
-                margin-bottom: 25px;
-                border-left: 4px solid #48bb78;
-            }}
-            .emotion-scores {{
-                margin: 20px 0;
-            }}
-            .emotion-item {{
-                padding: 10px;
-                margin: 8px 0;
-                background: #f8f9fa;
-                border-radius: 5px;
-                border-left: 3px solid #667eea;
-                font-size: 1.1em;
-            }}
-            .dominant-emotion {{
-                background: linear-gradient(135deg, #48bb78, #38a169);
-                color: white;
-                padding: 20px;
-                border-radius: 10px;
-                text-align: center;
-                margin: 25px 0;
-            }}
-            .highlight {{
-                font-size: 1.3em;
-                font-weight: bold;
-                text-transform: uppercase;
-            }}
-            .btn-back {{
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                color: white;
-                padding: 12px 30px;
-                text-decoration: none;
-                border-radius: 25px;
-                display: inline-block;
-                margin-top: 20px;
-                transition: transform 0.2s ease;
-            }}
-            .btn-back:hover {{
-                transform: translateY(-2px);
-                text-decoration: none;
-                color: white;
-            }}
-            .footer {{
-                text-align: center;
-                margin-top: 30px;
-                color: #718096;
-                font-size: 14px;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>🧠 AI-Based Emotion Detection</h1>
-            {response_text}
-            <div style="text-align: center;">
-                <a href="/" class="btn-back">← Analyze Another Text</a>
-            </div>
-            <div class="footer">
-                <p>Powered by Watson NLP • Built with Flask</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    ''')
+        return send_static_page('error.html', **PROCESSING_ERROR)
+
+    # Format the response with the compiled, autoescaping results template
+    with STAGE_LATENCY.time(stage='render'):
+        return render_template('result.html', text=text_to_analyze, result=emotion_result)
+
+
+def send_static_page(template_name, **context):
+    """
+    Serve a page that only depends on constant context, rendering it once
+
+    The rendered HTML is kept for the life of the process and served with
+    an ETag and Cache-Control header, so conditional GETs get a 304.
+
+    Args:
+        template_name (str): Template to render
+        **context: Constant template variables
+
+    Returns:
+        Response: Cacheable HTML response
+    """
+    key = (template_name, tuple(sorted(context.items())))
+    page = _static_pages.get(key)
+    if page is None:
+        body = render_template(template_name, **context)
+        page = _static_pages[key] = (body, hashlib.sha1(body.encode('utf-8')).hexdigest())
+
+    body, etag = page
+    response = make_response(body)
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = PAGE_MAX_AGE
+    return response.make_conditional(request)
+
+
+def read_batch_texts():
+    """
+    Read and validate the texts of a JSON batch request
+
+    The request body must be a JSON object of the form {"texts": [...]}.
+
+    Returns:
+        tuple: List of texts and None, or None and an error response
+    """
+    payload = request.get_json(silent=True)
+    texts = payload.get('texts') if isinstance(payload, dict) else None
+
+    # Validate the submitted batch before calling the backend
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+        return None, (jsonify({'error': 'Request body must be {"texts": [<string>, ...]}.'}), 400)
+    if len(texts) > MAX_BATCH_SIZE:
+        return None, (jsonify({'error': f'At most {MAX_BATCH_SIZE} texts are accepted per batch.'}),
+                      413)
+    return texts, None
+
+
+@views.route("/emotionDetector/batch", methods=["POST"])
+def emotion_detector_batch_route():
+    """
+    Handle batch emotion detection requests submitted as JSON
+
+    Returns:
+        Response: JSON object with one result per text, in input order
+    """
+    texts, error_response = read_batch_texts()
+    if error_response is not None:
+        return error_response
+    key, error_message = read_key(request.get_json())
+    if error_message is not None:
+        return jsonify({'error': error_message}), 400
+
+    results = emotion_detector_batch_chunked(texts, current_app.config['EMOTION_CHUNK_CHARS'],
+                                             backend=backend, cache=result_cache)
+    aggregator.add_batch(results, key=key)
+    return jsonify({'results': results})
+
+
+@views.route("/emotionDetector/batch/async", methods=["POST"])
+async def emotion_detector_batch_async_route():
+    """
+    Handle batch emotion detection requests on an event loop
+
+    With the Watson backend, all texts of the batch are in flight at once,
+    bounded by the async client's WATSON_MAX_CONCURRENCY instead of a thread
+    pool. A language router sends each text to the async client of its
+    route's model, or scores it off the event loop when the route is not
+    Watson. Other configured backends, such as the local engine, score the
+    batch as the synchronous route does, off the event loop. Requires
+    Flask's "async" extra.
+
+    Returns:
+        Response: JSON object with one result per text, in input order
+    """
+    texts, error_response = read_batch_texts()
+    if error_response is not None:
+        return error_response
+    key, error_message = read_key(request.get_json())
+    if error_message is not None:
+        return jsonify({'error': error_message}), 400
+
+    max_chars = current_app.config['EMOTION_CHUNK_CHARS']
+    if isinstance(backend, (WatsonClient, LanguageRouter)):
+        # Calls run on the process's long-lived loop, so its clients' connections are reused
+        router = backend if isinstance(backend, LanguageRouter) else None
+        pieces, layout = split_batch(texts, max_chars)
+        results = merge_batch(await asyncio.wrap_future(run_in_background_loop(
+            async_emotion_detector_batch(pieces, cache=result_cache, router=router))), layout)
+    else:
+        results = await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(emotion_detector_batch_chunked, texts, max_chars,
+                                    backend=backend, cache=result_cache))
+    aggregator.add_batch(results, key=key)
+    return jsonify({'results': results})
+
+
+def encode_json(payload):
+    """
+    Serialize a payload to compact UTF-8 JSON, with orjson when it is installed
+
+    Args:
+        payload (object): JSON-serializable payload
+
+    Returns:
+        bytes: Encoded JSON document
+    """
+    if orjson is not None:
+        return orjson.dumps(payload)  # pylint: disable=no-member
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def api_response(payload, status=200):
+    """
+    Build a compact JSON response, compressed when the client accepts it
+
+    Brotli is preferred when the brotli package is installed and the client
+    accepts "br"; otherwise gzip is used. Small bodies are sent as is.
+
+    Args:
+        payload (object): JSON-serializable payload
+        status (int): HTTP status code
+
+    Returns:
+        Response: JSON response
+    """
+    body = encode_json(payload)
+    encoding = None
+    if len(body) >= COMPRESSION_MIN_BYTES:
+        if brotli is not None and request.accept_encodings.quality('br') > 0:
+            body, encoding = brotli.compress(body), 'br'
+        elif request.accept_encodings.quality('gzip') > 0:
+            body, encoding = gzip.compress(body, compresslevel=5), 'gzip'
+
+    response = make_response(body, status)
+    response.mimetype = 'application/json'
+    response.vary.add('Accept-Encoding')
+    if encoding is not None:
+        response.content_encoding = encoding
+    return response
+
+
+def read_fields(payload):
+    """
+    Read the result fields requested by an API caller
+
+    Fields come from the "fields" query parameter or JSON member, either as
+    a comma-separated string or a list.
+
+    Args:
+        payload (dict): Decoded JSON request body
+
+    Returns:
+        tuple: Tuple of selected fields (None for every field) and an error message or None
+    """
+    fields = request.args.get('fields', payload.get('fields'))
+    if fields is None:
+        return None, None
+    if isinstance(fields, str):
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+    if not isinstance(fields, list) or not fields or \
+            not all(field in RESULT_FIELDS for field in fields):
+        return None, f'fields must be a non-empty subset of {", ".join(RESULT_FIELDS)}.'
+    return tuple(fields), None
+
+
+def select_fields(result, fields):
+    """
+    Keep only the requested fields of a result, plus any per-item error and
+    the approximate-match markers of a near-duplicate result
+
+    Args:
+        result (dict): Emotion result
+        fields (tuple): Fields to keep, or None to keep every field
+
+    Returns:
+        dict: Result restricted to the requested fields
+    """
+    if fields is None:
+        return result
+    selected = {field: result.get(field) for field in fields}
+    for marker in ('error', 'approximate', 'similarity'):
+        if marker in result:
+            selected[marker] = result[marker]
+    return selected
+
+
+@views.route("/api/v1/emotion", methods=["POST"])
+def emotion_api_route():
+    """
+    Score one text or a batch of texts and return the results as JSON
+
+    The request body is {"text": "..."} for one text, or {"texts": [...]} for
+    a batch. An optional "fields" selection, for example
+    ?fields=dominant_emotion, restricts each result to the listed fields.
+    Texts longer than EMOTION_CHUNK_CHARS are scored by chunks; "chunks": true
+    adds the offsets and result of every chunk to a single-text response.
+
+    Returns:
+        Response: The result object, or {"results": [...]} for a batch
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return api_response({'error': 'Request body must be a JSON object.'}, 400)
+
+    fields, error_message = read_fields(payload)
+    if error_message is None:
+        key, error_message = read_key(payload)
+    if error_message is not None:
+        return api_response({'error': error_message}, 400)
+    max_chars = current_app.config['EMOTION_CHUNK_CHARS']
+
+    if 'texts' in payload:
+        texts, error_response = read_batch_texts()
+        if error_response is not None:
+            return error_response
+        results = emotion_detector_batch_chunked(texts, max_chars, backend=backend,
+                                                 cache=result_cache)
+        aggregator.add_batch(results, key=key)
+        return api_response({'results': [select_fields(result, fields) for result in results]})
+
+    text = payload.get('text')
+    prepared_text = prepare_text(text) if isinstance(text, str) else ''
+    if not prepared_text:
+        return api_response({'error': 'Request body must be {"text": <non-blank string>}.'}, 400)
+    include_chunks = payload.get('chunks') is True
+    if include_chunks or len(text) > max_chars:
+        # Chunk offsets refer to the submitted text; chunks are cleaned one by one
+        result = emotion_detector_chunked(text, max_chars, backend=backend, cache=result_cache,
+                                          include_chunks=include_chunks)
+    else:
+        result = emotion_detector(prepared_text, backend=backend, cache=result_cache,
+                                  preprocess=False)
+    aggregator.add(result, key=key)
+    response = select_fields(result, fields)
+    if include_chunks:
+        response['chunks'] = [dict(chunk, result=select_fields(chunk['result'], fields))
+                              for chunk in result['chunks']]
+    return api_response(response)
+
+
+@views.route("/api/v1/emotion/stream", methods=["POST"])
+def emotion_stream_route():
+    """
+    Score many texts and stream each result as soon as it is ready
+
+    The body is {"texts": [...]} as for the batch routes, or an NDJSON stream
+    (Content-Type: application/x-ndjson) of strings or {"text": ..., "id": ...}
+    objects, read as it arrives. Results are written in input order as NDJSON,
+    or as Server-Sent Events when the client accepts text/event-stream. Each
+    one carries its "index" and the record's "id", if any. Scoring runs a
+    bounded number of texts ahead of the client, so a slow reader slows the
+    scoring instead of growing memory. The optional "key" query parameter
+    groups the results in the live statistics.
+
+    Returns:
+        Response: Streamed results
+    """
+    key, error_message = read_key(request.args)
+    if error_message is not None:
+        return jsonify({'error': error_message}), 400
+    if request.mimetype == 'application/x-ndjson':
+        records = read_ndjson_records(request.stream)
+    else:
+        texts, error_response = read_batch_texts()
+        if error_response is not None:
+            return error_response
+        records = ({'text': text} for text in texts)
+
+    sse = request.accept_mimetypes.best_match(
+        ['application/x-ndjson', 'text/event-stream']) == 'text/event-stream'
+    scored = score_stream(records, key=lambda record: record['text'] or '',
+                          chunk_size=STREAM_CHUNK_SIZE if backend.supports_batch else 1,
+                          max_workers=STREAM_WORKERS,
+                          max_chars=current_app.config['EMOTION_CHUNK_CHARS'],
+                          backend=backend, cache=result_cache)
+
+    def generate():
+        count = 0
+        for index, (record, result) in enumerate(scored):
+            if 'error' in record:
+                result = dict.fromkeys(RESULT_FIELDS, None)
+                result['error'] = record['error']
+            else:
+                aggregator.add(result, key=key)
+            item = {'index': index}
+            if 'id' in record:
+                item['id'] = record['id']
+            item.update(result)
+            body = encode_json(item).decode('utf-8')
+            yield f'id: {index}\ndata: {body}\n\n' if sse else body + '\n'
+            count += 1
+        if sse:
+            yield f'event: end\ndata: {{"count":{count}}}\n\n'
+
+    response = Response(stream_with_context(generate()),
+                        mimetype='text/event-stream' if sse else 'application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies such as nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def read_ndjson_records(stream):
+    """
+    Lazily read the records of an NDJSON request body
+
+    Args:
+        stream (file): Binary request body stream
+
+    Yields:
+        dict: Record with a "text" string, or with a None text and an "error"
+            message for an invalid line
+    """
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield {'text': None, 'error': 'Line is not valid JSON.'}
+            continue
+        if isinstance(record, str):
+            record = {'text': record}
+        if not isinstance(record, dict) or not isinstance(record.get('text'), str):
+            yield {'text': None, 'error': 'Line must be a string or {"text": <string>}.'}
+            continue
+        yield {'text': record['text'], 'id': record['id']} if 'id' in record \
+            else {'text': record['text']}
+
+
+def read_key(values):
+    """
+    Read the optional grouping key (e.g. a product id) of scored feedback
+
+    Args:
+        values (dict): Decoded JSON request body, or the submitted form
+
+    Returns:
+        tuple: Key or None, and an error message or None
+    """
+    key = values.get('key')
+    if key is None or key == '':
+        return None, None
+    if not isinstance(key, str) or len(key) > MAX_KEY_LENGTH:
+        return None, f'key must be a string of at most {MAX_KEY_LENGTH} characters.'
+    return key, None
+
+
+def job_payload(job):
+    """
+    Describe a background job for API responses
+
+    Args:
+        job (dict): Job read from the job queue
+
+    Returns:
+        dict: Id, status, key, counts, progress fraction, error and timestamps
+    """
+    return {'id': job['id'], 'status': job['status'], 'key': job['key'],
+            'total': job['total'], 'done': job['done'],
+            'progress': job['done'] / job['total'] if job['total'] else 1.0,
+            'error': job['error'], 'created': job['created'], 'updated': job['updated']}
+
+
+def jobs_disabled():
+    """
+    Answer job requests when no job database is configured
+
+    Returns:
+        tuple: JSON error response and status 503
+    """
+    return jsonify({'error': 'Background jobs are disabled; set EMOTION_JOBS_PATH.'}), 503
+
+
+def job_not_found():
+    """
+    Answer requests for unknown jobs
+
+    Returns:
+        tuple: JSON error response and status 404
+    """
+    return jsonify({'error': 'Unknown job.'}), 404
+
+
+@views.route("/api/v1/jobs", methods=["POST"])
+def job_submit_route():
+    """
+    Submit texts to be scored by a background job
+
+    The body is {"texts": [...], "key": ...}, or an NDJSON stream of strings
+    or {"text": ...} objects with the key in the query string. NDJSON bodies
+    are stored as they arrive and are not limited in size. Lines that are not
+    valid get an error result.
+
+    Returns:
+        Response: The queued job with status 202 and its URL in the Location header
+    """
+    if job_queue is None:
+        return jobs_disabled()
+    if request.mimetype == 'application/x-ndjson':
+        key, error_message = read_key(request.args)
+        texts = (record['text'] for record in read_ndjson_records(request.stream))
+    else:
+        payload = request.get_json(silent=True)
+        texts = payload.get('texts') if isinstance(payload, dict) else None
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            return jsonify({'error': 'Request body must be {"texts": [<string>, ...]}.'}), 400
+        key, error_message = read_key(payload)
+    if error_message is not None:
+        return jsonify({'error': error_message}), 400
+
+    job = job_queue.submit(texts, key=key)
+    start_jobs()
+    response = jsonify(job_payload(job))
+    response.status_code = 202
+    response.headers['Location'] = f"/api/v1/jobs/{job['id']}"
+    return response
+
+
+@views.route("/api/v1/jobs/<job_id>")
+def job_status_route(job_id):
+    """
+    Report the status and progress of a background job
+
+    Args:
+        job_id (str): Job id returned on submission
+
+    Returns:
+        Response: JSON job description, or 404 for an unknown job
+    """
+    if job_queue is None:
+        return jobs_disabled()
+    job = job_queue.get(job_id)
+    if job is None:
+        return job_not_found()
+    return jsonify(job_payload(job))
+
+
+@views.route("/api/v1/jobs/<job_id>/results")
+def job_results_route(job_id):
+    """
+    Read the results a background job stored so far, in input order
+
+    Query parameters "offset" and "limit" select a page of results. Clients
+    accepting application/x-ndjson instead get every result from the offset
+    on as a stream read from the job database chunk by chunk.
+
+    Args:
+        job_id (str): Job id returned on submission
+
+    Returns:
+        Response: JSON page with the job status, the results and the offset
+            of the next page, or an NDJSON stream of results
+    """
+    if job_queue is None:
+        return jobs_disabled()
+    job = job_queue.get(job_id)
+    if job is None:
+        return job_not_found()
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', JOB_RESULTS_PAGE))
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers.'}), 400
+    if offset < 0 or not 0 < limit <= MAX_JOB_RESULTS_PAGE:
+        return jsonify({'error': f'offset must be at least 0 and limit between 1 and '
+                                 f'{MAX_JOB_RESULTS_PAGE}.'}), 400
+
+    if request.accept_mimetypes.best_match(
+            ['application/json', 'application/x-ndjson']) == 'application/x-ndjson':
+        def generate():
+            for result in job_queue.results(job_id, offset=offset):
+                yield encode_json(result) + b'\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    results = list(job_queue.results(job_id, offset=offset, limit=limit))
+    next_offset = offset + len(results)
+    return api_response({'job': job_payload(job), 'offset': offset, 'results': results,
+                         'next_offset': next_offset if next_offset < job['total'] else None})
+
+
+@views.route("/api/v1/jobs/<job_id>", methods=["DELETE"])
+def job_cancel_route(job_id):
+    """
+    Cancel a background job; results stored so far are kept
+
+    Args:
+        job_id (str): Job id returned on submission
+
+    Returns:
+        Response: JSON job description, or 404 for an unknown job
+    """
+    if job_queue is None:
+        return jobs_disabled()
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return job_not_found()
+    return jsonify(job_payload(job))
+
+
+@views.route("/api/v1/jobs/<job_id>/resume", methods=["POST"])
+def job_resume_route(job_id):
+    """
+    Queue a cancelled or failed job again, continuing from its last stored chunk
+
+    Args:
+        job_id (str): Job id returned on submission
+
+    Returns:
+        Response: JSON job description, or 404 for an unknown job
+    """
+    if job_queue is None:
+        return jobs_disabled()
+    job = job_queue.resume(job_id)
+    if job is None:
+        return job_not_found()
+    start_jobs()
+    return jsonify(job_payload(job))
+
+
+@views.route("/api/v1/summary")
+def summary_route():
+    """
+    Report live emotion statistics of the feedback scored so far
+
+    Query parameters: "key" restricts the summary to one key, "since" (Unix
+    time) to the windows ending after it, and "windows=1" adds a breakdown
+    per time window.
+
+    Returns:
+        Response: Window length, the overall total and one summary per key
+    """
+    key = request.args.get('key')
+    since = request.args.get('since')
+    try:
+        since = float(since) if since is not None else None
+    except ValueError:
+        return api_response({'error': 'since must be a Unix timestamp.'}, 400)
+
+    return api_response(aggregator.summary(
+        key=key, since=since, all_keys=key is None,
+        per_window=request.args.get('windows') in ('1', 'true')))
+
+
+@views.route("/status")
+def status_route():
+    """
+    Report the state of the backend circuit breaker and the result cache
+
+    Returns:
+        Response: JSON object with breaker and cache statistics
+    """
+    return jsonify({
+        'backend': backend.model_id,
+        'breaker': get_default_breaker().stats(),
+        'cache': result_cache.stats() if result_cache is not None else None,
+        'single_flight': get_default_single_flight().stats(),
+        'similarity': (get_default_similarity_index().stats()
+                       if get_default_similarity_index() is not None else None),
+        'admission': admission.stats() if admission is not None else None,
+        'rate_limit': rate_limiter.stats() if rate_limiter is not None else None,
+        'jobs': job_queue.stats() if job_queue is not None else None,
+        'preprocessing': (get_default_preprocessor().stats()
+                          if get_default_preprocessor() is not None else None),
+        'routing': backend.stats() if isinstance(backend, LanguageRouter) else None,
+    })
+
+
+@views.route("/healthz")
+def liveness_route():
+    """
+    Report that the process is alive and answering requests
+
+    Returns:
+        Response: JSON status and the worker's process id
+    """
+    return jsonify({'status': 'alive', 'pid': os.getpid()})
+
+
+@views.route("/readyz")
+def readiness_route():
+    """
+    Report whether this worker should receive traffic
+
+    A worker is ready once its shared state is loaded and until it starts
+    shutting down. An open circuit breaker does not make it unready, since
+    texts are then answered by the fallback backend.
+
+    Returns:
+        Response: JSON status, with 503 while starting or shutting down
+    """
+    if not _ready.is_set():
+        return jsonify({'status': 'unavailable'}), 503
+    return jsonify({'status': 'ready', 'backend': backend.model_id,
+                    'breaker': get_default_breaker().state})
+
+
+@views.route("/metrics")
+def metrics_route():
+    """
+    Expose request, stage and backend metrics for Prometheus to scrape
+
+    Returns:
+        Response: Metrics in the Prometheus text exposition format
+    """
+    response = make_response(get_default_registry().render())
+    response.headers['Content-Type'] = CONTENT_TYPE
+    return response
+
+
+# Application served by "gunicorn server:app" and imported by the tests
+app = create_app()
 
 
 if __name__ == "__main__":
-    # Run the Flask application
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    # Development server only; set FLASK_DEBUG=1 for the debugger and reloader.
+    # Production deployments run gunicorn with gunicorn.conf.py instead.
+    try:
+        start_jobs()
+        app.run(host="0.0.0.0", port=5000)
+    finally:
+        shutdown()
@@ -0,0 +1,77 @@
+"""
+Unit Tests for the Benchmark Suite
+
+This module checks the load harness, the stub Watson server and the
+regression comparison used by ``python -m benchmarks``.
+"""
+
+import unittest
+
+from EmotionDetection import CircuitBreaker, WatsonClient
+from benchmarks.__main__ import compare
+from benchmarks.bench_startup import STARTUP_SCENARIOS, time_statement
+from benchmarks.harness import percentile, run_load
+from benchmarks.stub_watson import StubWatsonServer, stub_emotions
+
+
+class TestHarness(unittest.TestCase):
+    """Test cases for the load harness"""
+
+    def test_percentile_nearest_rank(self):
+        """Test nearest-rank percentiles of sorted samples"""
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 0.50), 50)
+        self.assertEqual(percentile(samples, 0.99), 99)
+        self.assertEqual(percentile([], 0.95), 0.0)
+
+    def test_run_load_counts_errors(self):
+        """Test that failing and raising calls are counted as errors"""
+        def call(value):
+            if value == 0:
+                raise ValueError(value)
+            return value != 1
+
+        summary = run_load(call, [0, 1, 2, 3], concurrency=2)
+        self.assertEqual(summary['calls'], 4)
+        self.assertEqual(summary['errors'], 2)
+
+    def test_compare_flags_regressions(self):
+        """Test that slower p95 and lower throughput are reported"""
+        baseline = {'scenarios': {'a': {'p95_ms': 10.0, 'items_per_second': 100.0}}}
+        faster = {'scenarios': {'a': {'p95_ms': 11.0, 'items_per_second': 95.0}}}
+        slower = {'scenarios': {'a': {'p95_ms': 20.0, 'items_per_second': 50.0}}}
+
+        self.assertEqual(compare(faster, baseline, 0.2), [])
+        self.assertEqual(len(compare(slower, baseline, 0.2)), 2)
+
+
+class TestStubWatsonServer(unittest.TestCase):
+    """Test cases for the stub Watson server"""
+
+    def test_watson_client_scores_against_stub(self):
+        """Test that a WatsonClient gets deterministic scores from the stub"""
+        with StubWatsonServer(latency=0, jitter=0) as stub, \
+                WatsonClient(url=stub.url, breaker=CircuitBreaker()) as client:
+            result = client.analyse("I love this")
+            blank = client.analyse("   ")
+
+        expected = stub_emotions("I love this")
+        self.assertEqual(result['dominant_emotion'], max(expected, key=expected.get))
+        self.assertIsNone(blank['dominant_emotion'])
+
+    def test_error_rate(self):
+        """Test that an error rate of 1 fails every request"""
+        with StubWatsonServer(latency=0, jitter=0, error_rate=1.0) as stub, \
+                WatsonClient(url=stub.url, retries=0, breaker=CircuitBreaker()) as client:
+            self.assertIsNone(client.analyse("I love this")['dominant_emotion'])
+        self.assertEqual(stub.requests, 1)
+
+
+class TestStartup(unittest.TestCase):
+    """Test cases for the import-time benchmarks"""
+
+    def test_detector_import_loads_no_backend_dependency(self):
+        """Test that importing emotion_detector loads neither requests, aiohttp nor NumPy"""
+        measurement = time_statement(STARTUP_SCENARIOS['startup/import_detector'])
+        self.assertEqual(measurement['loaded'], [])
+        self.assertGreater(measurement['seconds'], 0)
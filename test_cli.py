@@ -0,0 +1,104 @@
+"""
+Unit Tests for the Bulk Scoring Command Line Interface
+
+This module contains unit tests for ``python -m EmotionDetection`` and the
+streaming pipeline it is built on.
+"""
+
+import csv
+import json
+import os
+import tempfile
+import unittest
+
+from EmotionDetection.__main__ import main, save_checkpoint
+from EmotionDetection.pipeline import ordered_map
+
+TEXTS = ["I am so happy today", "I hate this so much", "I am feeling very sad today",
+         "I am really scared of this situation", "This is absolutely disgusting"]
+
+
+class TestOrderedMap(unittest.TestCase):
+    """Test cases for the ordered_map pipeline helper"""
+
+    def test_results_keep_input_order(self):
+        """Test that results come back in input order"""
+        results = list(ordered_map(lambda value: value * value, range(100),
+                                   max_workers=4, max_in_flight=3))
+        self.assertEqual(results, [value * value for value in range(100)])
+
+    def test_input_is_consumed_lazily(self):
+        """Test that no more than max_in_flight items are read ahead"""
+        consumed = []
+
+        def source():
+            for value in range(1000):
+                consumed.append(value)
+                yield value
+
+        results = ordered_map(lambda value: value, source(), max_workers=2, max_in_flight=4)
+        self.assertEqual(next(results), 0)
+        results.close()
+        self.assertLessEqual(len(consumed), 4)
+
+
+class TestBulkScoringCli(unittest.TestCase):
+    """Test cases for python -m EmotionDetection"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.input_path = os.path.join(self.directory.name, 'feedback.csv')
+        with open(self.input_path, 'w', newline='', encoding='utf-8') as input_file:
+            writer = csv.writer(input_file)
+            writer.writerow(['id', 'comment'])
+            for index, text in enumerate(TEXTS):
+                writer.writerow([index, text])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _run(self, output_name, *extra):
+        output_path = os.path.join(self.directory.name, output_name)
+        main([self.input_path, '-o', output_path, '--text-field', 'comment', '--backend',
+              'local', '--chunk-size', '2', '--workers', '2', '--no-cache', *extra])
+        return output_path
+
+    def test_csv_to_jsonl_in_order(self):
+        """Test that every record is scored and written in input order"""
+        output_path = self._run('scored.jsonl')
+
+        with open(output_path, encoding='utf-8') as output_file:
+            rows = [json.loads(line) for line in output_file]
+        self.assertEqual([row['id'] for row in rows], [str(index) for index in range(5)])
+        self.assertEqual([row['dominant_emotion'] for row in rows],
+                         ['joy', 'anger', 'sadness', 'fear', 'disgust'])
+
+    def test_csv_output(self):
+        """Test that CSV output keeps the input columns and adds the result columns"""
+        output_path = self._run('scored.csv')
+
+        with open(output_path, newline='', encoding='utf-8') as output_file:
+            rows = list(csv.DictReader(output_file))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['comment'], TEXTS[0])
+        self.assertEqual(rows[4]['dominant_emotion'], 'disgust')
+
+    def test_resume_from_checkpoint(self):
+        """Test that --resume skips checkpointed records and drops partial output"""
+        output_path = os.path.join(self.directory.name, 'scored.jsonl')
+        first_rows = ''.join(json.dumps({'id': str(index), 'dominant_emotion': 'done'}) + '\n'
+                             for index in range(2))
+        with open(output_path, 'w', encoding='utf-8') as output_file:
+            output_file.write(first_rows + '{"id": "2", "trunc')
+        save_checkpoint(output_path + '.checkpoint', 2, len(first_rows.encode('utf-8')))
+
+        self._run('scored.jsonl', '--resume')
+
+        with open(output_path, encoding='utf-8') as output_file:
+            rows = [json.loads(line) for line in output_file]
+        self.assertEqual([row['id'] for row in rows], [str(index) for index in range(5)])
+        self.assertEqual([row['dominant_emotion'] for row in rows[:3]], ['done', 'done', 'sadness'])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
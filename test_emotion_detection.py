@@ -5,8 +5,34 @@ This module contains comprehensive unit tests for the emotion_detector function
 to ensure it works correctly under various scenarios.
 """
 
+import ast
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import time
 import unittest
-from EmotionDetection import emotion_detector
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import requests
+
+from EmotionDetection import (emotion_detector, emotion_detector_batch, WatsonClient, ResultCache,
+                              async_emotion_detector, async_emotion_detector_batch,
+                              LocalEmotionEngine, CircuitBreaker, SingleFlight, AsyncSingleFlight,
+                              MicroBatcher, EmotionBatch, EmotionResult, EmotionAggregator,
+                              EmotionStats, ScoreStore, StoreBackedCache, RetryPolicy,
+                              RetryBudget, HedgePolicy, SimilarityIndex, warmup)
+from EmotionDetection.admission import AdmissionController, RateLimiter, RejectedError
+from EmotionDetection import client as client_module
+from EmotionDetection.backends import BackendError, empty_result
+from EmotionDetection.chunking import chunk_spans, emotion_detector_chunked, merge_results
+from EmotionDetection.jobs import JobQueue, JobRunner
+from EmotionDetection.pipeline import score_stream
+from EmotionDetection.preprocessing import Preprocessor, detect_language, strip_html
+from EmotionDetection.routing import LanguageRouter
+from EmotionDetection.metrics import BACKEND_RESPONSES, Histogram
 
 
 class TestEmotionDetector(unittest.TestCase):
@@ -129,6 +155,1248 @@ class TestEmotionDetector(unittest.TestCase):
         self.assertIsInstance(result, dict)
 
 
+class TestWarmup(unittest.TestCase):
+    """Test cases for the lazy package namespace and warmup()"""
+
+    def test_lazy_package_namespace(self):
+        """Test that public names resolve lazily and unknown names raise AttributeError"""
+        import EmotionDetection  # pylint: disable=import-outside-toplevel
+        self.assertIs(EmotionDetection.warmup, warmup)
+        self.assertIn('AsyncWatsonClient', dir(EmotionDetection))
+        with self.assertRaises(AttributeError):
+            EmotionDetection.not_a_name  # pylint: disable=pointless-statement
+
+    def test_static_declarations_match_exports(self):
+        """Test that the TYPE_CHECKING imports declare exactly the lazily exported names"""
+        import EmotionDetection  # pylint: disable=import-outside-toplevel
+        with open(EmotionDetection.__file__, encoding='utf-8') as source:
+            tree = ast.parse(source.read())
+        block = next(node for node in tree.body if isinstance(node, ast.If)
+                     and getattr(node.test, 'id', None) == 'TYPE_CHECKING')
+        declared = {alias.name: statement.module for statement in block.body
+                    for alias in statement.names}
+
+        self.assertEqual(declared, EmotionDetection._EXPORTS)  # pylint: disable=protected-access
+
+    def test_warmup_scores_with_local_engine(self):
+        """Test that warmup loads the fallback and runs the local model once"""
+        engine = LocalEmotionEngine()
+        with mock.patch('EmotionDetection.emotion_detection.get_fallback_backend',
+                        return_value=engine), \
+                mock.patch.object(engine, 'analyse_batch', wraps=engine.analyse_batch) as batch:
+            self.assertIs(warmup(engine), engine)
+        batch.assert_called_once()
+
+
+class TestEmotionDetectorBatch(unittest.TestCase):
+    """Test cases for the emotion_detector_batch function"""
+
+    @staticmethod
+    def _fake_detector(text, **options):  # pylint: disable=unused-argument
+        """Return a deterministic result derived from the text"""
+        if text == 'boom':
+            raise KeyError('emotionPredictions')
+        return {'anger': 0.0, 'disgust': 0.0, 'fear': 0.0, 'joy': float(len(text)),
+                'sadness': 0.0, 'dominant_emotion': 'joy'}
+
+    def test_batch_preserves_input_order(self):
+        """Test that results are returned in input order"""
+        texts = [f"text number {index}" * (index + 1) for index in range(50)]
+        with mock.patch('EmotionDetection.emotion_detection.emotion_detector',
+                        side_effect=self._fake_detector):
+            results = emotion_detector_batch(texts, max_workers=4)
+
+        self.assertEqual([result['joy'] for result in results],
+                         [float(len(text)) for text in texts])
+
+    def test_batch_error_slot(self):
+        """Test that a failing item yields an error slot instead of aborting the batch"""
+        with mock.patch('EmotionDetection.emotion_detection.emotion_detector',
+                        side_effect=self._fake_detector):
+            results = emotion_detector_batch(['fine', 'boom', 'also fine'])
+
+        self.assertEqual(results[0]['dominant_emotion'], 'joy')
+        self.assertIsNone(results[1]['dominant_emotion'])
+        self.assertIn('emotionPredictions', results[1]['error'])
+        self.assertEqual(results[2]['dominant_emotion'], 'joy')
+
+    def test_batch_empty_input(self):
+        """Test that an empty batch returns an empty list"""
+        self.assertEqual(emotion_detector_batch([]), [])
+
+    def test_stream_scores_on_its_own_workers(self):
+        """Test that a stream on a non-batch backend builds no pool per text"""
+        texts = [f"text number {index}" for index in range(10)]
+        with mock.patch('EmotionDetection.emotion_detection.emotion_detector',
+                        side_effect=self._fake_detector), \
+                mock.patch('EmotionDetection.emotion_detection.ThreadPoolExecutor') as pool:
+            streamed = list(score_stream(texts, chunk_size=1, max_workers=4,
+                                         backend=WatsonClient(), use_cache=False))
+
+        pool.assert_not_called()
+        self.assertEqual([result['joy'] for _, result in streamed],
+                         [float(len(text)) for text in texts])
+
+
+class TestChunking(unittest.TestCase):
+    """Test cases for long-text chunking and merging"""
+
+    TEXT = "I love this product. It is great!  But the delivery was awful.\nI hate waiting."
+
+    def test_chunks_follow_sentence_boundaries(self):
+        """Test that sentences are packed into chunks no longer than max_chars"""
+        chunks = [self.TEXT[start:end] for start, end in chunk_spans(self.TEXT, 40)]
+
+        self.assertEqual(chunks, ["I love this product. It is great!",
+                                  "But the delivery was awful.",
+                                  "I hate waiting."])
+
+    def test_long_sentence_is_split_on_whitespace(self):
+        """Test that a sentence longer than max_chars is cut between words"""
+        text = "word " * 10
+        self.assertTrue(all(end - start <= 12 for start, end in chunk_spans(text, 12)))
+        self.assertEqual(' '.join(text[start:end] for start, end in chunk_spans(text, 12)),
+                         text.strip())
+
+    def test_merge_is_length_weighted(self):
+        """Test that longer chunks weigh more and failed chunks are ignored"""
+        joy = {'anger': 0.0, 'disgust': 0.0, 'fear': 0.0, 'joy': 1.0, 'sadness': 0.0,
+               'dominant_emotion': 'joy'}
+        anger = dict(joy, joy=0.0, anger=1.0, dominant_emotion='anger')
+        failed = dict.fromkeys(joy, None)
+
+        merged = merge_results([joy, anger, failed], [30, 10, 50])
+
+        self.assertEqual(merged['joy'], 0.75)
+        self.assertEqual(merged['dominant_emotion'], 'joy')
+        self.assertIsNone(merge_results([failed], [10])['dominant_emotion'])
+
+    def test_chunked_detector_scores_chunks(self):
+        """Test that a long text is scored per chunk and the chunks are reported"""
+        engine = LocalEmotionEngine()
+        with mock.patch.object(engine, 'analyse_batch', wraps=engine.analyse_batch) as batch:
+            result = emotion_detector_chunked(self.TEXT, max_chars=40, backend=engine,
+                                              use_cache=False, include_chunks=True)
+
+        batch.assert_called_once()
+        self.assertEqual([chunk['start'] for chunk in result['chunks']], [0, 35, 63])
+        self.assertEqual(result['chunks'][2]['result']['dominant_emotion'], 'anger')
+        self.assertIn(result['dominant_emotion'], ('joy', 'anger'))
+
+
+class TestPreprocessing(unittest.TestCase):
+    """Test cases for text preprocessing and language routing"""
+
+    def test_prepare_cleans_text(self):
+        """Test markup stripping, Unicode and whitespace normalization and truncation"""
+        preprocessor = Preprocessor(max_chars=16)
+        self.assertEqual(preprocessor.prepare('<p>Great&nbsp;<b>service</b></p>'
+                                              '<script>track()</script>\u200b'),
+                         'Great service')
+        self.assertEqual(preprocessor.prepare('\ufb01ne  work,   really great'), 'fine work,')
+        self.assertEqual(preprocessor.prepare('<div> </div>'), '')
+        self.assertEqual(preprocessor.stats()['emptied'], 1)
+
+    def test_comparison_signs_are_not_markup(self):
+        """Test that prose using '<' and '>' keeps its words while real tags are stripped"""
+        self.assertEqual(strip_html('if a<b and c>d then'), 'if a<b and c>d then')
+        self.assertEqual(Preprocessor().prepare('Price < 10 and quality > price <3'),
+                         'Price < 10 and quality > price <3')
+        self.assertEqual(Preprocessor().prepare('<a href="/x" class=\'y\'>Nice</a><br/>work'),
+                         'Nice work')
+
+    def test_bad_batch_items_get_error_slots(self):
+        """Test that values that are not strings or fail to clean do not abort a batch"""
+        engine = LocalEmotionEngine()
+        preprocessor = Preprocessor()
+        real_prepare = preprocessor.prepare
+
+        def prepare(text):
+            if text == 'broken':
+                raise ValueError('cannot clean')
+            return real_prepare(text)
+
+        with mock.patch.object(preprocessor, 'prepare', side_effect=prepare):
+            results = emotion_detector_batch(['I love it', None, 'broken'], backend=engine,
+                                             use_cache=False, preprocessor=preprocessor)
+        streamed = list(score_stream([{'text': 'I love it'}, {'text': None}],
+                                     key=lambda record: record['text'], backend=engine,
+                                     use_cache=False))
+
+        self.assertEqual(results[0], engine.analyse('I love it'))
+        self.assertIn('NoneType', results[1]['error'])
+        self.assertEqual(results[2]['error'], 'cannot clean')
+        self.assertEqual(streamed[0][1], results[0])
+        self.assertIn('error', streamed[1][1])
+
+    def test_detect_language(self):
+        """Test script- and stop-word-based language guesses"""
+        self.assertEqual(detect_language("I love this product and it is great"), 'en')
+        self.assertEqual(detect_language("El servicio fue muy malo y no me gusta"), 'es')
+        self.assertEqual(detect_language("Der Service ist nicht gut"), 'de')
+        self.assertEqual(detect_language("\u3053\u306e\u88fd\u54c1"), 'ja')
+        self.assertIsNone(detect_language("Great!"))
+
+    def test_markup_only_input_skips_backend(self):
+        """Test that empty texts are answered without a backend call and markup shares the cache"""
+        engine = LocalEmotionEngine()
+        cache = ResultCache()
+        with mock.patch.object(engine, 'analyse', wraps=engine.analyse) as analyse:
+            blank = emotion_detector('<p>&nbsp;</p>', backend=engine, cache=cache)
+            first = emotion_detector('<b>Great</b> service', backend=engine, cache=cache)
+            second = emotion_detector('Great   service', backend=engine, cache=cache)
+            batch = emotion_detector_batch(['', '<i>Great service</i>'], backend=engine,
+                                           cache=cache)
+
+        self.assertIsNone(blank['dominant_emotion'])
+        self.assertEqual(analyse.call_count, 1)
+        self.assertEqual(second, first)
+        self.assertEqual(batch[1], first)
+        self.assertIsNone(batch[0]['dominant_emotion'])
+
+    def test_language_router(self):
+        """Test that texts go to their language's backend or are answered as unsupported"""
+        english, other = LocalEmotionEngine(), LocalEmotionEngine(model_id='other')
+        router = LanguageRouter({'en': english, 'fr': None, '*': other})
+        with mock.patch.object(english, 'analyse_batch', wraps=english.analyse_batch) as en_batch:
+            results = router.analyse_batch(["I love it and it is great", "Great!",
+                                            "Le service est très mauvais", "Es muy bueno"])
+
+        self.assertEqual(en_batch.call_args.args[0], ["I love it and it is great", "Great!"])
+        self.assertEqual(results[2]['error'], 'Language not supported: fr')
+        self.assertIsNotNone(results[3]['dominant_emotion'])
+        self.assertTrue(router.supports_batch)
+
+    def test_router_from_env(self):
+        """Test EMOTION_LANGUAGE_MODELS parsing and derived Watson models"""
+        client = WatsonClient(model_id='english')
+        with mock.patch('EmotionDetection.client.get_default_client', return_value=client):
+            router = LanguageRouter.from_env(client, {
+                'EMOTION_LANGUAGE_MODELS': 'de=watson:german, fr=none'})
+
+        self.assertIs(router.routes['*'], client)
+        self.assertIsNone(router.routes['fr'])
+        german = router.routes['de']
+        self.assertEqual(german.model_id, 'german')
+        with mock.patch.object(client.session, 'post') as post:
+            german.post("Sehr gut")
+        self.assertEqual(post.call_args.kwargs['headers'],
+                         {'grpc-metadata-mm-model-id': 'german'})
+        self.assertIs(LanguageRouter.from_env(client, {}), client)
+
+
+class TestWatsonClient(unittest.TestCase):
+    """Test cases for the pooled WatsonClient"""
+
+    def test_client_configures_pool_and_retries(self):
+        """Test that the client uses the configured pool size and retries"""
+        with WatsonClient(pool_maxsize=7, retries=3, read_timeout=4) as client:
+            adapter = client.session.get_adapter(client.url)
+
+            self.assertEqual(adapter._pool_maxsize, 7)  # pylint: disable=protected-access
+            self.assertEqual(adapter.max_retries.total, 0)
+            self.assertEqual(client.retry_policy.max_attempts, 4)
+            self.assertEqual(client.timeout[1], 4)
+            self.assertEqual(client.session.headers['grpc-metadata-mm-model-id'],
+                             client.model_id)
+
+    def test_emotion_detector_uses_client(self):
+        """Test that emotion_detector sends the text through the given client"""
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {'emotionPredictions': [{'emotion': {
+            'anger': 0.1, 'disgust': 0.1, 'fear': 0.1, 'joy': 0.6, 'sadness': 0.1}}]}
+        client = WatsonClient(model_id='test-model')
+
+        with mock.patch.object(client, 'post', return_value=response) as post:
+            result = emotion_detector("I am so happy today", backend=client, use_cache=False)
+
+        post.assert_called_once_with("I am so happy today")
+        self.assertEqual(result['dominant_emotion'], 'joy')
+        self.assertEqual(result['joy'], 0.6)
+
+
+class TestMetrics(unittest.TestCase):
+    """Test cases for the metrics registry and backend instrumentation"""
+
+    def test_histogram_exposition(self):
+        """Test cumulative buckets, count and sum in the text format"""
+        histogram = Histogram('test_seconds', 'Test latency.', ('stage',), buckets=(0.1, 1.0))
+        histogram.observe(0.05, stage='a')
+        histogram.observe(0.5, stage='a')
+        histogram.observe(5, stage='a')
+
+        lines = histogram.render()
+        self.assertIn('# TYPE test_seconds histogram', lines)
+        self.assertIn('test_seconds_bucket{stage="a",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{stage="a",le="1"} 2', lines)
+        self.assertIn('test_seconds_bucket{stage="a",le="+Inf"} 3', lines)
+        self.assertIn('test_seconds_count{stage="a"} 3', lines)
+
+    def test_labels_must_match(self):
+        """Test that observing with the wrong labels is rejected"""
+        with self.assertRaises(ValueError):
+            Histogram('test_seconds', 'Test latency.', ('stage',)).observe(1, route='/')
+
+    def test_backend_outcomes_are_counted(self):
+        """Test that Watson answers and network errors are counted by outcome"""
+        client = WatsonClient(model_id='test-model')
+        before = {outcome: BACKEND_RESPONSES.value(outcome=outcome)
+                  for outcome in ('400', 'exception', 'fallback')}
+
+        with mock.patch.object(client, 'post', return_value=mock.Mock(status_code=400)):
+            emotion_detector("rejected text", backend=client, use_cache=False)
+        with mock.patch.object(client, 'post', side_effect=requests.exceptions.ConnectionError):
+            emotion_detector("anything", backend=client, use_cache=False)
+
+        for outcome in ('400', 'exception', 'fallback'):
+            self.assertEqual(BACKEND_RESPONSES.value(outcome=outcome), before[outcome] + 1)
+
+
+class TestResultCache(unittest.TestCase):
+    """Test cases for the ResultCache and its use by emotion_detector"""
+
+    RESULT = {'anger': 0.1, 'disgust': 0.1, 'fear': 0.1, 'joy': 0.6,
+              'sadness': 0.1, 'dominant_emotion': 'joy'}
+
+    def test_normalized_text_hits(self):
+        """Test that case and whitespace variants share one entry per model"""
+        cache = ResultCache(maxsize=10)
+        cache.put("Great  service!", 'model-a', self.RESULT)
+
+        self.assertEqual(cache.get("  great service! ", 'model-a'), self.RESULT)
+        self.assertIsNone(cache.get("great service!", 'model-b'))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted when full"""
+        cache = ResultCache(maxsize=2)
+        cache.put("first", 'm', self.RESULT)
+        cache.put("second", 'm', self.RESULT)
+        cache.get("first", 'm')
+        cache.put("third", 'm', self.RESULT)
+
+        self.assertIsNotNone(cache.get("first", 'm'))
+        self.assertIsNone(cache.get("second", 'm'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_ttl_expiry(self):
+        """Test that entries expire after the configured TTL"""
+        now = [100.0]
+        cache = ResultCache(maxsize=10, ttl=5, clock=lambda: now[0])
+        cache.put("thanks", 'm', self.RESULT)
+        now[0] += 4
+        self.assertIsNotNone(cache.get("thanks", 'm'))
+        now[0] += 2
+        self.assertIsNone(cache.get("thanks", 'm'))
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_emotion_detector_skips_backend_on_hit(self):
+        """Test that a repeated text is answered from the cache"""
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {'emotionPredictions': [{'emotion': {
+            key: self.RESULT[key] for key in ('anger', 'disgust', 'fear', 'joy', 'sadness')}}]}
+        client = WatsonClient(model_id='test-model')
+        cache = ResultCache()
+
+        with mock.patch.object(client, 'post', return_value=response) as post:
+            first = emotion_detector("Great service!", backend=client, cache=cache)
+            second = emotion_detector("great service!", backend=client, cache=cache)
+
+        self.assertEqual(first, second)
+        post.assert_called_once()
+
+    def test_failed_results_are_not_cached(self):
+        """Test that backend errors are not stored in the cache"""
+        client = WatsonClient(model_id='test-model')
+        cache = ResultCache()
+
+        with mock.patch.object(client, 'post', return_value=mock.Mock(status_code=500)):
+            emotion_detector("anything", backend=client, cache=cache)
+
+        self.assertEqual(len(cache), 0)
+
+    def test_non_text_input_is_not_cached(self):
+        """Test that values other than strings get the empty result before the cache lookup"""
+        client = WatsonClient(model_id='test-model')
+        cache = ResultCache()
+
+        with mock.patch.object(client, 'post') as post:
+            results = [emotion_detector(value, backend=client, cache=cache, preprocess=False)
+                       for value in (None, 123)]
+
+        self.assertEqual(results, [empty_result(), empty_result()])
+        post.assert_not_called()
+        self.assertEqual(cache.stats()['misses'], 0)
+
+    def test_empty_cache_is_not_replaced_by_default(self):
+        """Test that an explicitly passed empty cache is used rather than the shared one"""
+        cache = ResultCache()
+        shared = ResultCache()
+
+        with mock.patch('EmotionDetection.emotion_detection.get_default_cache',
+                        return_value=shared):
+            emotion_detector_batch(["I am so happy today"], backend=LocalEmotionEngine(),
+                                   cache=cache)
+
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(len(shared), 0)
+
+
+class TestSimilarityIndex(unittest.TestCase):
+    """Test cases for near-duplicate reuse through the SimilarityIndex"""
+
+    RESULT = {'anger': 0.9, 'disgust': 0.02, 'fear': 0.02, 'joy': 0.03,
+              'sadness': 0.03, 'dominant_emotion': 'anger'}
+
+    TEXT = "My order #12345 arrived broken, I want a refund now!"
+
+    def test_near_duplicates_match(self):
+        """Test that punctuation, casing and numbers do not prevent a match"""
+        index = SimilarityIndex(threshold=0.7)
+        index.add(self.TEXT, 'model-a', self.RESULT)
+
+        result, similarity = index.query("my order 99881 arrived broken. i want a refund now",
+                                         'model-a')
+        self.assertEqual(result, self.RESULT)
+        self.assertGreaterEqual(similarity, 0.7)
+        self.assertIsNone(index.query("I love this product so much", 'model-a'))
+        self.assertIsNone(index.query(self.TEXT, 'model-b'))
+
+    def test_oldest_entries_are_dropped(self):
+        """Test that the index keeps at most max_entries texts"""
+        index = SimilarityIndex(threshold=0.9, max_entries=2)
+        for text in ("first text here", "second text here", "third text here"):
+            index.add(text, 'model-a', self.RESULT)
+
+        self.assertEqual(len(index), 2)
+        self.assertIsNone(index.query("first text here", 'model-a'))
+
+    def test_detector_reuses_scores_as_approximate(self):
+        """Test that emotion_detector answers a near duplicate without the backend"""
+        index = SimilarityIndex(threshold=0.7)
+        engine = LocalEmotionEngine()
+        emotion_detector(self.TEXT, backend=engine, use_cache=False, similarity_index=index)
+
+        with mock.patch.object(engine, 'analyse') as analyse:
+            result = emotion_detector("My order #777 arrived broken - I want a refund now",
+                                      backend=engine, use_cache=False, similarity_index=index)
+
+        analyse.assert_not_called()
+        self.assertTrue(result['approximate'])
+        self.assertGreaterEqual(result['similarity'], 0.7)
+
+
+class TestScoreStore(unittest.TestCase):
+    """Test cases for the persistent ScoreStore and StoreBackedCache"""
+
+    RESULT = {'anger': 0.125, 'disgust': 0.125, 'fear': 0.125, 'joy': 0.5,
+              'sadness': 0.125, 'dominant_emotion': 'joy'}
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'scores.sqlite')
+
+    def test_results_survive_reopening(self):
+        """Test bulk put and get, keyed by normalized text and model id"""
+        store = ScoreStore(self.path)
+        store.put_many(["Great  service", "no emotion"], 'model-a',
+                       [self.RESULT, dict(self.RESULT, dominant_emotion=None)])
+        store.close()
+
+        reopened = ScoreStore(self.path)
+        self.assertEqual(reopened.get_many([" great service ", "no emotion", "other"], 'model-a'),
+                         [self.RESULT, None, None])
+        self.assertIsNone(reopened.get("great service", 'model-b'))
+        self.assertEqual(len(reopened), 1)
+
+    def test_batch_rerun_skips_backend(self):
+        """Test that a restarted process finds stored scores without calling the backend"""
+        texts = ["I am so happy today", "I hate this so much"]
+        engine = LocalEmotionEngine()
+        first = emotion_detector_batch(
+            texts, backend=engine, cache=StoreBackedCache(ScoreStore(self.path), ResultCache()))
+
+        # A fresh memory cache stands in for a restarted process
+        cache = StoreBackedCache(ScoreStore(self.path), ResultCache())
+        with mock.patch.object(engine, 'analyse_batch') as analyse_batch:
+            second = emotion_detector_batch(texts, backend=engine, cache=cache)
+            single = emotion_detector(texts[0], backend=engine, cache=cache)
+
+        analyse_batch.assert_not_called()
+        self.assertEqual(second, first)
+        self.assertEqual(single, first[0])
+        self.assertEqual(cache.stats()['store']['hits'], 2)
+
+
+    def test_batch_survives_failing_lookups(self):
+        """Test that non-string texts and failing bulk lookups give error slots, not an exception"""
+        engine = LocalEmotionEngine()
+        cache = StoreBackedCache(ScoreStore(self.path), ResultCache())
+        real_get_many = cache.store.get_many
+
+        def get_many(texts, model_id):
+            if 'locked text' in texts:
+                raise sqlite3.OperationalError('database is locked')
+            return real_get_many(texts, model_id)
+
+        with mock.patch.object(cache.store, 'get_many', side_effect=get_many):
+            results = emotion_detector_batch(['I love it', None, 'locked text'], backend=engine,
+                                             cache=cache)
+
+        self.assertEqual(results[0], engine.analyse('I love it'))
+        self.assertIn('string', results[1]['error'])
+        self.assertEqual(results[2]['error'], 'database is locked')
+
+class TestLocalEmotionEngine(unittest.TestCase):
+    """Test cases for the in-process LocalEmotionEngine backend"""
+
+    def setUp(self):
+        self.engine = LocalEmotionEngine()
+
+    def test_local_engine_dominant_emotions(self):
+        """Test that lexicon words drive the dominant emotion"""
+        texts = {
+            "I am so happy today": 'joy',
+            "I hate this so much": 'anger',
+            "I am feeling very sad today": 'sadness',
+            "I am really scared of this situation": 'fear',
+            "This is absolutely disgusting": 'disgust',
+        }
+        results = self.engine.analyse_batch(list(texts))
+
+        for result, expected in zip(results, texts.values()):
+            self.assertEqual(result['dominant_emotion'], expected)
+            self.assertAlmostEqual(sum(result[key] for key in
+                                       ('anger', 'disgust', 'fear', 'joy', 'sadness')), 1.0, 5)
+
+    def test_local_engine_negation_and_blank(self):
+        """Test negation handling and the empty result for blank text"""
+        self.assertNotEqual(self.engine.analyse("not happy at all")['dominant_emotion'], 'joy')
+        self.assertIsNone(self.engine.analyse("   ")['dominant_emotion'])
+
+    def test_batch_uses_vectorized_backend(self):
+        """Test that emotion_detector_batch scores a batch backend in one call"""
+        with mock.patch.object(self.engine, 'analyse_batch',
+                               wraps=self.engine.analyse_batch) as analyse_batch:
+            results = emotion_detector_batch(["great", "awful", "great"],
+                                             backend=self.engine, cache=ResultCache())
+
+        analyse_batch.assert_called_once()
+        self.assertEqual([result['dominant_emotion'] for result in results],
+                         ['joy', 'disgust', 'joy'])
+
+    def test_unreachable_backend_falls_back_to_local_engine(self):
+        """Test that network errors are answered by the fallback backend"""
+        client = WatsonClient(model_id='test-model')
+
+        with mock.patch.object(client, 'post', side_effect=requests.exceptions.ConnectTimeout):
+            result = emotion_detector("I hate this so much", backend=client, use_cache=False)
+
+        self.assertEqual(result['dominant_emotion'], 'anger')
+
+
+class TestCompactResults(unittest.TestCase):
+    """Test cases for EmotionResult and EmotionBatch"""
+
+    RESULT = {'anger': 0.125, 'disgust': 0.125, 'fear': 0.125, 'joy': 0.5,
+              'sadness': 0.125, 'dominant_emotion': 'joy'}
+    EMPTY = {'anger': None, 'disgust': None, 'fear': None, 'joy': None,
+             'sadness': None, 'dominant_emotion': None}
+
+    def test_result_round_trip(self):
+        """Test that a compact result converts back to the same dictionary"""
+        result = EmotionResult.from_dict(self.RESULT)
+
+        self.assertEqual(result.to_dict(), self.RESULT)
+        self.assertEqual(result['joy'], 0.5)
+        self.assertEqual(result.dominant_emotion, 'joy')
+        self.assertEqual(EmotionResult.from_dict(self.EMPTY).to_dict(), self.EMPTY)
+        with self.assertRaises(AttributeError):
+            result.extra = 1
+
+    def test_batch_keeps_order_errors_and_empty_slots(self):
+        """Test that a batch stores float32 columns and restores every slot"""
+        error_slot = dict(self.EMPTY, error='boom')
+        batch = EmotionBatch.from_results([self.RESULT, self.EMPTY, error_slot])
+
+        self.assertEqual(len(batch), 3)
+        self.assertEqual(batch.to_dicts(), [self.RESULT, self.EMPTY, error_slot])
+        self.assertEqual(batch.to_numpy().shape, (3, 5))
+        self.assertEqual(batch.column('joy').dtype.name, 'float32')
+        self.assertEqual(batch.dominant_counts()['joy'], 1)
+        self.assertEqual(batch.dominant_counts()[None], 2)
+        self.assertEqual(batch.mean_scores()['joy'], 0.5)
+
+        # Columns read into NumPy do not stop the batch from growing
+        column = batch.column('joy')
+        batch.append(self.RESULT)
+        self.assertEqual(len(batch), 4)
+        self.assertEqual(len(column), 3)
+
+    def test_compact_batch_detection(self):
+        """Test that the batch detector and local engine return matching compact batches"""
+        engine = LocalEmotionEngine()
+        texts = ["I am so happy today", "", "I hate this so much"]
+        batch = emotion_detector_batch(texts, backend=engine, use_cache=False, compact=True)
+
+        self.assertIsInstance(batch, EmotionBatch)
+        self.assertEqual([result.dominant_emotion for result in batch],
+                         [result['dominant_emotion'] for result in engine.analyse_batch(texts)])
+        self.assertEqual([result.dominant_emotion for result in engine.score_batch(texts)],
+                         [result.dominant_emotion for result in batch])
+
+
+class TestEmotionAggregator(unittest.TestCase):
+    """Test cases for EmotionStats and EmotionAggregator"""
+
+    JOY = {'anger': 0.05, 'disgust': 0.05, 'fear': 0.05, 'joy': 0.8,
+           'sadness': 0.05, 'dominant_emotion': 'joy'}
+    ANGER = {'anger': 0.6, 'disgust': 0.1, 'fear': 0.1, 'joy': 0.1,
+             'sadness': 0.1, 'dominant_emotion': 'anger'}
+    EMPTY = {'anger': None, 'disgust': None, 'fear': None, 'joy': None,
+             'sadness': None, 'dominant_emotion': None}
+
+    def test_stats_merge_and_quantiles(self):
+        """Test that merged statistics equal statistics of all results"""
+        first, second, combined = EmotionStats(), EmotionStats(), EmotionStats()
+        for result in (self.JOY, self.EMPTY):
+            first.add(result)
+            combined.add(result)
+        for result in (self.ANGER, self.JOY):
+            second.add(result)
+            combined.add(result)
+
+        merged = first.copy().merge(second)
+        self.assertEqual(merged.summary(), combined.summary())
+        self.assertEqual(merged.summary()['dominant'],
+                         {'anger': 1, 'disgust': 0, 'fear': 0, 'joy': 2, 'sadness': 0, 'none': 1})
+        self.assertAlmostEqual(merged.quantile('joy', 0.99), 0.8, delta=0.01)
+
+    def test_batch_matches_single_adds(self):
+        """Test that vectorized batch folding matches adding results one by one"""
+        results = [self.JOY, self.ANGER, self.EMPTY] * 10
+        single, vectorized = EmotionStats(), EmotionStats()
+        for result in results:
+            single.add(result)
+        vectorized.add_batch(EmotionBatch.from_results(results))
+
+        self.assertEqual(single.dominant, vectorized.dominant)
+        self.assertEqual(single.histograms, vectorized.histograms)
+
+    def test_windows_keys_and_retention(self):
+        """Test per-key windows, the since filter and expiry of old windows"""
+        now = [1000.0]
+        aggregator = EmotionAggregator(window=60, retention=120, max_keys=2,
+                                       clock=lambda: now[0])
+        aggregator.add(self.JOY, key='a')
+        aggregator.add(self.ANGER, key='b')
+        aggregator.add(self.ANGER, key='c')
+        now[0] += 60
+        aggregator.add_batch([self.JOY, self.JOY], key='a')
+
+        summary = aggregator.summary(all_keys=True)
+        self.assertEqual(summary['total']['count'], 5)
+        self.assertEqual(summary['keys']['__other__']['count'], 1)
+        self.assertEqual(aggregator.summary(key='a', since=now[0])['total']['count'], 2)
+
+        now[0] += 300
+        aggregator.add(self.JOY, key='a')
+        self.assertEqual(aggregator.summary(all_keys=True)['total']['count'], 1)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test cases for the CircuitBreaker and its use by WatsonClient"""
+
+    def setUp(self):
+        self.now = [0.0]
+        self.breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=10,
+                                      clock=lambda: self.now[0])
+
+    def test_opens_after_threshold_and_probes(self):
+        """Test the closed -> open -> half-open -> closed cycle"""
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertFalse(self.breaker.allow())
+
+        self.now[0] += 10
+        self.assertEqual(self.breaker.state, 'half_open')
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_failed_probe_reopens(self):
+        """Test that a failed half-open probe opens the circuit again"""
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now[0] += 10
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.stats()['state'], 'open')
+        self.assertEqual(self.breaker.stats()['times_opened'], 2)
+
+    def test_open_circuit_skips_backend(self):
+        """Test that WatsonClient fails fast without sending while open"""
+        client = WatsonClient(model_id='test-model', retries=0, breaker=self.breaker)
+
+        with mock.patch.object(client, 'post',
+                               side_effect=requests.exceptions.ConnectTimeout) as post:
+            for _ in range(5):
+                result = emotion_detector("I hate this so much", backend=client,
+                                          use_cache=False)
+
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(result['dominant_emotion'], 'anger')
+        self.assertEqual(self.breaker.stats()['rejected_calls'], 3)
+
+
+class TestResilience(unittest.TestCase):
+    """Test cases for the retry and hedging policies"""
+
+    def setUp(self):
+        self.now = [0.0]
+        self.sleeps = []
+
+    def _policy(self, max_attempts=3, budget=None):
+        return RetryPolicy(max_attempts=max_attempts, base_delay=0.1, max_delay=0.3,
+                           budget=budget, sleep=self.sleeps.append, rand=lambda: 1.0)
+
+    def test_backoff_is_capped_and_jittered(self):
+        """Test that the backoff ceiling doubles up to max_delay and jitter scales it"""
+        policy = self._policy()
+        self.assertEqual([policy.backoff(attempt) for attempt in range(4)],
+                         [0.1, 0.2, 0.3, 0.3])
+        self.assertEqual(RetryPolicy(rand=lambda: 0.5, base_delay=0.1).backoff(0), 0.05)
+
+    def test_retries_unavailable_then_succeeds(self):
+        """Test that a 503 is retried and the following 200 is returned"""
+        answers = [mock.Mock(status_code=503), mock.Mock(status_code=200)]
+
+        response = self._policy().call(lambda: answers.pop(0))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.sleeps, [0.1])
+
+    def test_client_errors_are_not_retried(self):
+        """Test that a 400 is returned at once"""
+        calls = []
+        response = self._policy().call(lambda: calls.append(1) or mock.Mock(status_code=400))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(calls), 1)
+
+    def test_exhausted_budget_stops_retries(self):
+        """Test that retries stop once the retry budget is spent"""
+        budget = RetryBudget(ratio=0.0, min_per_second=0.0, max_tokens=1,
+                             clock=lambda: self.now[0])
+        policy = self._policy(max_attempts=5, budget=budget)
+        calls = []
+
+        def failing():
+            calls.append(1)
+            raise requests.exceptions.ConnectionError()
+
+        for _ in range(2):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                policy.call(failing)
+
+        # One token: the first call retries once, the second one not at all
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(budget.stats()['rejected'], 2)
+
+    def test_hedge_answers_slow_call(self):
+        """Test that a hedge sent after the delay returns before a stuck first call"""
+        release = threading.Event()
+        calls = []
+
+        def call():
+            calls.append(1)
+            if len(calls) == 1:
+                release.wait(5)
+                return 'slow'
+            return 'fast'
+
+        policy = HedgePolicy(delay=0.01)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            answer = policy.call(call, executor)
+            release.set()
+
+        self.assertEqual(answer, 'fast')
+        self.assertEqual(policy.stats()['hedge_wins'], 1)
+
+    def test_hedge_delay_follows_latency_quantile(self):
+        """Test that the adaptive hedge delay tracks the observed p95"""
+        policy = HedgePolicy(quantile=0.95, window=100)
+        self.assertEqual(policy.hedge_delay(), policy.initial_delay)
+
+        for latency in range(1, 101):
+            policy.observe(latency / 1000)
+
+        self.assertAlmostEqual(policy.hedge_delay(), 0.096)
+
+    def test_client_retries_server_errors(self):
+        """Test that WatsonClient retries a 502 before parsing the answer"""
+        ok = mock.Mock(status_code=200)
+        ok.json.return_value = {'emotionPredictions': [{'emotion': {
+            'anger': 0.1, 'disgust': 0.1, 'fear': 0.1, 'joy': 0.6, 'sadness': 0.1}}]}
+        client = WatsonClient(model_id='test-model', retry_policy=self._policy())
+
+        with mock.patch.object(client, 'post',
+                               side_effect=[mock.Mock(status_code=502), ok]) as post:
+            result = client.with_options(hedge_policy=HedgePolicy(delay=1)).analyse("hi")
+
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(result['dominant_emotion'], 'joy')
+        client.close()
+
+    def test_derived_clients_are_reset_after_fork(self):
+        """Test that clients derived with with_options get fresh hedging threads in a child"""
+        client = WatsonClient(model_id='test-model')
+        derived = client.with_options(hedge_policy=HedgePolicy(delay=1), model_id='other-model')
+        # pylint: disable=protected-access
+        inherited = derived._get_hedge_executor()
+
+        client_module._reset_clients_after_fork()
+
+        self.assertIsNot(derived._get_hedge_executor(), inherited)
+        with mock.patch.object(client.session, 'post') as post:
+            derived.post("hi")
+        self.assertEqual(post.call_args.kwargs['headers'],
+                         {"grpc-metadata-mm-model-id": "other-model"})
+        inherited.shutdown()
+        derived.close()
+
+
+class TestAdmission(unittest.TestCase):
+    """Test cases for the admission controller and the per-client rate limiter"""
+
+    def test_queue_timeout_and_full_queue(self):
+        """Test that waiting requests time out and a full queue rejects at once"""
+        controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.01)
+        controller.acquire()
+
+        with self.assertRaises(RejectedError) as timed_out:
+            controller.acquire()
+        self.assertEqual(timed_out.exception.reason, 'queue_timeout')
+
+        controller.queued = 1
+        with self.assertRaises(RejectedError) as full:
+            controller.acquire()
+        self.assertEqual((full.exception.reason, full.exception.status), ('queue_full', 503))
+
+    def test_queued_request_gets_released_slot(self):
+        """Test that a waiting request is admitted when a slot is released"""
+        controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=5)
+        controller.acquire()
+        waiter = threading.Thread(target=controller.acquire)
+        waiter.start()
+        while controller.stats()['queued'] < 1:
+            time.sleep(0.001)
+        controller.release()
+        waiter.join()
+
+        self.assertEqual(controller.stats()['admitted'], 2)
+
+    def test_token_bucket_refills(self):
+        """Test that a client's bucket empties after its burst and refills with time"""
+        now = [0.0]
+        limiter = RateLimiter(rate=2, burst=2, clock=lambda: now[0])
+        limiter.allow('a')
+        limiter.allow('a')
+        with self.assertRaises(RejectedError) as limited:
+            limiter.allow('a')
+        self.assertEqual(limited.exception.status, 429)
+        self.assertAlmostEqual(limited.exception.retry_after, 0.5)
+
+        limiter.allow('b')
+        now[0] += 0.5
+        limiter.allow('a')
+
+
+class TestJobs(unittest.TestCase):
+    """Test cases for the SQLite job queue and its runner"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'jobs.sqlite')
+        self.engine = LocalEmotionEngine()
+
+    def test_job_runs_in_chunks(self):
+        """Test that a job is stored and scored chunk by chunk, with error slots"""
+        queue = JobQueue(self.path, chunk_size=2)
+        job = queue.submit(iter(["I love it", "I hate it", 42, "so sad"]), key='p-1')
+        self.assertEqual((job['status'], job['total'], job['key']), ('queued', 4, 'p-1'))
+
+        JobRunner(queue, backend=self.engine, cache=ResultCache()).run_job(queue.claim())
+        results = list(queue.results(job['id']))
+
+        self.assertEqual(queue.get(job['id'])['status'], 'completed')
+        self.assertEqual(queue.get(job['id'])['done'], 4)
+        self.assertEqual([result['dominant_emotion'] for result in results],
+                         ['joy', 'anger', None, 'sadness'])
+        self.assertIn('error', results[2])
+        self.assertEqual(list(queue.results(job['id'], offset=1, limit=2)), results[1:3])
+        self.assertIsNone(queue.claim())
+
+    def test_cancel_during_upload_is_kept(self):
+        """Test that a job cancelled while its texts are stored is not queued afterwards"""
+        queue = JobQueue(self.path, chunk_size=1)
+
+        def texts():
+            yield "I love it"
+            queue.cancel('job-1')
+            yield "I hate it"
+
+        with mock.patch('EmotionDetection.jobs.uuid.uuid4', return_value=mock.Mock(hex='job-1')):
+            job = queue.submit(texts())
+
+        self.assertEqual((job['status'], job['total']), ('cancelled', 2))
+        self.assertIsNone(queue.claim())
+        self.assertEqual(queue.resume('job-1')['status'], 'queued')
+
+    def test_cancel_and_resume_after_restart(self):
+        """Test that a cancelled job keeps its results and resumes where it stopped"""
+        queue = JobQueue(self.path, chunk_size=1)
+        job = queue.submit(["I love it", "I hate it", "so sad"])
+        runner = JobRunner(queue, backend=self.engine, cache=ResultCache())
+        queue.claim()
+
+        save_chunk = queue.save_chunk
+
+        def cancel_during_chunk(*args):
+            queue.cancel(job['id'])
+            return save_chunk(*args)
+
+        with mock.patch.object(queue, 'save_chunk', side_effect=cancel_during_chunk):
+            runner.run_job(job)
+        self.assertEqual(queue.get(job['id'])['status'], 'cancelled')
+        self.assertEqual(queue.get(job['id'])['done'], 1)
+        queue.close()
+
+        # A new queue on the same file stands in for a restarted process
+        reopened = JobQueue(self.path, chunk_size=1)
+        reopened.resume(job['id'])
+        with mock.patch.object(self.engine, 'analyse_batch',
+                               wraps=self.engine.analyse_batch) as analyse_batch:
+            JobRunner(reopened, backend=self.engine, cache=ResultCache()).run_job(
+                reopened.claim())
+
+        self.assertEqual([call.args[0] for call in analyse_batch.call_args_list],
+                         [["I hate it"], ["so sad"]])
+        self.assertEqual(reopened.get(job['id'])['status'], 'completed')
+        self.assertEqual(len(list(reopened.results(job['id']))), 3)
+
+    def test_stale_running_job_is_claimed_again(self):
+        """Test that a job whose runner stopped making progress is queued again"""
+        queue = JobQueue(self.path, stale_after=0)
+        job = queue.submit(["I love it"])
+        self.assertEqual(queue.claim()['id'], job['id'])
+        self.assertEqual(queue.claim()['id'], job['id'])
+
+        queue.stale_after = 300
+        self.assertIsNone(queue.claim())
+
+    def test_slow_chunk_is_not_claimed_again(self):
+        """Test that a job stays claimed while a chunk takes longer than stale_after"""
+        queue = JobQueue(self.path, stale_after=0.3)
+        job = queue.submit(["I love it"])
+        runner = JobRunner(queue, backend=self.engine, cache=ResultCache())
+        claims = []
+        score = runner._score  # pylint: disable=protected-access
+
+        def slow_score(texts):
+            time.sleep(0.5)
+            claims.append(queue.claim())
+            return score(texts)
+
+        with mock.patch.object(runner, '_score', side_effect=slow_score):
+            runner.run_job(queue.claim())
+
+        self.assertEqual(claims, [None])
+        self.assertEqual(queue.get(job['id'])['status'], 'completed')
+
+    def test_runner_threads_process_jobs(self):
+        """Test that started runner threads pick up submitted jobs"""
+        queue = JobQueue(self.path)
+        runner = JobRunner(queue, workers=2, backend=self.engine, cache=ResultCache(),
+                           poll_interval=0.01)
+        runner.start()
+        self.addCleanup(runner.stop)
+        job = queue.submit(["I love it"] * 10)
+        deadline = time.monotonic() + 5
+        while queue.get(job['id'])['status'] != 'completed' and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(queue.get(job['id'])['done'], 10)
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Test cases for the thread-safe SingleFlight group"""
+
+    def test_concurrent_callers_share_one_call(self):
+        """Test that callers arriving while a call runs share its result"""
+        group = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def slow_call():
+            calls.append(1)
+            release.wait(5)
+            return 'result'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(group.do('key', slow_call)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        while group.stats()['coalesced'] < 4:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['result'] * 5)
+        self.assertEqual(group.stats(), {'in_flight': 0, 'executions': 1, 'coalesced': 4})
+
+    def test_errors_are_shared_and_not_remembered(self):
+        """Test that a failure is raised to the caller and the next call runs again"""
+        group = SingleFlight()
+
+        with self.assertRaises(KeyError):
+            group.do('key', lambda: {}['missing'])
+        self.assertEqual(group.do('key', lambda: 'second'), 'second')
+
+
+class TestAsyncSingleFlight(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the AsyncSingleFlight group"""
+
+    async def test_concurrent_coroutines_share_one_call(self):
+        """Test that concurrent coroutines share one task"""
+        group = AsyncSingleFlight()
+        calls = []
+
+        async def slow_call():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'result'
+
+        results = await asyncio.gather(*(group.do('key', slow_call) for _ in range(5)))
+
+        self.assertEqual(results, ['result'] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(group.stats()['coalesced'], 4)
+
+    async def test_async_detector_coalesces_duplicates(self):
+        """Test that duplicate texts in an async batch reach the backend once"""
+        client = FakeAsyncClient(delays={'same text': 0.01})
+        client.post = mock.AsyncMock(side_effect=client.post)
+
+        results = await async_emotion_detector_batch(['same text', 'Same  Text'] * 3,
+                                                     client=client, use_cache=False)
+
+        self.assertEqual(client.post.await_count, 1)
+        self.assertEqual(len({result['joy'] for result in results}), 1)
+
+
+class TestMicroBatcher(unittest.TestCase):
+    """Test cases for the MicroBatcher dispatcher"""
+
+    def setUp(self):
+        self.engine = LocalEmotionEngine()
+        self.batch_sizes = []
+        original = self.engine.analyse_batch
+
+        def recording_batch(texts):
+            self.batch_sizes.append(len(texts))
+            return original(texts)
+
+        self.engine.analyse_batch = recording_batch
+
+    def test_concurrent_calls_are_merged(self):
+        """Test that concurrent single-text calls are scored in shared batches"""
+        batcher = MicroBatcher(self.engine, max_batch_size=16, max_wait=0.05)
+        texts = ["I am so happy today", "I hate this so much"] * 20
+        try:
+            futures = [batcher.submit(text) for text in texts]
+            results = [future.result(timeout=5) for future in futures]
+        finally:
+            batcher.close()
+
+        self.assertEqual([result['dominant_emotion'] for result in results],
+                         ['joy', 'anger'] * 20)
+        self.assertLessEqual(max(self.batch_sizes), 16)
+        self.assertLess(len(self.batch_sizes), len(texts))
+        self.assertEqual(batcher.stats()['items'], len(texts))
+
+    def test_lone_call_waits_at_most_max_wait(self):
+        """Test that a single call is dispatched after max_wait"""
+        batcher = MicroBatcher(self.engine, max_batch_size=64, max_wait=0.01)
+        try:
+            started = time.monotonic()
+            result = batcher.analyse("This is absolutely disgusting")
+            elapsed = time.monotonic() - started
+        finally:
+            batcher.close()
+
+        self.assertEqual(result['dominant_emotion'], 'disgust')
+        self.assertLess(elapsed, 1)
+        self.assertEqual(self.batch_sizes, [1])
+
+    def test_backend_errors_reach_every_caller(self):
+        """Test that a failed batch raises in each waiting caller"""
+        self.engine.analyse_batch = mock.Mock(side_effect=RuntimeError('down'))
+        batcher = MicroBatcher(self.engine, max_wait=0.01)
+        try:
+            futures = [batcher.submit(text) for text in ('a', 'b')]
+            for future in futures:
+                with self.assertRaises(RuntimeError):
+                    future.result(timeout=5)
+        finally:
+            batcher.close()
+
+
+    def test_failing_text_only_fails_its_caller(self):
+        """Test that one failing text of a remote batch leaves the others their remote scores"""
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {'emotionPredictions': [{'emotion': {
+            'anger': 0.1, 'disgust': 0.1, 'fear': 0.1, 'joy': 0.6, 'sadness': 0.1}}]}
+
+        def post(url, json, **_options):
+            if json['raw_document']['text'] == 'bad':
+                raise requests.exceptions.ReadTimeout('timed out')
+            return response
+
+        client = WatsonClient(retry_policy=RetryPolicy(max_attempts=1))
+        batcher = MicroBatcher(client, max_batch_size=8, max_wait=0.05)
+        try:
+            with mock.patch.object(client.session, 'post', side_effect=post):
+                futures = [batcher.submit(text) for text in ('good', 'bad', 'also good')]
+                with self.assertRaises(BackendError):
+                    futures[1].result(timeout=5)
+                results = [futures[0].result(timeout=5), futures[2].result(timeout=5)]
+        finally:
+            batcher.close()
+
+        self.assertEqual([result['joy'] for result in results], [0.6, 0.6])
+        self.assertEqual(batcher.stats()['batches'], 1)
+
+class FakeAsyncClient:
+    """Async client double that answers after a per-text delay"""
+
+    model_id = 'test-model'
+    total_timeout = 1
+
+    def __init__(self, delays=None):
+        self.delays = delays or {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def post(self, text_to_analyse):
+        """Return a joy-dominated prediction, or fail for the text 'boom'"""
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delays.get(text_to_analyse, 0))
+            if text_to_analyse == 'boom':
+                return 200, {'unexpected': 'body'}
+            return 200, {'emotionPredictions': [{'emotion': {
+                'anger': 0.0, 'disgust': 0.0, 'fear': 0.0,
+                'joy': float(len(text_to_analyse)), 'sadness': 0.0}}]}
+        finally:
+            self.in_flight -= 1
+
+
+class TestAsyncEmotionDetector(unittest.IsolatedAsyncioTestCase):
+    """Test cases for async_emotion_detector and its batch variant"""
+
+    async def test_async_detector_result(self):
+        """Test that the coroutine returns the usual result format"""
+        result = await async_emotion_detector("happy", client=FakeAsyncClient(),
+                                              use_cache=False)
+
+        self.assertEqual(result['dominant_emotion'], 'joy')
+        self.assertEqual(result['joy'], 5.0)
+
+    async def test_async_detector_non_text_input(self):
+        """Test that values other than strings get the empty result without a backend call"""
+        client = FakeAsyncClient()
+        with mock.patch.object(client, 'post') as post:
+            results = [await async_emotion_detector(value, client=client) for value in (None, 1)]
+
+        self.assertEqual(results, [empty_result(), empty_result()])
+        post.assert_not_called()
+
+    async def test_async_detector_timeout(self):
+        """Test that a slow backend call is cancelled and falls back"""
+        client = FakeAsyncClient(delays={'slow': 5})
+
+        result = await async_emotion_detector("slow", client=client, use_cache=False,
+                                              timeout=0.05)
+
+        self.assertEqual(client.in_flight, 0)
+        self.assertEqual(result, LocalEmotionEngine().analyse("slow"))
+
+    async def test_async_batch_order_and_error_slot(self):
+        """Test that batch results keep input order and isolate failures"""
+        client = FakeAsyncClient(delays={'aaa': 0.02, 'b': 0.0})
+
+        results = await async_emotion_detector_batch(['aaa', 'boom', 'b'], client=client,
+                                                     use_cache=False)
+
+        self.assertEqual(results[0]['joy'], 3.0)
+        self.assertIn('error', results[1])
+        self.assertEqual(results[2]['joy'], 1.0)
+        self.assertEqual(client.max_in_flight, 3)
+
+    async def test_async_batch_follows_language_routes(self):
+        """Test that the async path scores each text with its language's route"""
+        english = WatsonClient(model_id='english')
+        router = LanguageRouter({'en': english, 'de': english.with_options(model_id='german'),
+                                 'fr': None, '*': LocalEmotionEngine()})
+        clients = {}
+
+        def client_for(model_id=None):
+            client = clients.setdefault(model_id, FakeAsyncClient())
+            client.model_id = model_id
+            return client
+
+        texts = ["I love it and it is great", "Das ist nicht gut und ich bin sehr traurig",
+                 "Le service est très mauvais", "Es muy bueno y me gusta"]
+        with mock.patch('EmotionDetection.async_detection.get_default_async_client',
+                        side_effect=client_for):
+            results = await async_emotion_detector_batch(texts, router=router, use_cache=False)
+
+        self.assertEqual(sorted(clients), ['english', 'german'])
+        self.assertEqual([results[0]['joy'], results[1]['joy']],
+                         [float(len(texts[0])), float(len(texts[1]))])
+        self.assertEqual(results[2]['error'], 'Language not supported: fr')
+        self.assertEqual(results[3], LocalEmotionEngine().analyse(texts[3]))
+        english.close()
+
+    async def test_async_detector_reuses_near_duplicates(self):
+        """Test that the async path queries and feeds the similarity index like the sync one"""
+        index = SimilarityIndex(threshold=0.7)
+        client = FakeAsyncClient()
+        first = await async_emotion_detector(TestSimilarityIndex.TEXT, client=client,
+                                             use_cache=False, similarity_index=index)
+
+        with mock.patch.object(client, 'post') as post:
+            result = await async_emotion_detector(
+                "My order #777 arrived broken - I want a refund now", client=client,
+                use_cache=False, similarity_index=index)
+
+        post.assert_not_called()
+        self.assertTrue(result['approximate'])
+        self.assertEqual(result['joy'], first['joy'])
+
+
 if __name__ == '__main__':
     # Run the tests
     unittest.main(verbosity=2)
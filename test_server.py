@@ -0,0 +1,458 @@
+"""
+Unit Tests for the Flask Web Server
+
+This module contains unit tests for the routes exposed by server.py.
+"""
+
+import asyncio
+import gzip
+import json
+import unittest
+from unittest import mock
+
+import server
+from EmotionDetection import (LocalEmotionEngine, emotion_detector, emotion_detector_batch,
+                              emotion_detector_chunked)
+from EmotionDetection.admission import AdmissionController, RateLimiter
+from EmotionDetection.jobs import JobQueue, JobRunner
+from EmotionDetection.routing import LanguageRouter
+
+# Three sentence chunks at a 40-character limit
+TEXT = "I love this product. It is great!  But the delivery was awful.\nI hate waiting."
+
+
+class TestPageRoutes(unittest.TestCase):
+    """Test cases for the HTML pages"""
+
+    def setUp(self):
+        self.client = server.app.test_client()
+
+    def test_index_is_cacheable(self):
+        """Test that the index page has an ETag and answers conditional GETs with 304"""
+        response = self.client.get('/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response.headers['Cache-Control'])
+        cached = self.client.get('/', headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
+    def test_invalid_input_page(self):
+        """Test that blank input returns the invalid input page"""
+        response = self.client.post('/emotionDetector', data={'textToAnalyze': '   '})
+
+        self.assertIn('Invalid text!', response.get_data(as_text=True))
+
+    def test_result_page_escapes_text(self):
+        """Test that the analyzed text is HTML-escaped on the results page"""
+        fake_result = {'anger': 0.1, 'disgust': 0.1, 'fear': 0.1, 'joy': 0.6,
+                       'sadness': 0.1, 'dominant_emotion': 'joy'}
+        with mock.patch('server.emotion_detector', return_value=fake_result):
+            response = self.client.post('/emotionDetector',
+                                        data={'textToAnalyze': 'Great <script>x</script>'})
+
+        page = response.get_data(as_text=True)
+        self.assertIn('&lt;script&gt;', page)
+        self.assertNotIn('<script>x', page)
+        self.assertIn('Joy', page)
+
+
+class TestBatchRoute(unittest.TestCase):
+    """Test cases for the /emotionDetector/batch route"""
+
+    def setUp(self):
+        self.client = server.app.test_client()
+
+    def test_batch_route_returns_results_in_order(self):
+        """Test that the batch route returns one result per text"""
+        fake_results = [{'dominant_emotion': 'joy'}, {'dominant_emotion': 'anger'}]
+        with mock.patch('server.emotion_detector_batch_chunked',
+                        return_value=fake_results) as batch:
+            response = self.client.post('/emotionDetector/batch',
+                                        json={'texts': ['great', 'awful']})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {'results': fake_results})
+        batch.assert_called_once_with(['great', 'awful'], server.app.config['EMOTION_CHUNK_CHARS'],
+                                      backend=server.backend, cache=server.result_cache)
+
+    def test_batch_route_rejects_invalid_body(self):
+        """Test that malformed batch bodies are rejected with 400"""
+        for body in ({'texts': 'not a list'}, {'texts': [1, 2]}, ['a', 'b']):
+            response = self.client.post('/emotionDetector/batch', json=body)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.get_json())
+
+    def test_async_batch_route(self):
+        """Test that the async batch route awaits the async batch detector on one shared loop"""
+        fake_results = [{'dominant_emotion': 'joy'}]
+        loops = []
+
+        async def fake_batch(texts, **_options):
+            loops.append(asyncio.get_running_loop())
+            return fake_results[:len(texts)]
+
+        with mock.patch('server.backend', new=server.WatsonClient()), \
+                mock.patch('server.async_emotion_detector_batch', new=fake_batch):
+            for _ in range(2):
+                response = self.client.post('/emotionDetector/batch/async',
+                                            json={'texts': ['great']})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {'results': fake_results})
+        self.assertIs(loops[0], loops[1])
+
+    def test_async_batch_route_uses_configured_backend(self):
+        """Test that backends other than Watson score the async route like the sync one"""
+        engine = LocalEmotionEngine()
+        with mock.patch('server.backend', new=engine), \
+                mock.patch('server.async_emotion_detector_batch') as async_batch:
+            response = self.client.post('/emotionDetector/batch/async',
+                                        json={'texts': ['I love this product']})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['results'],
+                         emotion_detector_batch(['I love this product'], backend=engine,
+                                                use_cache=False))
+        async_batch.assert_not_called()
+
+    def test_long_texts_are_scored_by_chunks(self):
+        """Test that the batch routes split texts longer than the app's chunk limit"""
+        engine = LocalEmotionEngine()
+        client = server.create_app({'EMOTION_CHUNK_CHARS': 40}).test_client()
+        expected = [emotion_detector_chunked(TEXT, max_chars=40, backend=engine, use_cache=False),
+                    emotion_detector('great', backend=engine, use_cache=False)]
+
+        with mock.patch('server.backend', new=engine), \
+                mock.patch.object(engine, 'analyse_batch', wraps=engine.analyse_batch) as batch:
+            for route in ('/emotionDetector/batch', '/emotionDetector/batch/async',
+                          '/api/v1/emotion'):
+                response = client.post(route, json={'texts': [TEXT, 'great']})
+                self.assertEqual(response.get_json()['results'], expected, route)
+
+        # The three chunks of the long text, then the short text, in one call
+        self.assertEqual([len(call.args[0]) for call in batch.call_args_list][0], 4)
+
+
+class TestJsonApiRoute(unittest.TestCase):
+    """Test cases for the /api/v1/emotion route"""
+
+    RESULT = {'anger': 0.1, 'disgust': 0.1, 'fear': 0.1, 'joy': 0.6,
+              'sadness': 0.1, 'dominant_emotion': 'joy'}
+
+    def setUp(self):
+        self.client = server.app.test_client()
+
+    def test_single_text(self):
+        """Test that one text returns the detector result as JSON"""
+        with mock.patch('server.emotion_detector', return_value=self.RESULT):
+            response = self.client.post('/api/v1/emotion', json={'text': 'great'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), self.RESULT)
+
+    def test_field_selection(self):
+        """Test that callers can request only the dominant emotion"""
+        with mock.patch('server.emotion_detector', return_value=self.RESULT):
+            response = self.client.post('/api/v1/emotion?fields=dominant_emotion',
+                                        json={'text': 'great'})
+
+        self.assertEqual(response.get_json(), {'dominant_emotion': 'joy'})
+
+    def test_chunk_results(self):
+        """Test that "chunks": true reports every chunk with the selected fields"""
+        chunked = dict(self.RESULT, chunks=[{'start': 0, 'end': 5, 'result': self.RESULT}])
+        with mock.patch('server.emotion_detector_chunked', return_value=chunked) as detector:
+            response = self.client.post('/api/v1/emotion?fields=joy',
+                                        json={'text': 'great', 'chunks': True})
+
+        self.assertTrue(detector.call_args.kwargs['include_chunks'])
+        self.assertEqual(response.get_json(),
+                         {'joy': 0.6, 'chunks': [{'start': 0, 'end': 5, 'result': {'joy': 0.6}}]})
+
+    def test_batch_is_compressed(self):
+        """Test that large batch responses are gzip-compressed when accepted"""
+        with mock.patch('server.emotion_detector_batch_chunked',
+                        return_value=[self.RESULT] * 100):
+            response = self.client.post('/api/v1/emotion', json={'texts': ['great'] * 100},
+                                        headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        payload = json.loads(gzip.decompress(response.data))
+        self.assertEqual(len(payload['results']), 100)
+
+    def test_invalid_requests(self):
+        """Test that blank texts and unknown fields are rejected"""
+        self.assertEqual(self.client.post('/api/v1/emotion', json={'text': ' '}).status_code, 400)
+        response = self.client.post('/api/v1/emotion', json={'text': 'hi', 'fields': ['mood']})
+        self.assertEqual(response.status_code, 400)
+
+
+class TestStreamRoute(unittest.TestCase):
+    """Test cases for the /api/v1/emotion/stream route"""
+
+    def setUp(self):
+        self.client = server.app.test_client()
+        patcher = mock.patch('server.backend', LocalEmotionEngine())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_ndjson_in_and_out(self):
+        """Test that NDJSON records stream back in order with their index and id"""
+        body = '"I love it"\n{"text": "I hate this", "id": "t-2"}\nnot json\n'
+        response = self.client.post('/api/v1/emotion/stream', data=body,
+                                     content_type='application/x-ndjson')
+        items = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertEqual([item['index'] for item in items], [0, 1, 2])
+        self.assertEqual(items[0]['dominant_emotion'], 'joy')
+        self.assertEqual((items[1]['id'], items[1]['dominant_emotion']), ('t-2', 'anger'))
+        self.assertIn('error', items[2])
+
+    def test_server_sent_events(self):
+        """Test that clients accepting text/event-stream get one event per result"""
+        response = self.client.post('/api/v1/emotion/stream', json={'texts': ['great'] * 20},
+                                    headers={'Accept': 'text/event-stream'})
+        events = response.get_data(as_text=True).strip().split('\n\n')
+
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        self.assertEqual(len(events), 21)
+        self.assertTrue(events[0].startswith('id: 0\ndata: {"index":0'))
+        self.assertEqual(events[-1], 'event: end\ndata: {"count":20}')
+
+    def test_long_texts_are_scored_by_chunks(self):
+        """Test that streamed texts longer than the app's chunk limit are split"""
+        client = server.create_app({'EMOTION_CHUNK_CHARS': 40}).test_client()
+        response = client.post('/api/v1/emotion/stream', json={'texts': [TEXT]})
+        item = json.loads(response.get_data(as_text=True))
+
+        expected = emotion_detector_chunked(TEXT, max_chars=40, backend=server.backend,
+                                            use_cache=False)
+        self.assertEqual(item, dict(expected, index=0))
+
+
+class TestJobRoutes(unittest.TestCase):
+    """Test cases for the background job routes"""
+
+    def setUp(self):
+        self.client = server.app.test_client()
+        self.queue = JobQueue(':memory:', chunk_size=2)
+        self.runner = JobRunner(self.queue, backend=LocalEmotionEngine(), cache=None)
+        for name, value in (('job_queue', self.queue), ('job_runner', self.runner)):
+            patcher = mock.patch(f'server.{name}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Jobs are run synchronously by the tests instead of runner threads
+        patcher = mock.patch.object(self.runner, 'start')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_submit_run_and_page_results(self):
+        """Test submitting a job, its progress and paging through its results"""
+        response = self.client.post('/api/v1/jobs', json={'texts': ['I love it', 'I hate it',
+                                                                    'so sad'], 'key': 'p-1'})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['id']
+        self.assertEqual(response.headers['Location'], f'/api/v1/jobs/{job_id}')
+        self.assertEqual(self.client.get(f'/api/v1/jobs/{job_id}').get_json()['progress'], 0)
+
+        self.runner.run_job(self.queue.claim())
+        status = self.client.get(f'/api/v1/jobs/{job_id}').get_json()
+        page = self.client.get(f'/api/v1/jobs/{job_id}/results?limit=2').get_json()
+        rest = self.client.get(f'/api/v1/jobs/{job_id}/results?offset=2').get_json()
+
+        self.assertEqual((status['status'], status['progress']), ('completed', 1.0))
+        self.assertEqual([result['dominant_emotion'] for result in page['results']],
+                         ['joy', 'anger'])
+        self.assertEqual(page['next_offset'], 2)
+        self.assertEqual(len(rest['results']), 1)
+        self.assertIsNone(rest['next_offset'])
+
+    def test_ndjson_submit_streamed_results_and_cancel(self):
+        """Test an NDJSON submission, NDJSON results and cancelling a queued job"""
+        response = self.client.post('/api/v1/jobs?key=p-2', data='"I love it"\nnot json\n',
+                                    content_type='application/x-ndjson')
+        job_id = response.get_json()['id']
+        self.assertEqual(self.client.delete(f'/api/v1/jobs/{job_id}').get_json()['status'],
+                         'cancelled')
+        self.assertIsNone(self.queue.claim())
+
+        self.assertEqual(self.client.post(f'/api/v1/jobs/{job_id}/resume').get_json()['status'],
+                         'queued')
+        self.runner.run_job(self.queue.claim())
+        response = self.client.get(f'/api/v1/jobs/{job_id}/results',
+                                   headers={'Accept': 'application/x-ndjson'})
+        results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+        self.assertEqual(results[0]['dominant_emotion'], 'joy')
+        self.assertIn('error', results[1])
+
+    def test_unknown_and_disabled(self):
+        """Test 404 for unknown jobs and 503 when no job database is configured"""
+        self.assertEqual(self.client.get('/api/v1/jobs/missing').status_code, 404)
+        with mock.patch('server.job_queue', None):
+            self.assertEqual(self.client.post('/api/v1/jobs', json={'texts': []}).status_code,
+                             503)
+
+
+class TestSummaryRoute(unittest.TestCase):
+    """Test cases for the live statistics in /api/v1/summary"""
+
+    RESULT = {'anger': 0.1, 'disgust': 0.1, 'fear': 0.1, 'joy': 0.6,
+              'sadness': 0.1, 'dominant_emotion': 'joy'}
+
+    def setUp(self):
+        self.client = server.app.test_client()
+        server.aggregator.clear()
+
+    def test_scored_results_are_aggregated_per_key(self):
+        """Test that API results are folded into their key's running statistics"""
+        with mock.patch('server.emotion_detector', return_value=self.RESULT):
+            self.client.post('/api/v1/emotion', json={'text': 'great', 'key': 'product-1'})
+        with mock.patch('server.emotion_detector_batch_chunked', return_value=[self.RESULT] * 3):
+            self.client.post('/api/v1/emotion', json={'texts': ['a', 'b', 'c'],
+                                                      'key': 'product-2'})
+
+        summary = self.client.get('/api/v1/summary').get_json()
+        self.assertEqual(summary['total']['count'], 4)
+        self.assertEqual(summary['keys']['product-2']['dominant']['joy'], 3)
+        self.assertAlmostEqual(summary['keys']['product-1']['mean']['joy'], 0.6)
+
+        one_key = self.client.get('/api/v1/summary?key=product-1&windows=1').get_json()
+        self.assertEqual(list(one_key['keys']), ['product-1'])
+        self.assertEqual(len(one_key['keys']['product-1']['windows']), 1)
+
+    def test_invalid_parameters(self):
+        """Test that a bad key or since value is rejected"""
+        response = self.client.post('/api/v1/emotion', json={'text': 'hi', 'key': ['x']})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/summary?since=soon').status_code, 400)
+
+
+class TestStatusRoute(unittest.TestCase):
+    """Test cases for the /status route"""
+
+    def test_status_reports_breaker_state(self):
+        """Test that the breaker state is exposed for monitoring"""
+        response = server.app.test_client().get('/status')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(response.get_json()['breaker']['state'], ('closed', 'open', 'half_open'))
+
+    def test_status_reports_language_routes(self):
+        """Test that routing is reported for a language router and only for it"""
+        engine = LocalEmotionEngine()
+        router = LanguageRouter({'*': engine, 'fr': None})
+        with mock.patch('server.backend', new=router):
+            routing = server.app.test_client().get('/status').get_json()['routing']
+        with mock.patch('server.backend', new=engine):
+            unrouted = server.app.test_client().get('/status').get_json()['routing']
+
+        self.assertEqual(routing['routes'], {'*': engine.model_id, 'fr': None})
+        self.assertIsNone(unrouted)
+
+
+class TestHealthRoutes(unittest.TestCase):
+    """Test cases for the app factory and the liveness and readiness routes"""
+
+    def test_factory_builds_configured_app(self):
+        """Test that create_app applies the configuration and registers every route"""
+        flask_app = server.create_app({'TESTING': True})
+
+        self.assertIsNot(flask_app, server.app)
+        self.assertTrue(flask_app.testing)
+        self.assertEqual(flask_app.test_client().get('/healthz').status_code, 200)
+
+    def test_readiness_follows_shutdown(self):
+        """Test that a worker stops reporting ready once it starts shutting down"""
+        client = server.app.test_client()
+        self.assertEqual(client.get('/readyz').status_code, 200)
+
+        server._ready.clear()  # pylint: disable=protected-access
+        try:
+            response = client.get('/readyz')
+        finally:
+            server.preload()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(client.get('/healthz').get_json()['status'], 'alive')
+
+
+class TestAdmissionControl(unittest.TestCase):
+    """Test cases for rate limiting, admission control and the body size cap"""
+
+    RESULT = {'anger': 0.1, 'disgust': 0.1, 'fear': 0.1, 'joy': 0.6,
+              'sadness': 0.1, 'dominant_emotion': 'joy'}
+
+    def setUp(self):
+        self.client = server.app.test_client()
+
+    def test_rate_limit_per_api_key(self):
+        """Test that a client over its rate gets 429 while other clients are served"""
+        limiter = RateLimiter(rate=0.001, burst=1)
+        with mock.patch('server.rate_limiter', limiter), \
+                mock.patch('server.emotion_detector', return_value=self.RESULT):
+            first = self.client.post('/api/v1/emotion', json={'text': 'hi'},
+                                     headers={'X-API-Key': 'noisy'})
+            second = self.client.post('/api/v1/emotion', json={'text': 'hi'},
+                                      headers={'X-API-Key': 'noisy'})
+            other = self.client.post('/api/v1/emotion', json={'text': 'hi'},
+                                     headers={'X-API-Key': 'quiet'})
+
+        self.assertEqual([first.status_code, second.status_code, other.status_code],
+                         [200, 429, 200])
+        self.assertGreaterEqual(int(second.headers['Retry-After']), 1)
+
+    def test_overload_is_rejected_fast(self):
+        """Test that requests beyond the in-flight limit and queue get 503"""
+        controller = AdmissionController(max_in_flight=1, max_queue=0)
+        controller.acquire()
+        with mock.patch('server.admission', controller):
+            response = self.client.post('/api/v1/emotion', json={'text': 'hi'})
+            health = self.client.get('/healthz')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+        self.assertEqual(health.status_code, 200)
+
+    def test_admitted_requests_release_their_slot(self):
+        """Test that a served request frees its slot for the next one"""
+        controller = AdmissionController(max_in_flight=1, max_queue=0)
+        with mock.patch('server.admission', controller), \
+                mock.patch('server.emotion_detector', return_value=self.RESULT):
+            for _ in range(3):
+                self.assertEqual(
+                    self.client.post('/api/v1/emotion', json={'text': 'hi'}).status_code, 200)
+
+        self.assertEqual(controller.stats()['in_flight'], 0)
+
+    def test_body_size_cap(self):
+        """Test that oversized bodies are rejected with 413"""
+        client = server.create_app({'MAX_CONTENT_LENGTH': 100}).test_client()
+        response = client.post('/api/v1/emotion', json={'text': 'x' * 200})
+
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('error', response.get_json())
+
+
+class TestMetricsRoute(unittest.TestCase):
+    """Test cases for the /metrics route"""
+
+    def test_metrics_exposition(self):
+        """Test that request latency and stage timings are exposed in Prometheus format"""
+        client = server.app.test_client()
+        client.post('/emotionDetector', data={'textToAnalyze': ' '})
+        response = client.get('/metrics')
+        body = response.get_data(as_text=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        self.assertIn('# TYPE emotion_http_request_seconds histogram', body)
+        self.assertIn('emotion_http_request_seconds_count{route="/emotionDetector",status="200"}',
+                      body)
+        self.assertIn('emotion_stage_seconds_bucket{stage="validate",le="+Inf"}', body)
+        self.assertIn('emotion_http_requests_in_flight 1', body)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)